@@ -5,11 +5,21 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 from models import db, TreeNode, OrganizationRule, FileLog, MonitorConfig
 from tree_structure import FileOrganizationTree
+from rule_index import validate_rule_pattern
 from file_organizer import FileOrganizer
 from file_monitor import FileMonitor
-from config import Config
+from log_writer import FileLogWriter
+from organize_plan import read_plan_header
+from organize_job import OrganizeJob, UNFINISHED_STATUSES, find_unfinished_job, list_jobs, load_job
+from io_budget import IOBudget
+from job_runner import JobRunner
+from config import Config, PLANS_DIR, JOBS_DIR
 import os
+import re
+import uuid
+import atexit
 import logging
+import threading
 
 # Configurar logging
 logging.basicConfig(
@@ -30,6 +40,10 @@ db.init_app(app)
 file_tree = None
 file_organizer = None
 file_monitor = None
+file_log_writer = None
+job_runner = None
+# Serializa la comprobación de trabajos sin terminar y la creación del nuevo
+folder_jobs_lock = threading.Lock()
 
 
 def init_database():
@@ -54,11 +68,11 @@ def init_database():
 
 def init_tree():
     """Inicializa el árbol de organización"""
-    global file_tree, file_organizer, file_monitor
+    global file_tree, file_organizer, file_monitor, file_log_writer, job_runner
 
     # Crear árbol desde la base de datos
     root_path = os.path.join(os.path.expanduser('~'), 'Desktop', 'Organized')
-    file_tree = FileOrganizationTree(root_path)
+    file_tree = FileOrganizationTree(root_path, cache_size=Config.CLASSIFICATION_CACHE_SIZE)
 
     # Cargar nodos y reglas desde la base de datos
     with app.app_context():
@@ -81,7 +95,8 @@ def init_tree():
                         file_tree.root.add_rule(
                             rule_type=rule.rule_type,
                             pattern=rule.pattern,
-                            priority=rule.priority
+                            priority=rule.priority,
+                            is_active=rule.is_active
                         )
                 continue
             else:
@@ -95,11 +110,35 @@ def init_tree():
                             new_node.add_rule(
                                 rule_type=rule.rule_type,
                                 pattern=rule.pattern,
-                                priority=rule.priority
+                                priority=rule.priority,
+                                is_active=rule.is_active
                             )
     
-    # Inicializar organizador con sesión de BD
-    file_organizer = FileOrganizer(file_tree, db.session)
+    # Los logs se escriben por lotes desde un hilo propio (no comparten db.session)
+    if file_log_writer is None:
+        file_log_writer = FileLogWriter(app, Config.LOG_BATCH_SIZE, Config.LOG_FLUSH_INTERVAL_MS)
+        file_log_writer.start()
+        atexit.register(file_log_writer.stop)
+    
+    # Inicializar organizador
+    file_organizer = FileOrganizer(file_tree, workers=Config.ORGANIZE_WORKERS,
+                                   dedupe=Config.DEDUPE_POLICY, log_writer=file_log_writer,
+                                   io_budget=IOBudget(Config.IO_BYTES_PER_SECOND, Config.IO_OPS_PER_SECOND))
+    
+    # Los trabajos de organización se ejecutan en segundo plano con concurrencia limitada
+    job_runner = JobRunner(file_organizer, Config.MAX_CONCURRENT_JOBS, Config.MAX_FINISHED_JOBS)
+    # threading._register_atexit (Python 3.9+) corre antes de que concurrent.futures
+    # espere a sus hilos al salir; en versiones anteriores solo queda atexit, que llega después
+    register_exit = getattr(threading, '_register_atexit', atexit.register)
+    register_exit(job_runner.shutdown, wait=False)
+    
+    # Reanudar los trabajos que quedaron a medias (por ejemplo, tras una caída),
+    # antes de que el monitor pida organizar su carpeta otra vez
+    if Config.RESUME_JOBS_ON_START:
+        for job in list_jobs(JOBS_DIR):
+            if job.status in UNFINISHED_STATUSES:
+                logger.info(f"Reanudando trabajo interrumpido {job.job_id} (posición {job.meta['position']})")
+                job_runner.submit(job)
     
     # Inicializar monitor
     monitor_config = MonitorConfig.query.first()
@@ -108,7 +147,8 @@ def init_tree():
             file_organizer,
             watch_folder=monitor_config.watch_folder,
             auto_organize=monitor_config.auto_organize,
-            recursive=monitor_config.recursive
+            recursive=monitor_config.recursive,
+            organize_existing=submit_folder_job
         )
         
         # Auto-iniciar el monitor si estaba activo
@@ -125,6 +165,21 @@ def init_tree():
     logger.info("Árbol de organización inicializado")
 
 
+def submit_folder_job(folder_path, recursive=False, action='move', workers=None, plan_path=None):
+    """
+    Organiza una carpeta como trabajo en segundo plano (o aplica un plan guardado de ella)
+    
+    Si ya hay un trabajo sin terminar sobre la carpeta (por ejemplo, uno que
+    se está reanudando tras reiniciar) no se crea otro y se devuelve None.
+    """
+    with folder_jobs_lock:
+        pending = find_unfinished_job(JOBS_DIR, folder_path)
+        if pending:
+            logger.info(f"Ya hay un trabajo sin terminar para {folder_path} ({pending.job_id}); no se crea otro")
+            return None
+        return job_runner.submit(OrganizeJob.create(JOBS_DIR, folder_path, recursive, action, workers, plan_path))
+
+
 # ==================== RUTAS DE LA API ====================
 
 @app.route('/api/health', methods=['GET'])
@@ -264,6 +319,7 @@ def update_node(node_id):
             }), 400
 
         data = request.get_json()
+        old_path = node.path
 
         if 'name' in data:
             node.name = data['name']
@@ -278,8 +334,8 @@ def update_node(node_id):
 
         # Actualizar árbol en memoria
         if file_tree:
-            # Buscar el nodo en el árbol y actualizarlo
-            tree_node = file_tree.find_node_by_path(node.path)
+            # Buscar el nodo en el árbol (por su ruta anterior) y actualizarlo
+            tree_node = file_tree.find_node_by_path(old_path)
             if tree_node:
                 if 'name' in data:
                     tree_node.name = data['name']
@@ -321,9 +377,16 @@ def delete_node(node_id):
                 'message': 'No se puede eliminar el nodo raíz'
             }), 400
 
+        node_path = node.path
         db.session.delete(node)
         db.session.commit()
 
+        # Actualizar árbol en memoria
+        if file_tree:
+            tree_node = file_tree.find_node_by_path(node_path)
+            if tree_node and tree_node.parent:
+                tree_node.parent.remove_child(tree_node)
+
         return jsonify({
             'success': True,
             'message': 'Nodo eliminado'
@@ -370,6 +433,14 @@ def create_rule():
             if pattern and not pattern.startswith('.'):
                 pattern = '.' + pattern
         
+        try:
+            validate_rule_pattern(data['rule_type'], pattern)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        
         new_rule = OrganizationRule(
             node_id=data['node_id'],
             rule_type=data['rule_type'],
@@ -391,7 +462,8 @@ def create_rule():
                     tree_node.add_rule(
                         rule_type=new_rule.rule_type,
                         pattern=new_rule.pattern,
-                        priority=new_rule.priority
+                        priority=new_rule.priority,
+                        is_active=new_rule.is_active
                     )
 
         logger.info(f"Regla creada: {new_rule.rule_type} - {new_rule.pattern} para nodo {data['node_id']}")
@@ -429,6 +501,13 @@ def update_rule(rule_id):
             if rule.rule_type == 'extension':
                 if pattern and not pattern.startswith('.'):
                     pattern = '.' + pattern
+            try:
+                validate_rule_pattern(rule.rule_type, pattern)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': str(e)
+                }), 400
             rule.pattern = pattern
         if 'priority' in data:
             rule.priority = data['priority']
@@ -445,13 +524,14 @@ def update_rule(rule_id):
                 tree_node = file_tree.find_node_by_path(node.path)
                 if tree_node:
                     # Limpiar reglas existentes y recargar
-                    tree_node.rules = []
+                    tree_node.clear_rules()
                     node_rules = OrganizationRule.query.filter_by(node_id=rule.node_id).all()
                     for node_rule in node_rules:
                         tree_node.add_rule(
                             rule_type=node_rule.rule_type,
                             pattern=node_rule.pattern,
-                            priority=node_rule.priority
+                            priority=node_rule.priority,
+                            is_active=node_rule.is_active
                         )
 
         logger.info(f"Regla actualizada: {rule.rule_type} - {rule.pattern}")
@@ -492,13 +572,14 @@ def delete_rule(rule_id):
                 tree_node = file_tree.find_node_by_path(node.path)
                 if tree_node:
                     # Limpiar reglas existentes y recargar
-                    tree_node.rules = []
+                    tree_node.clear_rules()
                     node_rules = OrganizationRule.query.filter_by(node_id=rule.node_id).all()
                     for node_rule in node_rules:
                         tree_node.add_rule(
                             rule_type=node_rule.rule_type,
                             pattern=node_rule.pattern,
-                            priority=node_rule.priority
+                            priority=node_rule.priority,
+                            is_active=node_rule.is_active
                         )
 
         return jsonify({
@@ -687,30 +768,25 @@ def get_monitor_files():
                 'message': 'Monitor no inicializado'
             }), 500
         
-        files = file_monitor.scan_existing_files()
+        # Tamaño y stat vienen del escaneo: ningún archivo se vuelve a consultar
+        records = file_monitor.scan_existing_records()
+        
+        # Buscar destino según reglas para todos los archivos a la vez
+        destinations = file_tree.classify_many([record.name for record in records],
+                                               [record.path for record in records],
+                                               [record.stat for record in records])
         
-        # Obtener información adicional de cada archivo
         files_info = []
-        for file_path in files:
-            try:
-                filename = os.path.basename(file_path)
-                file_extension = os.path.splitext(filename)[1]
-                file_size = os.path.getsize(file_path)
-                
-                # Buscar destino según reglas
-                destination_node = file_tree.find_destination_for_file(filename, file_extension)
-                
-                files_info.append({
-                    'path': file_path,
-                    'filename': filename,
-                    'extension': file_extension,
-                    'size': file_size,
-                    'destination': destination_node.path if destination_node else None,
-                    'destination_name': destination_node.name if destination_node else None,
-                    'has_rule': destination_node is not None
-                })
-            except Exception as e:
-                logger.error(f"Error procesando archivo {file_path}: {e}")
+        for record, destination_node in zip(records, destinations):
+            files_info.append({
+                'path': record.path,
+                'filename': record.name,
+                'extension': record.extension,
+                'size': record.size,
+                'destination': destination_node.path if destination_node else None,
+                'destination_name': destination_node.name if destination_node else None,
+                'has_rule': destination_node is not None
+            })
         
         return jsonify({
             'success': True,
@@ -738,18 +814,31 @@ def organize_all_files():
                 'message': 'Monitor no inicializado'
             }), 500
         
-        result = file_monitor.organize_existing_files()
-        
-        if 'message' in result and result['message'] == 'No hay reglas definidas para organizar archivos':
+        if not file_tree.has_rules():
             return jsonify({
                 'success': False,
-                'message': result['message']
+                'message': 'No hay reglas definidas para organizar archivos'
             }), 400
         
+        if not file_monitor.watch_folder or not os.path.isdir(file_monitor.watch_folder):
+            return jsonify({
+                'success': False,
+                'message': 'La carpeta monitoreada no existe'
+            }), 404
+        
+        # Trabajo en segundo plano: el progreso y los resultados se consultan en /api/organize/jobs/<id>
+        job = submit_folder_job(file_monitor.watch_folder, file_monitor.recursive)
+        
+        if job is None:
+            return jsonify({
+                'success': False,
+                'message': 'Ya hay un trabajo sin terminar para esta carpeta'
+            }), 409
+        
         return jsonify({
             'success': True,
-            'result': result
-        }), 200
+            'job': job.to_dict()
+        }), 202
     
     except Exception as e:
         logger.error(f"Error organizando archivos: {e}")
@@ -791,11 +880,12 @@ def organize_single_file():
 
 @app.route('/api/organize/folder', methods=['POST'])
 def organize_folder():
-    """Organiza todos los archivos en una carpeta"""
+    """Organiza todos los archivos en una carpeta como trabajo en segundo plano"""
     try:
         data = request.get_json()
         folder_path = data.get('folder_path')
         recursive = data.get('recursive', False)
+        workers = data.get('workers')
         
         if not folder_path:
             return jsonify({
@@ -803,12 +893,30 @@ def organize_folder():
                 'message': 'folder_path es requerido'
             }), 400
         
-        result = file_organizer.organize_folder(folder_path, recursive)
+        if workers is not None and (not isinstance(workers, int) or workers < 1):
+            return jsonify({
+                'success': False,
+                'message': 'workers debe ser un entero mayor que 0'
+            }), 400
+        
+        if not os.path.isdir(folder_path):
+            return jsonify({
+                'success': False,
+                'message': 'La carpeta no existe'
+            }), 404
+        
+        job = submit_folder_job(folder_path, recursive, workers=workers)
+        
+        if job is None:
+            return jsonify({
+                'success': False,
+                'message': 'Ya hay un trabajo sin terminar para esta carpeta'
+            }), 409
         
         return jsonify({
             'success': True,
-            'result': result
-        }), 200
+            'job': job.to_dict()
+        }), 202
     
     except Exception as e:
         logger.error(f"Error organizando carpeta: {e}")
@@ -847,6 +955,454 @@ def preview_organization():
         }), 500
 
 
+def _plan_path(plan_id: str) -> str:
+    """Ruta del archivo de un plan (el id es un uuid en hexadecimal)"""
+    return os.path.join(PLANS_DIR, f'{plan_id}.jsonl')
+
+
+@app.route('/api/organize/plan', methods=['POST'])
+def create_organization_plan():
+    """Previsualiza una carpeta y guarda el resultado como plan para aplicarlo después"""
+    try:
+        data = request.get_json()
+        folder_path = data.get('folder_path')
+        recursive = data.get('recursive', False)
+        
+        if not folder_path:
+            return jsonify({
+                'success': False,
+                'message': 'folder_path es requerido'
+            }), 400
+        
+        plan_id = uuid.uuid4().hex
+        plan = file_organizer.save_plan(folder_path, _plan_path(plan_id), recursive)
+        plan.pop('plan_path')
+        plan['plan_id'] = plan_id
+        
+        return jsonify({
+            'success': True,
+            'plan': plan
+        }), 201
+    
+    except Exception as e:
+        logger.error(f"Error creando plan: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+@app.route('/api/organize/plan/<plan_id>/apply', methods=['POST'])
+def apply_organization_plan(plan_id):
+    """
+    Ejecuta un plan guardado como trabajo en segundo plano, sin volver a clasificar los archivos
+    
+    Si las reglas cambiaron desde que se guardó el plan responde 409 con
+    rules_changed, salvo que se pida force.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        action = data.get('action', 'move')
+        workers = data.get('workers')
+        force = bool(data.get('force', False))
+        
+        if not re.fullmatch(r'[0-9a-f]{32}', plan_id) or not os.path.isfile(_plan_path(plan_id)):
+            return jsonify({
+                'success': False,
+                'message': 'Plan no encontrado'
+            }), 404
+        
+        if action not in ('move', 'copy'):
+            return jsonify({
+                'success': False,
+                'message': "action debe ser 'move' o 'copy'"
+            }), 400
+        
+        if workers is not None and (not isinstance(workers, int) or workers < 1):
+            return jsonify({
+                'success': False,
+                'message': 'workers debe ser un entero mayor que 0'
+            }), 400
+        
+        plan_path = _plan_path(plan_id)
+        header = read_plan_header(plan_path)
+        rules_changed = file_organizer.plan_rules_changed(plan_path)
+        if rules_changed and not force:
+            return jsonify({
+                'success': False,
+                'message': 'Las reglas cambiaron desde que se creó el plan; usa force para aplicarlo igual',
+                'rules_changed': True
+            }), 409
+        
+        job = submit_folder_job(header['folder'], header.get('recursive', False), action, workers, plan_path)
+        if job is None:
+            return jsonify({
+                'success': False,
+                'message': 'Ya hay un trabajo sin terminar para esta carpeta'
+            }), 409
+        
+        # Progreso en /api/organize/jobs/<id> y resultados por páginas en /jobs/<id>/results
+        return jsonify({
+            'success': True,
+            'rules_changed': rules_changed,
+            'job': job.to_dict()
+        }), 202
+    
+    except Exception as e:
+        logger.error(f"Error aplicando plan: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+# ==================== RUTAS DE TRABAJOS ====================
+
+@app.route('/api/organize/jobs', methods=['GET'])
+def get_jobs():
+    """Lista los trabajos de organización"""
+    try:
+        return jsonify({
+            'success': True,
+            'jobs': [job.to_dict() for job in list_jobs(JOBS_DIR)],
+            'runner': job_runner.get_stats()
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Error obteniendo trabajos: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+@app.route('/api/organize/jobs', methods=['POST'])
+def create_job():
+    """Organiza una carpeta como trabajo reanudable en segundo plano"""
+    try:
+        data = request.get_json()
+        folder_path = data.get('folder_path')
+        recursive = data.get('recursive', False)
+        action = data.get('action', 'move')
+        workers = data.get('workers')
+        
+        if not folder_path:
+            return jsonify({
+                'success': False,
+                'message': 'folder_path es requerido'
+            }), 400
+        
+        if action not in ('move', 'copy'):
+            return jsonify({
+                'success': False,
+                'message': "action debe ser 'move' o 'copy'"
+            }), 400
+        
+        if workers is not None and (not isinstance(workers, int) or workers < 1):
+            return jsonify({
+                'success': False,
+                'message': 'workers debe ser un entero mayor que 0'
+            }), 400
+        
+        if not os.path.isdir(folder_path):
+            return jsonify({
+                'success': False,
+                'message': 'La carpeta no existe'
+            }), 404
+        
+        job = submit_folder_job(folder_path, recursive, action, workers)
+        
+        if job is None:
+            return jsonify({
+                'success': False,
+                'message': 'Ya hay un trabajo sin terminar para esta carpeta'
+            }), 409
+        
+        return jsonify({
+            'success': True,
+            'job': job.to_dict()
+        }), 202
+    
+    except Exception as e:
+        logger.error(f"Error creando trabajo: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+@app.route('/api/organize/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Obtiene el estado de un trabajo"""
+    job = load_job(JOBS_DIR, job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': 'Trabajo no encontrado'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job.to_dict(),
+        'active': job_runner.is_active(job_id)
+    }), 200
+
+
+@app.route('/api/organize/jobs/<job_id>', methods=['DELETE'])
+def delete_job(job_id):
+    """Borra un trabajo que no está en cola ni en ejecución (su estado, plan, diario y resultados)"""
+    try:
+        job = load_job(JOBS_DIR, job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'message': 'Trabajo no encontrado'
+            }), 404
+        
+        if job_runner.is_active(job_id):
+            return jsonify({
+                'success': False,
+                'message': 'El trabajo está en ejecución'
+            }), 409
+        
+        job.delete()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Trabajo eliminado'
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Error eliminando trabajo: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+@app.route('/api/organize/jobs/<job_id>/results', methods=['GET'])
+def get_job_results(job_id):
+    """Obtiene una página de los resultados por archivo de un trabajo"""
+    try:
+        job = load_job(JOBS_DIR, job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'message': 'Trabajo no encontrado'
+            }), 404
+        
+        cursor = request.args.get('cursor', 0, type=int)
+        limit = request.args.get('limit', 100, type=int)
+        status = request.args.get('status')
+        
+        if cursor < 0 or not 1 <= limit <= 1000:
+            return jsonify({
+                'success': False,
+                'message': 'cursor debe ser >= 0 y limit estar entre 1 y 1000'
+            }), 400
+        
+        if status not in (None, 'success', 'failed'):
+            return jsonify({
+                'success': False,
+                'message': "status debe ser 'success' o 'failed'"
+            }), 400
+        
+        try:
+            page = job.read_results(cursor, limit, status)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            **page
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Error obteniendo resultados del trabajo: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+@app.route('/api/organize/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancela un trabajo en cola o en ejecución (se detiene al terminar el bloque actual)"""
+    try:
+        job = load_job(JOBS_DIR, job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'message': 'Trabajo no encontrado'
+            }), 404
+        
+        if not job_runner.cancel(job_id):
+            return jsonify({
+                'success': False,
+                'message': 'El trabajo no está en ejecución'
+            }), 409
+        
+        return jsonify({
+            'success': True,
+            'job': load_job(JOBS_DIR, job_id).to_dict()
+        }), 202
+    
+    except Exception as e:
+        logger.error(f"Error cancelando trabajo: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+@app.route('/api/organize/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """Reanuda en segundo plano un trabajo interrumpido desde su último punto de control"""
+    try:
+        job = load_job(JOBS_DIR, job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'message': 'Trabajo no encontrado'
+            }), 404
+        
+        if job_runner.is_active(job_id):
+            return jsonify({
+                'success': False,
+                'message': 'El trabajo está en ejecución'
+            }), 409
+        
+        if job.status in ('completed', 'undone', 'partially_undone'):
+            return jsonify({
+                'success': False,
+                'message': f'El trabajo ya está {job.status}'
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'job': job_runner.submit(job).to_dict()
+        }), 202
+    
+    except Exception as e:
+        logger.error(f"Error reanudando trabajo: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+@app.route('/api/organize/jobs/<job_id>/undo', methods=['POST'])
+def undo_job(job_id):
+    """Deshace todos los movimientos de un trabajo usando su diario"""
+    try:
+        job = load_job(JOBS_DIR, job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'message': 'Trabajo no encontrado'
+            }), 404
+        
+        if job_runner.is_active(job_id):
+            return jsonify({
+                'success': False,
+                'message': 'El trabajo está en ejecución'
+            }), 409
+        
+        result = file_organizer.undo_job(job)
+        
+        return jsonify({
+            'success': True,
+            'result': result,
+            'job': job.to_dict()
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Error deshaciendo trabajo: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+@app.route('/api/organize/stats', methods=['GET'])
+def get_organize_stats():
+    """Obtiene las estadísticas del organizador (contadores, latencias, errores y cachés)"""
+    try:
+        return jsonify({
+            'success': True,
+            'stats': file_organizer.get_stats()
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Error obteniendo estadísticas del organizador: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+@app.route('/api/organize/stats/reset', methods=['POST'])
+def reset_organize_stats():
+    """Reinicia los contadores, latencias y errores del organizador"""
+    try:
+        file_organizer.reset_stats()
+        
+        return jsonify({
+            'success': True,
+            'stats': file_organizer.get_stats()
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Error reiniciando estadísticas del organizador: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+@app.route('/api/organize/budget', methods=['GET'])
+def get_io_budget():
+    """Obtiene el presupuesto de E/S de las operaciones masivas y su consumo"""
+    return jsonify({
+        'success': True,
+        'budget': file_organizer.io_budget.get_stats()
+    }), 200
+
+
+@app.route('/api/organize/budget', methods=['PUT'])
+def update_io_budget():
+    """Cambia en caliente el presupuesto de E/S (0 = sin límite)"""
+    try:
+        data = request.get_json() or {}
+        limits = {}
+        for key in ('bytes_per_second', 'ops_per_second'):
+            if key in data:
+                value = data[key]
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                    return jsonify({
+                        'success': False,
+                        'message': f'{key} debe ser un número mayor o igual a 0'
+                    }), 400
+                limits[key] = value
+        
+        file_organizer.io_budget.configure(**limits)
+        
+        return jsonify({
+            'success': True,
+            'budget': file_organizer.io_budget.get_stats()
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Error actualizando presupuesto de E/S: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
 # ==================== RUTAS DE LOGS ====================
 
 @app.route('/api/logs', methods=['GET'])
@@ -854,6 +1410,9 @@ def get_logs():
     """Obtiene el historial de logs"""
     try:
         limit = request.args.get('limit', 100, type=int)
+        if file_log_writer is not None:
+            # Incluir los logs encolados, sin bloquear la petición si el escritor va atrasado
+            file_log_writer.flush(Config.LOG_FLUSH_TIMEOUT)
         logs = FileLog.query.order_by(FileLog.timestamp.desc()).limit(limit).all()
         
         return jsonify({
@@ -873,6 +1432,8 @@ def get_logs():
 def get_log_stats():
     """Obtiene estadísticas de los logs"""
     try:
+        if file_log_writer is not None:
+            file_log_writer.flush(Config.LOG_FLUSH_TIMEOUT)
         total_logs = FileLog.query.count()
         success_logs = FileLog.query.filter_by(status='success').count()
         failed_logs = FileLog.query.filter_by(status='failed').count()
@@ -882,7 +1443,8 @@ def get_log_stats():
             'stats': {
                 'total': total_logs,
                 'success': success_logs,
-                'failed': failed_logs
+                'failed': failed_logs,
+                'queue_depth': file_log_writer.queue_depth if file_log_writer is not None else 0
             }
         }), 200
     
@@ -5,6 +5,8 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATABASE_PATH = os.path.join(BASE_DIR, 'backend', 'database.db')
 LOGS_DIR = os.path.join(BASE_DIR, 'logs')
+PLANS_DIR = os.path.join(BASE_DIR, 'backend', 'plans')
+JOBS_DIR = os.path.join(BASE_DIR, 'backend', 'jobs')
 
 # Crear directorio de logs si no existe
 os.makedirs(LOGS_DIR, exist_ok=True)
@@ -23,3 +25,15 @@ class Config:
     # Configuración de organización
     MAX_DEPTH = 10  # Profundidad máxima del árbol
     ENABLE_AUTO_ORGANIZE = True
+    CLASSIFICATION_CACHE_SIZE = 10000  # Resultados de clasificación en caché (LRU)
+    ORGANIZE_WORKERS = 4  # Hilos para organizar carpetas completas (1 = secuencial)
+    DEDUPE_POLICY = 'off'  # Archivos idénticos en el destino: off, skip, delete, hardlink
+    LOG_BATCH_SIZE = 500  # Registros de FileLog por transacción
+    LOG_FLUSH_INTERVAL_MS = 200  # Espera máxima antes de escribir un lote incompleto
+    LOG_FLUSH_TIMEOUT = 2.0  # Segundos que /api/logs espera a los logs encolados antes de leer
+    RESUME_JOBS_ON_START = True  # Reanudar al iniciar los trabajos que quedaron a medias
+    MAX_CONCURRENT_JOBS = 2  # Trabajos de organización en segundo plano a la vez (el resto espera en cola)
+    MAX_FINISHED_JOBS = 50  # Trabajos terminados que se conservan en disco; los más antiguos se borran
+    # Presupuesto de E/S de las operaciones masivas (0 = sin límite); el monitor no lo usa
+    IO_BYTES_PER_SECOND = int(os.environ.get('IO_BYTES_PER_SECOND') or 0)
+    IO_OPS_PER_SECOND = int(os.environ.get('IO_OPS_PER_SECOND') or 0)
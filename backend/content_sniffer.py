@@ -0,0 +1,166 @@
+"""
+Detección del tipo de contenido de un archivo por sus bytes iniciales (magic bytes)
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+# Bytes que se leen como máximo de cada archivo
+SNIFF_BYTES = 64
+
+# Tipo -> tipo MIME. Un tipo puede pertenecer a otro más general (ver CONTENT_TYPE_PARENTS)
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+    'zip': 'application/zip',
+    'office': 'application/vnd.openxmlformats-officedocument',
+    'ole': 'application/x-ole-storage',
+    'gzip': 'application/gzip',
+    '7z': 'application/x-7z-compressed',
+    'rar': 'application/vnd.rar',
+    'mp4': 'video/mp4',
+    'mov': 'video/quicktime',
+    'mp3': 'audio/mpeg',
+    'wav': 'audio/wav',
+    'exe': 'application/x-msdownload',
+    'elf': 'application/x-elf'
+}
+
+# Un documento de Office (docx, xlsx, pptx) también es un zip
+CONTENT_TYPE_PARENTS = {
+    'office': 'zip'
+}
+
+_MIME_TO_TYPE = {mime: name for name, mime in CONTENT_TYPES.items()}
+_MIME_TO_TYPE['image/jpg'] = 'jpeg'
+_OFFICE_ENTRIES = (b'[Content_Types].xml', b'_rels/', b'docProps/', b'word/', b'xl/', b'ppt/')
+_ALIASES = {'jpg': 'jpeg', 'docx': 'office', 'xlsx': 'office', 'pptx': 'office', 'mpeg4': 'mp4'}
+
+
+def normalize_content_type(pattern: str) -> str:
+    """
+    Normaliza el patrón de una regla content_type ('PDF', 'application/pdf', 'jpg'...)
+
+    Raises:
+        ValueError: Si el tipo no es conocido
+    """
+    value = pattern.strip().lower()
+    value = _MIME_TO_TYPE.get(value, _ALIASES.get(value, value))
+    if value not in CONTENT_TYPES:
+        raise ValueError(f"Tipo de contenido desconocido: {pattern!r} (válidos: {', '.join(CONTENT_TYPES)})")
+    return value
+
+
+def detect_content_type(header: bytes) -> Optional[str]:
+    """Identifica el tipo de contenido a partir de los primeros bytes del archivo"""
+    if header.startswith(b'%PDF-'):
+        return 'pdf'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if header.startswith((b'GIF87a', b'GIF89a')):
+        return 'gif'
+    if header.startswith(b'RIFF') and header[8:12] == b'WEBP':
+        return 'webp'
+    if header.startswith(b'RIFF') and header[8:12] == b'WAVE':
+        return 'wav'
+    if header.startswith((b'PK\x03\x04', b'PK\x05\x06', b'PK\x07\x08')):
+        # En OOXML la primera entrada (nombre en el offset 30) es del paquete de Office
+        if header[30:].startswith(_OFFICE_ENTRIES):
+            return 'office'
+        return 'zip'
+    if header.startswith(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'):
+        return 'ole'
+    if header.startswith(b'\x1f\x8b'):
+        return 'gzip'
+    if header.startswith(b"7z\xbc\xaf'\x1c"):
+        return '7z'
+    if header.startswith(b'Rar!\x1a\x07'):
+        return 'rar'
+    if header[4:8] == b'ftyp':
+        return 'mov' if header[8:12] == b'qt  ' else 'mp4'
+    if header.startswith(b'ID3') or header[:2] in (b'\xff\xfb', b'\xff\xf3', b'\xff\xf2'):
+        return 'mp3'
+    if header.startswith(b'MZ'):
+        return 'exe'
+    if header.startswith(b'\x7fELF'):
+        return 'elf'
+    return None
+
+
+def content_type_matches(detected: Optional[str], expected: str) -> bool:
+    """Indica si un tipo detectado cumple una regla (incluidos los tipos generales)"""
+    return detected is not None and (detected == expected or CONTENT_TYPE_PARENTS.get(detected) == expected)
+
+
+class ContentSniffer:
+    """
+    Detector de tipo de contenido con caché acotada
+
+    El resultado se guarda por (ruta, dispositivo, inodo, mtime, tamaño), así
+    que un archivo sin cambios no se vuelve a leer en escaneos posteriores. La
+    ruta forma parte de la clave porque en Windows el stat de os.scandir trae
+    st_ino y st_dev en 0: sin ella, dos archivos con igual tamaño y mtime
+    compartirían el tipo detectado.
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self.reads = 0
+        self.hits = 0
+        self._cache: 'OrderedDict[Tuple[str, int, int, int, int], Optional[str]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def detect(self, file_path: str, st: os.stat_result) -> Optional[str]:
+        """
+        Obtiene el tipo de contenido de un archivo
+
+        Args:
+            file_path: Ruta del archivo
+            st: stat del archivo (para la clave de la caché)
+
+        Returns:
+            El tipo detectado o None si no se reconoce o no se puede leer
+        """
+        key = (os.path.normcase(os.path.abspath(file_path)), st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        try:
+            with open(file_path, 'rb') as f:
+                header = f.read(SNIFF_BYTES)
+        except OSError:
+            return None
+
+        content_type = detect_content_type(header)
+
+        with self._lock:
+            self.reads += 1
+            self._cache[key] = content_type
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+        return content_type
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtiene lecturas, aciertos de caché y ocupación"""
+        with self._lock:
+            return {
+                'reads': self.reads,
+                'hits': self.hits,
+                'size': len(self._cache),
+                'max_entries': self.max_entries
+            }
+
+
+# Detector compartido por todos los índices de reglas del proceso
+content_sniffer = ContentSniffer()
@@ -0,0 +1,125 @@
+"""
+Comparación de archivos por contenido: tamaño, luego hash parcial y luego hash completo
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Tuple, Union
+
+# Bytes del principio y del final que entran en el hash parcial
+PARTIAL_HASH_BYTES = 64 * 1024
+HASH_BUFFER_SIZE = 1024 * 1024
+
+
+def _new_hash():
+    return hashlib.blake2b(digest_size=16)
+
+
+def _partial_hash(file_path: str, size: int) -> bytes:
+    """Hash del primer y último bloque del archivo (más el tamaño)"""
+    digest = _new_hash()
+    digest.update(size.to_bytes(8, 'little'))
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(PARTIAL_HASH_BYTES))
+        if size > 2 * PARTIAL_HASH_BYTES:
+            f.seek(size - PARTIAL_HASH_BYTES)
+            digest.update(f.read(PARTIAL_HASH_BYTES))
+        elif size > PARTIAL_HASH_BYTES:
+            digest.update(f.read())
+    return digest.digest()
+
+
+def _full_hash(file_path: str) -> bytes:
+    """Hash de todo el contenido, leído por bloques"""
+    digest = _new_hash()
+    buffer = memoryview(bytearray(HASH_BUFFER_SIZE))
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(buffer[:read])
+    return digest.digest()
+
+
+class FileHasher:
+    """
+    Calcula y guarda en caché los hashes de archivos
+
+    Los hashes se guardan por (dispositivo, inodo, mtime, tamaño), así que un
+    archivo del destino que recibe el mismo documento una y otra vez se lee
+    una sola vez. En sistemas de archivos sin números de inodo (st_ino en 0)
+    la clave usa la ruta en su lugar.
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self.partial_hashes = 0
+        self.full_hashes = 0
+        self.hits = 0
+        self._cache: 'OrderedDict[Tuple[str, int, Union[int, str], int, int], bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, kind: str, file_path: str, st: os.stat_result) -> bytes:
+        identity = st.st_ino or os.path.normcase(os.path.abspath(file_path))
+        key = (kind, st.st_dev, identity, st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        if kind == 'partial':
+            value = _partial_hash(file_path, st.st_size)
+        else:
+            value = _full_hash(file_path)
+
+        with self._lock:
+            if kind == 'partial':
+                self.partial_hashes += 1
+            else:
+                self.full_hashes += 1
+            self._cache[key] = value
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+        return value
+
+    def identical(self, path_a: str, path_b: str) -> bool:
+        """
+        Indica si dos archivos tienen exactamente el mismo contenido
+
+        Compara primero el tamaño, después el hash parcial y solo al final el
+        hash completo. Dos rutas al mismo inodo son idénticas.
+        """
+        st_a = os.stat(path_a)
+        st_b = os.stat(path_b)
+
+        # Sin números de inodo, samestat no distingue archivos distintos
+        if st_a.st_ino and os.path.samestat(st_a, st_b):
+            return True
+        if st_a.st_size != st_b.st_size:
+            return False
+        if self._get('partial', path_a, st_a) != self._get('partial', path_b, st_b):
+            return False
+        # Si el hash parcial cubre todo el archivo, ya es la comparación completa
+        if st_a.st_size <= 2 * PARTIAL_HASH_BYTES:
+            return True
+        return self._get('full', path_a, st_a) == self._get('full', path_b, st_b)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtiene hashes calculados, aciertos de caché y ocupación"""
+        with self._lock:
+            return {
+                'partial_hashes': self.partial_hashes,
+                'full_hashes': self.full_hashes,
+                'hits': self.hits,
+                'size': len(self._cache),
+                'max_entries': self.max_entries
+            }
+
+
+# Calculador compartido por todos los organizadores del proceso
+file_hasher = FileHasher()
@@ -6,6 +6,7 @@ import time
 import threading
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from file_scanner import scan_files
 import logging
 
 # Configurar logging
@@ -98,7 +99,8 @@ class FileEventHandler(FileSystemEventHandler):
 class FileMonitor:
     """Monitor de carpetas para detectar nuevos archivos"""
     
-    def __init__(self, organizer, watch_folder=None, auto_organize=True, recursive=False):
+    def __init__(self, organizer, watch_folder=None, auto_organize=True, recursive=False,
+                 organize_existing=None):
         """
         Inicializa el monitor de archivos
         
@@ -107,11 +109,15 @@ class FileMonitor:
             watch_folder: Carpeta a monitorear
             auto_organize: Si debe organizar automáticamente
             recursive: Si debe monitorear subcarpetas
+            organize_existing: Función (carpeta, recursivo) que organiza los archivos
+                existentes al iniciar, por ejemplo como trabajo en segundo plano
+                (por defecto organize_existing_files en el mismo hilo)
         """
         self.organizer = organizer
         self.watch_folder = watch_folder
         self.auto_organize = auto_organize
         self.recursive = recursive
+        self.organize_existing = organize_existing
         
         self.observer = None
         self.event_handler = None
@@ -146,8 +152,11 @@ class FileMonitor:
             # Organizar archivos existentes si auto_organize está activado y hay reglas
             if self.auto_organize and self.organizer.tree.has_rules():
                 logger.info("Organizando archivos existentes al iniciar monitor...")
-                result = self.organize_existing_files()
-                logger.info(f"Organización inicial completada: {result.get('stats', {})}")
+                if self.organize_existing:
+                    self.organize_existing(self.watch_folder, self.recursive)
+                else:
+                    result = self.organize_existing_files()
+                    logger.info(f"Organización inicial completada: {result.get('stats', {})}")
             
             return True
         
@@ -217,8 +226,8 @@ class FileMonitor:
             return True
         return False
     
-    def scan_existing_files(self):
-        """Escanea archivos existentes en la carpeta monitoreada"""
+    def scan_existing_records(self):
+        """Escanea archivos existentes en la carpeta monitoreada (FileRecord con su stat)"""
         if not self.watch_folder or not os.path.exists(self.watch_folder):
             logger.error("Carpeta de monitoreo no válida")
             return []
@@ -226,17 +235,7 @@ class FileMonitor:
         existing_files = []
         
         try:
-            if self.recursive:
-                for root, dirs, files in os.walk(self.watch_folder):
-                    for filename in files:
-                        file_path = os.path.join(root, filename)
-                        existing_files.append(file_path)
-            else:
-                for item in os.listdir(self.watch_folder):
-                    file_path = os.path.join(self.watch_folder, item)
-                    if os.path.isfile(file_path):
-                        existing_files.append(file_path)
-            
+            existing_files = list(scan_files(self.watch_folder, self.recursive))
             logger.info(f"Encontrados {len(existing_files)} archivos existentes")
         
         except Exception as e:
@@ -244,6 +243,10 @@ class FileMonitor:
         
         return existing_files
     
+    def scan_existing_files(self):
+        """Escanea archivos existentes en la carpeta monitoreada"""
+        return [record.path for record in self.scan_existing_records()]
+    
     def organize_existing_files(self):
         """Organiza todos los archivos existentes en la carpeta"""
         if not self.organizer.tree.has_rules():
@@ -254,12 +257,8 @@ class FileMonitor:
                 'message': 'No hay reglas definidas para organizar archivos'
             }
         
-        existing_files = self.scan_existing_files()
-        results = []
-        
-        for file_path in existing_files:
-            result = self.organizer.organize_file(file_path)
-            results.append(result)
+        existing_files = self.scan_existing_records()
+        results = self.organizer.organize_records(existing_files)
         
         return {
             'total_files': len(existing_files),
@@ -267,6 +266,20 @@ class FileMonitor:
             'stats': self.organizer.get_stats()
         }
     
+    def iter_organize_existing_files(self, summary=None):
+        """
+        Organiza los archivos existentes entregando cada resultado a medida que se produce
+        
+        Args:
+            summary: OrganizeSummary que se actualiza con cada resultado (opcional)
+        """
+        if not self.watch_folder or not os.path.exists(self.watch_folder):
+            logger.error("Carpeta de monitoreo no válida")
+            return iter(())
+        if not self.organizer.tree.has_rules():
+            return iter(())
+        return self.organizer.iter_organize_folder(self.watch_folder, self.recursive, summary=summary)
+    
     def __del__(self):
         """Destructor para asegurar que el monitor se detenga"""
         if self.is_running:
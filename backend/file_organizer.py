@@ -2,12 +2,23 @@
 Módulo para organizar archivos según las reglas del árbol
 """
 import os
-import shutil
+import time
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Iterable, Iterator, List
 from datetime import datetime
 import logging
 from models import FileLog
+from content_sniffer import content_sniffer
+from file_transfer import move_file, copy_file, known_directories, partial_path, LINK_SUFFIX
+from file_hasher import file_hasher
+from file_scanner import scan_files, FileRecord
+from organize_plan import PlanEntry, PlanWriter, iter_plan, read_plan_header
+from organize_job import OrganizeJob, JobCancelled
+from organizer_stats import OrganizerStats
+from io_budget import IOBudget
 
 # Configurar logging
 logging.basicConfig(
@@ -16,38 +27,386 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Cantidad de archivos que se clasifican juntos en las operaciones por lotes
+CLASSIFY_BATCH_SIZE = 1000
+
+# Qué hacer cuando el destino ya tiene un archivo idéntico con el mismo nombre:
+# off (crear name_N como siempre), skip (no tocar el origen), delete (borrar el
+# origen al mover) o hardlink (reemplazar el origen por un enlace al destino)
+DEDUPE_POLICIES = ('off', 'skip', 'delete', 'hardlink')
+
+
+class DirectoryNameCache:
+    """
+    Nombres ocupados en cada directorio destino y siguiente sufijo libre por nombre
+    
+    Cada directorio se lee una sola vez con scandir y luego se mantiene al día
+    con nuestros propios movimientos, así que resolver un duplicado no exige
+    probar name_1, name_2, ... con un stat por intento.
+    
+    Un nombre reservado queda pendiente hasta que su archivo se coloca
+    (commit) o se descarta (release): todavía no está en disco, pero ningún
+    otro archivo puede tomarlo, aunque se invalide la caché del directorio.
+    """
+    
+    def __init__(self):
+        self._names: Dict[str, set] = {}
+        self._next_suffix: Dict[str, Dict[tuple, int]] = {}
+        self._pending: Dict[str, set] = {}
+        self._lock = threading.Lock()
+    
+    def _load(self, directory: str) -> set:
+        """Obtiene los nombres de un directorio, leyéndolo si no está en caché"""
+        names = self._names.get(directory)
+        if names is None:
+            try:
+                with os.scandir(directory) as entries:
+                    names = {os.path.normcase(entry.name) for entry in entries}
+            except FileNotFoundError:
+                names = set()
+            names |= self._pending.get(directory, set())
+            self._names[directory] = names
+            self._next_suffix[directory] = {}
+        return names
+    
+    def reserve(self, directory: str, filename: str) -> str:
+        """
+        Reserva un nombre libre en el directorio: el original o name_N
+        
+        La caché solo evita probar los nombres que sabemos ocupados; el
+        nombre elegido se comprueba en disco (un lstat), así que un archivo
+        creado por fuera después de leer el directorio no se sobrescribe, y
+        un archivo borrado por fuera deja libre su nombre.
+        
+        Returns:
+            El nombre reservado (sin el directorio)
+        """
+        with self._lock:
+            names = self._load(directory)
+            pending = self._pending.setdefault(directory, set())
+            if os.path.normcase(filename) in names and os.path.normcase(filename) not in pending and \
+                    not os.path.lexists(os.path.join(directory, filename)):
+                # Se borró por fuera después de leer el directorio
+                names.discard(os.path.normcase(filename))
+            
+            name, extension = os.path.splitext(filename)
+            suffixes = self._next_suffix[directory]
+            candidate = filename
+            counter = None
+            while True:
+                if os.path.normcase(candidate) not in names:
+                    if not os.path.lexists(os.path.join(directory, candidate)):
+                        break
+                    # Se creó por fuera después de leer el directorio
+                    names.add(os.path.normcase(candidate))
+                counter = suffixes.get((name, extension), 1) if counter is None else counter + 1
+                candidate = f"{name}_{counter}{extension}"
+            
+            names.add(os.path.normcase(candidate))
+            pending.add(os.path.normcase(candidate))
+            if counter is not None:
+                suffixes[(name, extension)] = counter + 1
+            return candidate
+    
+    def commit(self, directory: str, filename: str):
+        """Marca como colocado en disco un nombre reservado"""
+        with self._lock:
+            self._pending.get(directory, set()).discard(os.path.normcase(filename))
+    
+    def is_taken(self, directory: str, filename: str) -> bool:
+        """Indica si el nombre ya existe en el directorio (sin contar las reservas pendientes)"""
+        key = os.path.normcase(filename)
+        with self._lock:
+            return key in self._load(directory) and key not in self._pending.get(directory, set())
+    
+    def release(self, directory: str, filename: str):
+        """Libera un nombre reservado que finalmente no se usó (o cuyo archivo se borró)"""
+        key = os.path.normcase(filename)
+        with self._lock:
+            self._pending.get(directory, set()).discard(key)
+            names = self._names.get(directory)
+            if names is not None:
+                names.discard(key)
+    
+    def invalidate(self, directory: Optional[str] = None):
+        """Descarta la caché de un directorio (o de todos); las reservas pendientes se conservan"""
+        with self._lock:
+            if directory is None:
+                self._names.clear()
+                self._next_suffix.clear()
+            else:
+                self._names.pop(directory, None)
+                self._next_suffix.pop(directory, None)
+
+
+class OrganizeSummary:
+    """
+    Resumen acumulado de una organización o previsualización en curso
+    
+    Se actualiza con cada resultado que producen los generadores iter_*, así
+    que ocupa lo mismo para mil archivos que para varios millones.
+    """
+    
+    def __init__(self):
+        self.total_files = 0
+        self.files_organized = 0
+        self.files_failed = 0
+        self.files_deduplicated = 0
+        self.files_skipped = 0
+        self.files_with_rules = 0
+        self.files_without_rules = 0
+        # Archivos por carpeta destino (como mucho, un contador por nodo del árbol)
+        self.by_destination: Dict[str, int] = {}
+    
+    def add_result(self, result: Dict[str, Any]):
+        """Acumula el resultado de organizar un archivo"""
+        self.total_files += 1
+        if result['action'] in ('already_organized', 'source_changed'):
+            self.files_skipped += 1
+            return
+        if not result['success']:
+            self.files_failed += 1
+            return
+        if result['action'].startswith('duplicate_'):
+            self.files_deduplicated += 1
+        else:
+            self.files_organized += 1
+        self._add_destination(os.path.dirname(result['destination_path']))
+    
+    def add_preview(self, file_info: Dict[str, Any]):
+        """Acumula una entrada de la previsualización"""
+        self.total_files += 1
+        if file_info['has_rule']:
+            self.files_with_rules += 1
+            self._add_destination(file_info['destination'])
+        else:
+            self.files_without_rules += 1
+    
+    def _add_destination(self, destination: str):
+        self.by_destination[destination] = self.by_destination.get(destination, 0) + 1
+    
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> 'OrganizeSummary':
+        """Reconstruye un resumen guardado con to_dict (por ejemplo, al reanudar un trabajo)"""
+        summary = cls()
+        for key, value in (data or {}).items():
+            if key == 'by_destination':
+                summary.by_destination = dict(value)
+            elif hasattr(summary, key):
+                setattr(summary, key, value)
+        return summary
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'total_files': self.total_files,
+            'files_organized': self.files_organized,
+            'files_failed': self.files_failed,
+            'files_deduplicated': self.files_deduplicated,
+            'files_skipped': self.files_skipped,
+            'files_with_rules': self.files_with_rules,
+            'files_without_rules': self.files_without_rules,
+            'by_destination': dict(self.by_destination)
+        }
+
 
 class FileOrganizer:
     """Clase para organizar archivos automáticamente"""
     
-    def __init__(self, tree, db_session=None):
+    def __init__(self, tree, db_session=None, workers: int = 1, dedupe: str = 'off',
+                 log_writer=None, io_budget: Optional[IOBudget] = None):
         """
         Inicializa el organizador de archivos
         
         Args:
             tree: Instancia de FileOrganizationTree
-            db_session: Sesión de base de datos (opcional)
+            db_session: Sesión de base de datos (opcional, sin log_writer)
+            workers: Hilos por defecto para las operaciones por lotes (1 = secuencial)
+            dedupe: Política para archivos idénticos en el destino (ver DEDUPE_POLICIES)
+            log_writer: FileLogWriter que escribe los logs por lotes en su propio hilo (opcional)
+            io_budget: Límite de bytes y operaciones por segundo de las operaciones masivas
+                (compartido por todos los hilos; por defecto sin límite)
         """
+        if dedupe not in DEDUPE_POLICIES:
+            raise ValueError(f"Política de duplicados inválida: {dedupe!r} (válidas: {', '.join(DEDUPE_POLICIES)})")
+        
         self.tree = tree
         self.db_session = db_session
-        self.stats = {
-            'files_processed': 0,
-            'files_moved': 0,
-            'files_failed': 0,
-            'errors': []
-        }
+        self.log_writer = log_writer
+        self.workers = max(1, workers)
+        self.dedupe = dedupe
+        # Un lock por directorio destino: serializa la resolución de duplicados y el movimiento
+        self._directory_locks: Dict[str, threading.Lock] = {}
+        self._directory_locks_guard = threading.Lock()
+        self.directory_names = DirectoryNameCache()
+        # Trabajos en ejecución en este proceso (para no ejecutar dos veces el mismo)
+        self._active_jobs = set()
+        self._jobs_lock = threading.Lock()
+        # Contadores, últimos errores y latencias por fase (seguro entre hilos, tamaño fijo)
+        self.stats = OrganizerStats()
+        self.io_budget = io_budget if io_budget is not None else IOBudget()
+    
+    def organize_file(self, file_path: str, action: str = 'move', throttled: bool = False) -> Dict[str, Any]:
+        """
+        Organiza un archivo individual
+        
+        Args:
+            file_path: Ruta del archivo a organizar
+            action: 'move' o 'copy'
+            throttled: Si debe respetar io_budget (por defecto no: los archivos
+                sueltos del monitor no esperan detrás de las operaciones masivas)
+        
+        Returns:
+            Diccionario con el resultado de la operación
+        """
+        return self._organize_file(file_path, action, throttled=throttled)
+    
+    def organize_files(self, file_paths: Iterable[str], action: str = 'move',
+                       workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Organiza un lote de archivos clasificándolos en bloques
+        
+        Args:
+            file_paths: Rutas de los archivos a organizar
+            action: 'move' o 'copy'
+            workers: Hilos a usar (por defecto self.workers; 1 = secuencial)
+        
+        Returns:
+            Lista con el resultado de cada archivo, en el mismo orden
+        """
+        return list(self.iter_organize_files(file_paths, action, workers))
+    
+    def organize_records(self, records: Iterable[FileRecord], action: str = 'move',
+                         workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Organiza archivos obtenidos con scan_files, reutilizando su stat
+        
+        Args:
+            records: FileRecord de los archivos a organizar
+            action: 'move' o 'copy'
+            workers: Hilos a usar (por defecto self.workers; 1 = secuencial)
+        
+        Returns:
+            Lista con el resultado de cada archivo, en el mismo orden
+        """
+        return list(self.iter_organize_records(records, action, workers))
+    
+    def iter_organize_files(self, file_paths: Iterable[str], action: str = 'move',
+                            workers: Optional[int] = None,
+                            summary: Optional[OrganizeSummary] = None) -> Iterator[Dict[str, Any]]:
+        """Como organize_files, pero entrega cada resultado a medida que se produce"""
+        return self._iter_organize_entries(((file_path, None) for file_path in file_paths),
+                                           action, workers, summary)
+    
+    def iter_organize_records(self, records: Iterable[FileRecord], action: str = 'move',
+                              workers: Optional[int] = None,
+                              summary: Optional[OrganizeSummary] = None) -> Iterator[Dict[str, Any]]:
+        """Como organize_records, pero entrega cada resultado a medida que se produce"""
+        return self._iter_organize_entries(((record.path, record.stat) for record in records),
+                                           action, workers, summary)
+    
+    def _iter_organize_entries(self, entries: Iterable[tuple], action: str, workers: Optional[int],
+                               summary: Optional[OrganizeSummary]) -> Iterator[Dict[str, Any]]:
+        """
+        Organiza pares (ruta, stat o None) en bloques de CLASSIFY_BATCH_SIZE
+        
+        Solo se mantiene en memoria el bloque en curso; si se indica un
+        summary, se actualiza con cada resultado.
+        """
+        workers = max(1, workers or self.workers)
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='organize') if workers > 1 else None
+        batch = []
+        
+        try:
+            for entry in entries:
+                batch.append(entry)
+                if len(batch) >= CLASSIFY_BATCH_SIZE:
+                    for result in self._organize_batch(batch, action, executor):
+                        if summary is not None:
+                            summary.add_result(result)
+                        yield result
+                    batch = []
+            
+            if batch:
+                for result in self._organize_batch(batch, action, executor):
+                    if summary is not None:
+                        summary.add_result(result)
+                    yield result
+        finally:
+            if executor:
+                executor.shutdown(wait=True)
+    
+    def _organize_batch(self, entries: List[tuple], action: str,
+                        executor: Optional[ThreadPoolExecutor] = None) -> List[Dict[str, Any]]:
+        """
+        Clasifica un bloque de archivos con una sola llamada y los organiza
+        
+        Con un executor, los archivos se mueven en paralelo y los registros en
+        la base de datos se hacen desde el hilo que llama, que es el dueño de
+        la sesión.
+        """
+        file_paths = [file_path for file_path, _ in entries]
+        filenames = [os.path.basename(path) for path in file_paths]
+        with self.stats.timer('classify_batch'):
+            destinations = self.tree.classify_many(filenames, file_paths, [st for _, st in entries])
+        return self._execute_batch(file_paths, destinations, action, executor)
+    
+    def _execute_batch(self, file_paths: List[str], destinations: List, action: str,
+                       executor: Optional[ThreadPoolExecutor] = None, journal=None) -> List[Dict[str, Any]]:
+        """Mueve o copia un bloque de archivos ya clasificados"""
+        if executor is None:
+            return [
+                self._organize_file(file_path, action, destination_node, classified=True, journal=journal,
+                                    throttled=True)
+                for file_path, destination_node in zip(file_paths, destinations)
+            ]
+        
+        futures = [
+            executor.submit(self._organize_file, file_path, action, destination_node, True, False, journal, True)
+            for file_path, destination_node in zip(file_paths, destinations)
+        ]
+        results = []
+        for future in futures:
+            result = future.result()
+            if result['success'] and self._logs_enabled:
+                self._log_to_database(result)
+            results.append(result)
+        return results
+    
+    @property
+    def _logs_enabled(self) -> bool:
+        return self.log_writer is not None or self.db_session is not None
+    
+    def _directory_lock(self, directory: str) -> threading.Lock:
+        """Obtiene el lock de un directorio destino"""
+        with self._directory_locks_guard:
+            lock = self._directory_locks.get(directory)
+            if lock is None:
+                lock = self._directory_locks[directory] = threading.Lock()
+            return lock
+    
+    def _count(self, key: str, error: Optional[Dict[str, Any]] = None):
+        """Incrementa un contador de estadísticas (y registra el error si se indica)"""
+        self.stats.increment(key, error)
     
-    def organize_file(self, file_path: str, action: str = 'move') -> Dict[str, Any]:
+    def _organize_file(self, file_path: str, action: str, destination_node=None,
+                       classified: bool = False, log: bool = True, journal=None,
+                       throttled: bool = False) -> Dict[str, Any]:
         """
         Organiza un archivo individual
         
         Args:
             file_path: Ruta del archivo a organizar
             action: 'move' o 'copy'
+            destination_node: Nodo destino ya calculado (si classified es True)
+            classified: Si el archivo ya fue clasificado por lotes
+            log: Si debe registrar el resultado en la base de datos
+            journal: MoveJournal donde registrar el movimiento (trabajos reanudables)
+            throttled: Si debe respetar io_budget
         
         Returns:
             Diccionario con el resultado de la operación
         """
+        filename = os.path.basename(file_path)
         result = {
             'success': False,
             'filename': os.path.basename(file_path),
@@ -64,60 +423,137 @@ class FileOrganizer:
                 logger.error(f"Archivo no encontrado: {file_path}")
                 return result
             
-            # Obtener información del archivo
-            filename = os.path.basename(file_path)
-            file_extension = os.path.splitext(filename)[1]
-            
             # Buscar destino según reglas
-            destination_node = self.tree.find_destination_for_file(filename, file_extension)
+            if not classified:
+                file_extension = os.path.splitext(filename)[1]
+                with self.stats.timer('classify'):
+                    destination_node = self.tree.find_destination_for_file(filename, file_extension, file_path)
             
             if not destination_node:
                 result['error'] = 'No se encontró una regla que coincida'
                 logger.warning(f"No hay regla para: {filename}")
-                self.stats['files_failed'] += 1
+                self._count('files_failed')
                 return result
             
             # Construir ruta de destino
             destination_path = os.path.join(destination_node.path, filename)
             
             # Crear directorio si no existe
-            os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+            destination_dir = os.path.dirname(destination_path)
+            
+            # El archivo ya está en su carpeta destino (por ejemplo, al volver a
+            # encontrarlo en un escaneo recursivo): no se renombra a name_N
+            if os.path.normcase(os.path.normpath(destination_dir)) == \
+                    os.path.normcase(os.path.normpath(os.path.dirname(os.path.abspath(file_path)))):
+                result['success'] = True
+                result['destination_path'] = file_path
+                result['action'] = 'already_organized'
+                self._count('files_skipped')
+                return result
+            
+            with self.stats.timer('mkdir'):
+                known_directories.ensure(destination_dir)
             
-            # Manejar archivos duplicados
-            if os.path.exists(destination_path):
+            # Esperar turno antes de tomar el lock, para no bloquear a otros hilos mientras tanto
+            throttle = None
+            if throttled and self.io_budget.enabled:
+                self.io_budget.acquire_ops()
+                throttle = self.io_budget.acquire_bytes
+            
+            # Un solo archivo a la vez por directorio destino decide entre
+            # duplicado idéntico y nombre _N. La transferencia (que con
+            # throttle puede esperar al presupuesto de bytes) se hace después,
+            # fuera del lock, sobre el nombre ya reservado
+            with self._directory_lock(destination_dir):
+                # Archivo idéntico ya presente en el destino
+                if self.dedupe != 'off' and self.directory_names.is_taken(destination_dir, filename):
+                    dedupe_action = self._handle_identical(file_path, destination_path, action, journal)
+                    if dedupe_action:
+                        result['success'] = True
+                        result['destination_path'] = destination_path
+                        result['action'] = dedupe_action
+                        self._count('files_deduplicated')
+                        if log and self._logs_enabled:
+                            self._log_to_database(result)
+                        return result
+                
+                # Manejar archivos duplicados
                 destination_path = self._handle_duplicate(destination_path)
             
             # Mover o copiar archivo
-            if action == 'move':
-                shutil.move(file_path, destination_path)
-                logger.info(f"Archivo movido: {filename} -> {destination_path}")
-            elif action == 'copy':
-                shutil.copy2(file_path, destination_path)
-                logger.info(f"Archivo copiado: {filename} -> {destination_path}")
+            try:
+                self._transfer(file_path, destination_path, action, journal, throttle)
+            except FileNotFoundError:
+                self.directory_names.release(destination_dir, os.path.basename(destination_path))
+                if os.path.isdir(destination_dir):
+                    raise
+                # El directorio destino se borró por fuera: recrearlo y reintentar una vez
+                known_directories.forget(destination_dir)
+                with self._directory_lock(destination_dir):
+                    self.directory_names.invalidate(destination_dir)
+                    known_directories.ensure(destination_dir)
+                    destination_path = self._handle_duplicate(os.path.join(destination_dir, filename))
+                try:
+                    self._transfer(file_path, destination_path, action, journal, throttle)
+                except Exception:
+                    self.directory_names.release(destination_dir, os.path.basename(destination_path))
+                    raise
+            except Exception:
+                self.directory_names.release(destination_dir, os.path.basename(destination_path))
+                raise
+            self.directory_names.commit(destination_dir, os.path.basename(destination_path))
             
             result['success'] = True
             result['destination_path'] = destination_path
-            self.stats['files_moved'] += 1
+            self._count('files_moved')
             
             # Registrar en base de datos si está disponible
-            if self.db_session:
+            if log and self._logs_enabled:
                 self._log_to_database(result)
         
         except Exception as e:
             result['error'] = str(e)
             logger.error(f"Error organizando {filename}: {e}")
-            self.stats['files_failed'] += 1
-            self.stats['errors'].append({
+            self._count('files_failed', {
                 'file': filename,
                 'error': str(e)
             })
         
         finally:
-            self.stats['files_processed'] += 1
+            self._count('files_processed')
         
         return result
     
-    def organize_folder(self, folder_path: str, recursive: bool = False, action: str = 'move') -> Dict[str, Any]:
+    def _transfer(self, file_path: str, destination_path: str, action: str, journal=None, throttle=None):
+        """
+        Mueve o copia el archivo a una ruta destino ya resuelta (registrándolo en el diario si hay)
+        
+        Con throttle, cada bloque copiado consume bytes del presupuesto; un
+        rename en el mismo dispositivo no copia datos y no consume ninguno.
+        """
+        filename = os.path.basename(file_path)
+        if journal is not None:
+            # Una copia (o un movimiento entre dispositivos) escribe primero en la ruta temporal
+            journal.intent(file_path, destination_path, action, partial_path(destination_path))
+        start = time.perf_counter()
+        try:
+            if action == 'move':
+                move_file(file_path, destination_path, throttle)
+                logger.info(f"Archivo movido: {filename} -> {destination_path}")
+            elif action == 'copy':
+                copy_file(file_path, destination_path, throttle)
+                logger.info(f"Archivo copiado: {filename} -> {destination_path}")
+        except Exception:
+            if journal is not None:
+                journal.abort(file_path, destination_path)
+            raise
+        finally:
+            self.stats.observe('move', time.perf_counter() - start)
+        if journal is not None:
+            journal.done(file_path, destination_path, action)
+    
+    def organize_folder(self, folder_path: str, recursive: bool = False, action: str = 'move',
+                        workers: Optional[int] = None) -> Dict[str, Any]:
         """
         Organiza todos los archivos en una carpeta
         
@@ -125,6 +561,7 @@ class FileOrganizer:
             folder_path: Ruta de la carpeta
             recursive: Si debe procesar subcarpetas
             action: 'move' o 'copy'
+            workers: Hilos a usar (por defecto self.workers; 1 = secuencial)
         
         Returns:
             Diccionario con estadísticas de la operación
@@ -132,56 +569,128 @@ class FileOrganizer:
         results = []
         
         try:
-            if recursive:
-                # Procesar recursivamente
-                for root, dirs, files in os.walk(folder_path):
-                    for filename in files:
-                        file_path = os.path.join(root, filename)
-                        result = self.organize_file(file_path, action)
-                        results.append(result)
-            else:
-                # Solo archivos en el nivel superior
-                for item in os.listdir(folder_path):
-                    file_path = os.path.join(folder_path, item)
-                    if os.path.isfile(file_path):
-                        result = self.organize_file(file_path, action)
-                        results.append(result)
+            # Se escanea todo antes de mover para no volver a encontrar archivos recién movidos
+            records = list(scan_files(folder_path, recursive))
+            results.extend(self.iter_organize_records(records, action, workers))
         
         except Exception as e:
             logger.error(f"Error organizando carpeta {folder_path}: {e}")
-            self.stats['errors'].append({
+            self.stats.add_error({
                 'folder': folder_path,
                 'error': str(e)
             })
         
         return {
-            'stats': self.stats,
+            'stats': self.get_stats(),
             'results': results
         }
     
+    def iter_organize_folder(self, folder_path: str, recursive: bool = False, action: str = 'move',
+                             workers: Optional[int] = None,
+                             summary: Optional[OrganizeSummary] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Organiza una carpeta entregando cada resultado a medida que se produce
+        
+        El escaneo avanza junto con la organización, así que la memoria no
+        depende del tamaño de la carpeta. Si un destino está dentro de la
+        carpeta, los archivos ya movidos pueden volver a aparecer y se
+        informan como 'already_organized'.
+        
+        Args:
+            folder_path: Ruta de la carpeta
+            recursive: Si debe procesar subcarpetas
+            action: 'move' o 'copy'
+            workers: Hilos a usar (por defecto self.workers; 1 = secuencial)
+            summary: OrganizeSummary que se actualiza con cada resultado (opcional)
+        
+        Raises:
+            OSError: Si no se puede leer la carpeta
+        """
+        return self.iter_organize_records(scan_files(folder_path, recursive), action, workers, summary)
+    
     def _handle_duplicate(self, file_path: str) -> str:
         """
         Maneja archivos duplicados agregando un número al nombre
         
+        El nombre se reserva en la caché del directorio (comprobando que
+        esté libre en disco); se debe llamar con el lock del directorio tomado.
+        
         Args:
             file_path: Ruta del archivo
         
         Returns:
-            Nueva ruta con nombre único
+            La misma ruta si está libre, o una nueva ruta con nombre único
         """
         directory = os.path.dirname(file_path)
         filename = os.path.basename(file_path)
-        name, extension = os.path.splitext(filename)
+        return os.path.join(directory, self.directory_names.reserve(directory, filename))
+    
+    def _handle_identical(self, file_path: str, existing_path: str, action: str,
+                          journal=None) -> Optional[str]:
+        """
+        Aplica la política de duplicados si el archivo ya existe con el mismo contenido
+        
+        Args:
+            file_path: Archivo de origen
+            existing_path: Archivo con el mismo nombre en el destino
+            action: 'move' o 'copy'
+            journal: MoveJournal donde registrar el borrado o el enlace (para deshacerlos)
         
-        counter = 1
-        new_path = file_path
+        Returns:
+            La acción aplicada ('duplicate_skipped', 'duplicate_deleted' o
+            'duplicate_hardlinked'), o None si los archivos son distintos
+        """
+        try:
+            if not file_hasher.identical(file_path, existing_path):
+                return None
+        except FileNotFoundError:
+            # El archivo del destino ya no existe
+            self.directory_names.invalidate(os.path.dirname(existing_path))
+            return None
+        
+        # El origen ya es el archivo del destino: no hay nada que hacer
+        if os.path.realpath(file_path) == os.path.realpath(existing_path):
+            return 'duplicate_skipped'
         
-        while os.path.exists(new_path):
-            new_filename = f"{name}_{counter}{extension}"
-            new_path = os.path.join(directory, new_filename)
-            counter += 1
+        if self.dedupe == 'delete' and action == 'move':
+            if journal is not None:
+                journal.intent(file_path, existing_path, 'duplicate_deleted')
+            try:
+                os.unlink(file_path)
+            except OSError:
+                if journal is not None:
+                    journal.abort(file_path, existing_path)
+                raise
+            if journal is not None:
+                journal.done(file_path, existing_path, 'duplicate_deleted')
+            logger.info(f"Duplicado eliminado: {file_path} (idéntico a {existing_path})")
+            return 'duplicate_deleted'
         
-        return new_path
+        if self.dedupe == 'hardlink':
+            if os.path.samefile(file_path, existing_path):
+                return 'duplicate_hardlinked'
+            link_path = file_path + LINK_SUFFIX
+            if journal is not None:
+                journal.intent(file_path, existing_path, 'duplicate_hardlinked')
+            try:
+                os.link(existing_path, link_path)
+                os.replace(link_path, file_path)
+                if journal is not None:
+                    journal.done(file_path, existing_path, 'duplicate_hardlinked')
+                logger.info(f"Duplicado enlazado: {file_path} -> {existing_path}")
+                return 'duplicate_hardlinked'
+            except OSError as e:
+                # Otro sistema de archivos o sin soporte de enlaces: se omite
+                logger.warning(f"No se pudo enlazar {file_path}: {e}")
+                try:
+                    os.unlink(link_path)
+                except OSError:
+                    pass
+                if journal is not None:
+                    journal.abort(file_path, existing_path)
+        
+        logger.info(f"Duplicado omitido: {file_path} (idéntico a {existing_path})")
+        return 'duplicate_skipped'
     
     def _log_to_database(self, result: Dict[str, Any]):
         """
@@ -190,18 +699,27 @@ class FileOrganizer:
         Args:
             result: Resultado de la operación
         """
+        with self.stats.timer('log'):
+            self._write_log(result)
+    
+    def _write_log(self, result: Dict[str, Any]):
+        """Encola el registro en el escritor de logs o lo guarda con la sesión"""
+        record = {
+            'filename': result['filename'],
+            'original_path': result['original_path'],
+            'destination_path': result['destination_path'] or '',
+            'action': result['action'],
+            'status': 'success' if result['success'] else 'failed',
+            'error_message': result.get('error'),
+            'timestamp': datetime.utcnow()
+        }
+        
+        if self.log_writer is not None:
+            self.log_writer.enqueue(record)
+            return
+        
         try:
-            log_entry = FileLog(
-                filename=result['filename'],
-                original_path=result['original_path'],
-                destination_path=result['destination_path'] or '',
-                action=result['action'],
-                status='success' if result['success'] else 'failed',
-                error_message=result.get('error'),
-                timestamp=datetime.utcnow()
-            )
-            
-            self.db_session.add(log_entry)
+            self.db_session.add(FileLog(**record))
             self.db_session.commit()
         
         except Exception as e:
@@ -209,16 +727,18 @@ class FileOrganizer:
     
     def get_stats(self) -> Dict[str, Any]:
         """Obtiene estadísticas de la organización"""
-        return self.stats
+        stats = self.stats.snapshot()
+        stats['classification_cache'] = self.tree.classification_cache.get_stats()
+        stats['content_sniffer'] = content_sniffer.get_stats()
+        stats['file_hasher'] = file_hasher.get_stats()
+        stats['io_budget'] = self.io_budget.get_stats()
+        if self.log_writer is not None:
+            stats['log_writer'] = self.log_writer.get_stats()
+        return stats
     
     def reset_stats(self):
         """Reinicia las estadísticas"""
-        self.stats = {
-            'files_processed': 0,
-            'files_moved': 0,
-            'files_failed': 0,
-            'errors': []
-        }
+        self.stats.reset()
     
     def preview_organization(self, folder_path: str, recursive: bool = False) -> Dict[str, Any]:
         """
@@ -237,43 +757,475 @@ class FileOrganizer:
             'files_with_rules': 0,
             'files_without_rules': 0
         }
+        summary = OrganizeSummary()
         
         try:
-            files_to_check = []
-            
-            if recursive:
-                for root, dirs, files in os.walk(folder_path):
-                    for filename in files:
-                        files_to_check.append(os.path.join(root, filename))
-            else:
-                for item in os.listdir(folder_path):
-                    file_path = os.path.join(folder_path, item)
-                    if os.path.isfile(file_path):
-                        files_to_check.append(file_path)
-            
-            for file_path in files_to_check:
-                filename = os.path.basename(file_path)
-                file_extension = os.path.splitext(filename)[1]
-                
-                destination_node = self.tree.find_destination_for_file(filename, file_extension)
-                
-                file_info = {
-                    'filename': filename,
-                    'current_path': file_path,
-                    'destination': destination_node.path if destination_node else None,
-                    'has_rule': destination_node is not None
-                }
-                
-                preview['files'].append(file_info)
-                preview['total_files'] += 1
-                
-                if destination_node:
-                    preview['files_with_rules'] += 1
-                else:
-                    preview['files_without_rules'] += 1
+            preview['files'].extend(self.iter_preview(folder_path, recursive, summary))
         
         except Exception as e:
             logger.error(f"Error en previsualización: {e}")
             preview['error'] = str(e)
         
+        preview['total_files'] = summary.total_files
+        preview['files_with_rules'] = summary.files_with_rules
+        preview['files_without_rules'] = summary.files_without_rules
         return preview
+    
+    def iter_preview(self, folder_path: str, recursive: bool = False,
+                     summary: Optional[OrganizeSummary] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Previsualiza una carpeta entregando cada archivo a medida que se clasifica
+        
+        Args:
+            folder_path: Ruta de la carpeta
+            recursive: Si debe procesar subcarpetas
+            summary: OrganizeSummary que se actualiza con cada archivo (opcional)
+        
+        Raises:
+            OSError: Si no se puede leer la carpeta
+        """
+        batch = []
+        for record in scan_files(folder_path, recursive):
+            batch.append(record)
+            if len(batch) >= CLASSIFY_BATCH_SIZE:
+                yield from self._preview_batch(batch, summary)
+                batch = []
+        if batch:
+            yield from self._preview_batch(batch, summary)
+    
+    def save_plan(self, folder_path: str, plan_path: str, recursive: bool = False,
+                  progress: Optional[Callable[[OrganizeSummary], None]] = None) -> Dict[str, Any]:
+        """
+        Previsualiza una carpeta y guarda el resultado como un plan ejecutable
+        
+        Solo se guardan los archivos con destino, junto con su tamaño y mtime;
+        apply_plan los organiza después sin volver a clasificarlos.
+        
+        Args:
+            folder_path: Ruta de la carpeta
+            plan_path: Archivo donde guardar el plan
+            recursive: Si debe procesar subcarpetas
+            progress: Función llamada con el resumen parcial después de cada bloque
+                (si lanza una excepción, el plan a medias se descarta)
+        
+        Returns:
+            Resumen de la previsualización (ver OrganizeSummary) con la ruta y las entradas del plan
+        
+        Raises:
+            OSError: Si no se puede leer la carpeta o escribir el plan
+        """
+        summary = OrganizeSummary()
+        
+        with PlanWriter(plan_path, folder_path, recursive, self.tree.rules_hash()) as writer:
+            batch = []
+            for record in scan_files(folder_path, recursive):
+                batch.append(record)
+                if len(batch) >= CLASSIFY_BATCH_SIZE:
+                    self._write_plan_batch(writer, batch, summary)
+                    batch = []
+                    if progress:
+                        progress(summary)
+            if batch:
+                self._write_plan_batch(writer, batch, summary)
+        
+        result = summary.to_dict()
+        result['plan_path'] = plan_path
+        result['plan_entries'] = writer.entries
+        return result
+    
+    def _write_plan_batch(self, writer: PlanWriter, records: List[FileRecord], summary: OrganizeSummary):
+        """Clasifica un bloque y agrega al plan los archivos con destino"""
+        for record, file_info in zip(records, self._preview_batch(records, summary)):
+            if file_info['has_rule']:
+                writer.add(PlanEntry(record.path, file_info['destination'], file_info['destination_name'],
+                                     record.size, record.stat.st_mtime_ns,
+                                     file_info['rule_type'], file_info['rule_pattern']))
+    
+    def apply_plan(self, plan_path: str, action: str = 'move', workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Ejecuta un plan guardado con save_plan
+        
+        Args:
+            plan_path: Archivo del plan
+            action: 'move' o 'copy'
+            workers: Hilos a usar (por defecto self.workers; 1 = secuencial)
+        
+        Returns:
+            Diccionario con estadísticas, resumen y resultados de la operación, y
+            rules_changed si las reglas cambiaron desde que se guardó el plan
+        """
+        results = []
+        summary = OrganizeSummary()
+        rules_changed = None
+        
+        try:
+            rules_changed = self.plan_rules_changed(plan_path)
+            results.extend(self.iter_apply_plan(plan_path, action, workers, summary))
+        
+        except Exception as e:
+            logger.error(f"Error aplicando el plan {plan_path}: {e}")
+            self.stats.add_error({
+                'plan': plan_path,
+                'error': str(e)
+            })
+        
+        return {
+            'stats': self.get_stats(),
+            'summary': summary.to_dict(),
+            'rules_changed': rules_changed,
+            'results': results
+        }
+    
+    def plan_rules_changed(self, plan_path: str) -> bool:
+        """
+        Indica si las reglas activas cambiaron desde que se guardó el plan
+        
+        Raises:
+            ValueError: Si el archivo no es un plan válido
+        """
+        return read_plan_header(plan_path).get('rules_hash') != self.tree.rules_hash()
+    
+    def iter_apply_plan(self, plan_path: str, action: str = 'move', workers: Optional[int] = None,
+                        summary: Optional[OrganizeSummary] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Ejecuta un plan entregando cada resultado a medida que se produce
+        
+        Las entradas cuyo origen ya no existe o cambió de tamaño o mtime se
+        omiten con la acción 'source_changed'. Si el nodo destino ya no está
+        en el árbol, la entrada falla. Si las reglas cambiaron desde que se
+        guardó el plan se aplican igual los destinos guardados; quien quiera
+        rechazarlo debe consultar antes plan_rules_changed.
+        
+        Raises:
+            ValueError: Si el archivo no es un plan válido
+        """
+        if self.plan_rules_changed(plan_path):
+            logger.info(f"Las reglas cambiaron desde que se creó el plan {plan_path}; se aplican los destinos guardados")
+        
+        workers = max(1, workers or self.workers)
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='organize') if workers > 1 else None
+        batch = []
+        
+        try:
+            for entry in iter_plan(plan_path):
+                batch.append(entry)
+                if len(batch) >= CLASSIFY_BATCH_SIZE:
+                    yield from self._apply_plan_batch(batch, action, executor, summary)
+                    batch = []
+            if batch:
+                yield from self._apply_plan_batch(batch, action, executor, summary)
+        finally:
+            if executor:
+                executor.shutdown(wait=True)
+    
+    def _apply_plan_batch(self, entries: List[PlanEntry], action: str, executor: Optional[ThreadPoolExecutor],
+                          summary: Optional[OrganizeSummary], journal=None) -> Iterator[Dict[str, Any]]:
+        """Valida un bloque del plan contra el disco y ejecuta las entradas vigentes"""
+        results: List[Optional[Dict[str, Any]]] = []
+        positions = []
+        file_paths = []
+        destinations = []
+        
+        for entry in entries:
+            try:
+                st = os.stat(entry.source)
+                changed = st.st_size != entry.size or st.st_mtime_ns != entry.mtime_ns
+            except OSError:
+                changed = True
+            node = self.tree.find_node_by_path(entry.destination)
+            
+            if changed or node is None:
+                result = {
+                    'success': False,
+                    'filename': os.path.basename(entry.source),
+                    'original_path': entry.source,
+                    'destination_path': None,
+                    'action': 'source_changed' if changed else action,
+                    'error': ('El archivo cambió desde la previsualización' if changed
+                              else f"El nodo destino ya no existe: {entry.destination}")
+                }
+                if changed:
+                    self._count('files_skipped')
+                else:
+                    self._count('files_failed', {'file': result['filename'], 'error': result['error']})
+                self._count('files_processed')
+                results.append(result)
+            else:
+                positions.append(len(results))
+                results.append(None)
+                file_paths.append(entry.source)
+                destinations.append(node)
+        
+        for position, result in zip(positions, self._execute_batch(file_paths, destinations, action,
+                                                                   executor, journal)):
+            results[position] = result
+        
+        for result in results:
+            if summary is not None:
+                summary.add_result(result)
+            yield result
+    
+    def run_job(self, job: OrganizeJob, workers: Optional[int] = None,
+                cancel: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Ejecuta (o reanuda) un trabajo de organización con diario de movimientos
+        
+        La primera vez se guarda el plan de la carpeta; después se aplica por
+        bloques registrando cada movimiento en el diario y un punto de control
+        por bloque. Al reanudar, se reconcilian los movimientos interrumpidos
+        y se continúa desde el último punto de control sin volver a clasificar.
+        
+        El progreso (archivos vistos, terminados, fallidos y por segundo) se
+        guarda en el trabajo con cada bloque, y el resultado de cada archivo
+        en su results.jsonl.
+        
+        Args:
+            job: OrganizeJob a ejecutar
+            workers: Hilos a usar (por defecto los del trabajo o self.workers; 1 = secuencial)
+            cancel: Evento que detiene el trabajo entre bloques (queda 'cancelled' y se puede reanudar)
+        
+        Returns:
+            Estado del trabajo con su resumen
+        
+        Raises:
+            RuntimeError: Si el trabajo ya se está ejecutando
+        """
+        with self._jobs_lock:
+            if job.job_id in self._active_jobs:
+                raise RuntimeError(f"El trabajo {job.job_id} ya está en ejecución")
+            self._active_jobs.add(job.job_id)
+        
+        try:
+            return self._run_job(job, workers or job.meta.get('workers'), cancel)
+        finally:
+            with self._jobs_lock:
+                self._active_jobs.discard(job.job_id)
+    
+    def is_job_active(self, job_id: str) -> bool:
+        """Indica si un trabajo se está ejecutando en este proceso"""
+        with self._jobs_lock:
+            return job_id in self._active_jobs
+    
+    def _run_job(self, job: OrganizeJob, workers: Optional[int],
+                 cancel: Optional[threading.Event]) -> Dict[str, Any]:
+        summary = OrganizeSummary.from_dict(job.meta.get('summary'))
+        started = time.monotonic()
+        elapsed_before = job.meta.get('elapsed_seconds') or 0.0
+        
+        def check_cancel():
+            if cancel is not None and cancel.is_set():
+                raise JobCancelled()
+        
+        def progress(phase: str, files_seen: int) -> Dict[str, Any]:
+            elapsed = elapsed_before + time.monotonic() - started
+            return {
+                'phase': phase,
+                'files_seen': files_seen,
+                'files_done': summary.total_files,
+                'files_failed': summary.files_failed,
+                'elapsed_seconds': round(elapsed, 3),
+                'files_per_second': round(summary.total_files / elapsed, 1) if elapsed else 0.0
+            }
+        
+        def on_plan_batch(plan_summary: OrganizeSummary):
+            check_cancel()
+            job.save(progress=progress('planning', plan_summary.total_files))
+        
+        try:
+            job.save(status='running', error=None)
+            if not os.path.exists(job.plan_path):
+                check_cancel()
+                plan = self.save_plan(job.meta['folder'], job.plan_path, job.meta['recursive'],
+                                      progress=on_plan_batch)
+                job.save(planned=plan['plan_entries'], files_seen=plan['total_files'])
+            files_seen = job.meta.get('files_seen') or 0
+            # Al reanudar tras reiniciar, o con un plan guardado antes, las reglas pueden haber cambiado
+            job.save(rules_changed=self.plan_rules_changed(job.plan_path))
+            
+            recovery = job.recover()
+            position = recovery['position']
+            completed = recovery['completed_sources']
+            job.save(position=position, progress=progress('organizing', files_seen))
+            
+            workers = max(1, workers or self.workers)
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='organize') if workers > 1 else None
+            journal = job.open_journal()
+            results = job.open_results(recovery['results_offset'])
+            batch = []
+            
+            try:
+                for entry in itertools.islice(iter_plan(job.plan_path), position, None):
+                    batch.append(entry)
+                    if len(batch) >= CLASSIFY_BATCH_SIZE:
+                        check_cancel()
+                        position = self._run_job_batch(job, batch, position, completed, executor,
+                                                       summary, journal, results)
+                        job.save(position=position, summary=summary.to_dict(), results_offset=results.offset,
+                                 progress=progress('organizing', files_seen))
+                        batch = []
+                if batch:
+                    check_cancel()
+                    position = self._run_job_batch(job, batch, position, completed, executor,
+                                                   summary, journal, results)
+            finally:
+                results.close()
+                journal.close()
+                if executor:
+                    executor.shutdown(wait=True)
+            
+            job.save(status='completed', position=position, summary=summary.to_dict(),
+                     results_offset=results.offset, progress=progress('done', files_seen),
+                     elapsed_seconds=elapsed_before + time.monotonic() - started)
+        
+        except JobCancelled:
+            logger.info(f"Trabajo {job.job_id} cancelado en la posición {job.meta['position']}")
+            job.save(status='cancelled', summary=summary.to_dict(),
+                     progress=progress('cancelled', job.meta.get('files_seen') or 0),
+                     elapsed_seconds=elapsed_before + time.monotonic() - started)
+        
+        except Exception as e:
+            logger.error(f"Error en el trabajo {job.job_id}: {e}")
+            job.save(status='failed', summary=summary.to_dict(), error=str(e),
+                     elapsed_seconds=elapsed_before + time.monotonic() - started)
+        
+        return job.to_dict()
+    
+    def _run_job_batch(self, job: OrganizeJob, batch: List[PlanEntry], position: int,
+                       completed: Dict[str, Dict[str, Any]],
+                       executor: Optional[ThreadPoolExecutor], summary: OrganizeSummary, journal, results) -> int:
+        """Aplica un bloque del plan, guarda sus resultados y registra el punto de control"""
+        # Entradas ya terminadas después del último punto de control (antes de una caída)
+        pending = []
+        for entry in batch:
+            if entry.source in completed:
+                record = completed[entry.source]
+                result = {
+                    'success': True,
+                    'filename': os.path.basename(entry.source),
+                    'original_path': entry.source,
+                    'destination_path': record['dst'],
+                    'action': record['action'],
+                    'error': None
+                }
+                summary.add_result(result)
+                results.add(result)
+            else:
+                pending.append(entry)
+        
+        for result in self._apply_plan_batch(pending, job.meta['action'], executor, summary, journal):
+            results.add(result)
+        
+        position += len(batch)
+        results.flush()
+        journal.checkpoint(position, results.offset)
+        return position
+    
+    def undo_job(self, job: OrganizeJob) -> Dict[str, Any]:
+        """
+        Deshace todos los movimientos terminados de un trabajo usando su diario
+        
+        Primero se reconcilian los movimientos interrumpidos. Después, del
+        último al primero: los archivos movidos vuelven a su ruta original,
+        las copias se borran (solo si siguen con el tamaño y mtime que dejó el
+        trabajo), los duplicados borrados se restauran copiando el archivo del
+        destino y los enlazados vuelven a ser una copia independiente. Un
+        movimiento se omite si el destino ya no existe, si cambió o si el
+        origen fue ocupado por otro archivo; entonces el trabajo queda
+        'partially_undone' y se puede volver a deshacer.
+        
+        Returns:
+            Cantidad de movimientos deshechos y omitidos (con sus errores)
+        """
+        result = {'undone': 0, 'skipped': 0, 'errors': []}
+        job.recover()
+        journal = job.open_journal()
+        
+        try:
+            for record in reversed(list(job.iter_completed())):
+                source, destination, action = record['src'], record['dst'], record['action']
+                try:
+                    self._undo_record(record)
+                    if action in ('move', 'copy'):
+                        self.directory_names.release(os.path.dirname(destination), os.path.basename(destination))
+                    journal.undone(source, destination)
+                    result['undone'] += 1
+                    
+                    if self._logs_enabled:
+                        self._log_to_database({
+                            'success': True,
+                            'filename': os.path.basename(source),
+                            'original_path': destination,
+                            'destination_path': source if action != 'copy' else None,
+                            'action': f"undo_{action}",
+                            'error': None
+                        })
+                except OSError as e:
+                    result['skipped'] += 1
+                    result['errors'].append({'file': source, 'error': str(e)})
+        finally:
+            journal.close()
+        
+        job.save(status='undone' if not result['skipped'] else 'partially_undone')
+        logger.info(f"Trabajo {job.job_id} deshecho: {result['undone']} archivos, {result['skipped']} omitidos")
+        return result
+    
+    def _undo_record(self, record: Dict[str, Any]):
+        """
+        Deshace un movimiento del diario
+        
+        Raises:
+            OSError: Si el movimiento no se puede deshacer sin pisar o borrar un archivo ajeno
+        """
+        source, destination, action = record['src'], record['dst'], record['action']
+        if not os.path.lexists(destination):
+            raise FileNotFoundError(f"El destino ya no existe: {destination}")
+        
+        if action == 'copy':
+            st = os.lstat(destination)
+            if (record.get('size'), record.get('mtime_ns')) != (st.st_size, st.st_mtime_ns):
+                raise FileExistsError(f"La copia cambió desde el trabajo: {destination}")
+            os.unlink(destination)
+            return
+        
+        if action == 'duplicate_hardlinked':
+            if not os.path.lexists(source) or not os.path.samefile(source, destination):
+                raise FileExistsError(f"El origen ya no es el enlace del trabajo: {source}")
+            # Copia independiente al lado y reemplazo atómico del enlace
+            copy_path = source + LINK_SUFFIX
+            copy_file(destination, copy_path)
+            os.replace(copy_path, source)
+            return
+        
+        if os.path.lexists(source):
+            raise FileExistsError(f"El origen está ocupado: {source}")
+        known_directories.ensure(os.path.dirname(source))
+        throttle = None
+        if self.io_budget.enabled:
+            self.io_budget.acquire_ops()
+            throttle = self.io_budget.acquire_bytes
+        if action == 'duplicate_deleted':
+            # El archivo del destino es idéntico al borrado: se restaura una copia
+            copy_file(destination, source, throttle)
+        else:
+            move_file(destination, source, throttle)
+    
+    def _preview_batch(self, records: List[FileRecord],
+                       summary: Optional[OrganizeSummary]) -> Iterator[Dict[str, Any]]:
+        """Clasifica un bloque de la previsualización con una sola llamada"""
+        destinations = self.tree.classify_many_with_rules([record.name for record in records],
+                                                          [record.path for record in records],
+                                                          [record.stat for record in records])
+        
+        for record, (destination_node, rule) in zip(records, destinations):
+            file_info = {
+                'filename': record.name,
+                'current_path': record.path,
+                'destination': destination_node.path if destination_node else None,
+                'destination_name': destination_node.name if destination_node else None,
+                'rule_type': rule.rule_type if rule else None,
+                'rule_pattern': rule.pattern if rule else None,
+                'has_rule': destination_node is not None
+            }
+            if summary is not None:
+                summary.add_preview(file_info)
+            yield file_info
@@ -0,0 +1,72 @@
+"""
+Escaneo de carpetas con os.scandir reutilizando los datos de cada DirEntry
+"""
+import os
+import logging
+from typing import Iterator, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+class FileRecord(NamedTuple):
+    """Archivo encontrado en un escaneo (con un solo stat)"""
+    path: str
+    name: str
+    extension: str
+    size: int
+    mtime: float
+    stat: os.stat_result
+
+
+def scan_files(folder_path: str, recursive: bool = False) -> Iterator[FileRecord]:
+    """
+    Recorre los archivos de una carpeta
+
+    Solo se hace un stat por archivo (el de DirEntry, que en Windows ya viene
+    del listado). Los enlaces simbólicos a archivos se incluyen, pero no se
+    entra en enlaces a carpetas.
+
+    Args:
+        folder_path: Carpeta a recorrer
+        recursive: Si debe incluir las subcarpetas
+
+    Yields:
+        Un FileRecord por archivo
+
+    Raises:
+        OSError: Si no se puede leer la carpeta inicial
+    """
+    pending = [folder_path]
+    first = True
+
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError as e:
+            if first:
+                raise
+            # Igual que os.walk: las subcarpetas ilegibles se omiten
+            logger.warning(f"No se pudo leer {directory}: {e}")
+            continue
+        first = False
+
+        subdirectories = []
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            subdirectories.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    # El archivo desapareció durante el escaneo
+                    continue
+                yield FileRecord(entry.path, entry.name, os.path.splitext(entry.name)[1],
+                                 st.st_size, st.st_mtime, st)
+
+        # Orden de recorrido similar a os.walk (de arriba hacia abajo)
+        pending.extend(reversed(subdirectories))
@@ -0,0 +1,250 @@
+"""
+Movimiento y copia de archivos con el menor trabajo posible en espacio de usuario
+
+- Mover dentro del mismo sistema de archivos es un rename (o enlace + borrado)
+  que nunca reemplaza un archivo existente.
+- Copiar (o mover entre dispositivos) usa copy_file_range o sendfile, que
+  copian dentro del kernel, con una copia por bloques grandes como respaldo.
+  La copia se escribe en `<destino>.partial` y se coloca en su sitio al
+  terminar: el destino final nunca queda a medias.
+- Los metadatos (permisos, fechas) se conservan como en shutil.copy2.
+- Una función `throttle(bytes)` opcional se llama antes de cada bloque para
+  limitar el ancho de banda (ver io_budget).
+"""
+import os
+import errno
+import shutil
+import threading
+from typing import Callable, Optional
+
+# Bytes por llamada al kernel y tamaño del bloque de la copia de respaldo
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+FALLBACK_BUFFER_SIZE = 1024 * 1024
+# Bloque más pequeño con límite de ancho de banda, para repartir la espera a lo largo de la copia
+THROTTLED_CHUNK_SIZE = 4 * 1024 * 1024
+# Sufijo del archivo temporal de una copia en curso
+PARTIAL_SUFFIX = '.partial'
+# Sufijo del enlace temporal que reemplaza a un duplicado (ver FileOrganizer._handle_identical)
+LINK_SUFFIX = '.quicksort-link'
+
+# Errores que indican que la llamada no está disponible para este par de archivos
+_UNSUPPORTED_ERRNOS = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ENOTSUP}
+# Errores de os.link en sistemas de archivos sin enlaces duros (por ejemplo FAT)
+_NO_HARDLINK_ERRNOS = {errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EMLINK}
+
+
+class DirectoryCache:
+    """
+    Directorios que sabemos que existen
+
+    Evita llamar a os.makedirs (un stat por cada nivel de la ruta) por cada
+    archivo cuando solo hay unos cientos de destinos distintos.
+    """
+
+    def __init__(self):
+        self._known = set()
+        self._lock = threading.Lock()
+
+    def ensure(self, directory: str):
+        """Crea el directorio si no se sabe que existe"""
+        directory = os.path.normpath(directory)
+        if directory in self._known:
+            return
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._known.add(directory)
+
+    def remember(self, directory: str):
+        """Marca un directorio como existente (ya creado por otra vía)"""
+        with self._lock:
+            self._known.add(os.path.normpath(directory))
+
+    def forget(self, directory: str):
+        """Olvida un directorio y todos los que contiene"""
+        directory = os.path.normpath(directory)
+        prefix = os.path.join(directory, '')
+        with self._lock:
+            self._known = {known for known in self._known
+                           if known != directory and not known.startswith(prefix)}
+
+    def clear(self):
+        with self._lock:
+            self._known.clear()
+
+
+# Caché compartida por el organizador y la creación de la estructura de carpetas
+known_directories = DirectoryCache()
+
+
+def same_device(source_path: str, destination_dir: str) -> bool:
+    """Indica si el archivo y el directorio destino están en el mismo sistema de archivos"""
+    try:
+        return os.stat(source_path).st_dev == os.stat(destination_dir).st_dev
+    except OSError:
+        return False
+
+
+def _copy_file_range(source_fd: int, destination_fd: int, size: int, throttle=None) -> int:
+    """Copia con copy_file_range; devuelve los bytes copiados"""
+    chunk_size = THROTTLED_CHUNK_SIZE if throttle else COPY_CHUNK_SIZE
+    copied = 0
+    while copied < size:
+        count = min(chunk_size, size - copied)
+        if throttle:
+            throttle(count)
+        sent = os.copy_file_range(source_fd, destination_fd, count)
+        if sent == 0:
+            break
+        copied += sent
+    return copied
+
+
+def _sendfile(source_fd: int, destination_fd: int, size: int, throttle=None) -> int:
+    """Copia con sendfile; devuelve los bytes copiados"""
+    chunk_size = THROTTLED_CHUNK_SIZE if throttle else COPY_CHUNK_SIZE
+    copied = 0
+    while copied < size:
+        count = min(chunk_size, size - copied)
+        if throttle:
+            throttle(count)
+        sent = os.sendfile(destination_fd, source_fd, copied, count)
+        if sent == 0:
+            break
+        copied += sent
+    return copied
+
+
+def _copy_contents(source, destination, size: int, throttle=None):
+    """Copia el contenido usando la vía más rápida disponible"""
+    source_fd = source.fileno()
+    destination_fd = destination.fileno()
+
+    for kernel_copy in (getattr(os, 'copy_file_range', None) and _copy_file_range,
+                        getattr(os, 'sendfile', None) and _sendfile):
+        if not kernel_copy:
+            continue
+        source.seek(0)
+        destination.seek(0)
+        try:
+            copied = kernel_copy(source_fd, destination_fd, size, throttle)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+            copied = 0
+        if copied:
+            # Continuar por bloques si el archivo creció o la llamada se detuvo antes
+            source.seek(copied)
+            destination.seek(copied)
+            break
+        # Nada copiado: probar la siguiente vía desde el principio
+
+    buffer = memoryview(bytearray(FALLBACK_BUFFER_SIZE))
+    while True:
+        read = source.readinto(buffer)
+        if not read:
+            break
+        if throttle:
+            throttle(read)
+        destination.write(buffer[:read])
+
+
+def partial_path(destination_path: str) -> str:
+    """Ruta temporal donde se escribe la copia hacia destination_path"""
+    return destination_path + PARTIAL_SUFFIX
+
+
+def place_file(source_path: str, destination_path: str):
+    """
+    Renombra un archivo sin reemplazar nunca uno existente en el destino
+
+    En Windows os.rename ya falla si el destino existe. En POSIX, donde
+    rename reemplaza, se crea un enlace duro (que falla si el destino
+    existe) y se borra el original; si una caída deja los dos nombres,
+    apuntan al mismo archivo. Sin enlaces duros se comprueba el destino y
+    se renombra.
+
+    Raises:
+        FileExistsError: Si el destino ya existe
+        OSError: Con EXDEV si están en distintos sistemas de archivos
+    """
+    if os.name == 'nt':
+        os.rename(source_path, destination_path)
+        return
+    try:
+        os.link(source_path, destination_path, follow_symlinks=False)
+    except OSError as e:
+        if e.errno not in _NO_HARDLINK_ERRNOS:
+            raise
+        if os.path.lexists(destination_path):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), destination_path)
+        os.rename(source_path, destination_path)
+        return
+    os.unlink(source_path)
+
+
+def copy_file(source_path: str, destination_path: str,
+              throttle: Optional[Callable[[int], None]] = None) -> str:
+    """
+    Copia un archivo conservando sus metadatos (equivalente a shutil.copy2)
+
+    Args:
+        source_path: Archivo de origen
+        destination_path: Ruta destino (no debe existir)
+        throttle: Función llamada con los bytes de cada bloque antes de copiarlo
+
+    Returns:
+        La ruta destino
+
+    Raises:
+        FileExistsError: Si la ruta destino ya existe
+    """
+    temporary_path = partial_path(destination_path)
+    created = False
+    try:
+        with open(source_path, 'rb') as source:
+            # 'xb': nunca se escribe sobre un archivo que ya existe
+            with open(temporary_path, 'xb') as destination:
+                created = True
+                _copy_contents(source, destination, os.fstat(source.fileno()).st_size, throttle)
+        shutil.copystat(source_path, temporary_path)
+        place_file(temporary_path, destination_path)
+    except BaseException:
+        # No dejar una copia a medias, pero solo si la creó esta llamada
+        if created:
+            try:
+                os.unlink(temporary_path)
+            except OSError:
+                pass
+        raise
+    return destination_path
+
+
+def move_file(source_path: str, destination_path: str,
+              throttle: Optional[Callable[[int], None]] = None) -> str:
+    """
+    Mueve un archivo: rename sin reemplazo en el mismo dispositivo, copia en
+    el kernel y borrado del origen entre dispositivos
+
+    Args:
+        source_path: Archivo de origen
+        destination_path: Ruta destino (no debe existir)
+        throttle: Función llamada con los bytes de cada bloque si hay que copiar
+
+    Returns:
+        La ruta destino
+
+    Raises:
+        FileExistsError: Si la ruta destino ya existe
+    """
+    if same_device(source_path, os.path.dirname(destination_path) or '.'):
+        try:
+            place_file(source_path, destination_path)
+            return destination_path
+        except OSError as e:
+            # Por ejemplo, montajes bind del mismo dispositivo
+            if e.errno != errno.EXDEV:
+                raise
+
+    copy_file(source_path, destination_path, throttle)
+    os.unlink(source_path)
+    return destination_path
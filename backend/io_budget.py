@@ -0,0 +1,111 @@
+"""
+Presupuesto de E/S (bytes por segundo y operaciones por segundo) compartido entre hilos
+"""
+import time
+import threading
+from typing import Dict, Any
+
+
+class TokenBucket:
+    """
+    Cubeta de tokens segura entre hilos
+
+    Se recarga a `rate` tokens por segundo hasta `capacity`. Una petición
+    mayor que lo disponible deja la cubeta en negativo y espera a que la
+    deuda se pague, así que los pedidos grandes no se bloquean para siempre
+    y el promedio se respeta. Con rate 0 no hay límite.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self._lock = threading.Lock()
+        self.configure(rate, capacity)
+
+    def configure(self, rate: float, capacity: float = None):
+        """
+        Cambia la tasa (y la ráfaga máxima, por defecto un segundo de tasa)
+
+        Se conserva el nivel actual de la cubeta (recargado hasta ahora con la
+        tasa anterior y recortado a la nueva capacidad), así que reconfigurar
+        no regala una ráfaga nueva ni perdona la deuda pendiente.
+        """
+        with self._lock:
+            now = time.monotonic()
+            rate = max(0.0, float(rate or 0))
+            capacity = float(capacity) if capacity else rate
+            if getattr(self, 'rate', 0):
+                tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._tokens = min(capacity, tokens)
+            else:
+                # Sin límite previo (o cubeta nueva): se empieza con la cubeta llena
+                self._tokens = capacity
+            self.rate = rate
+            self.capacity = capacity
+            self._updated = now
+
+    def acquire(self, amount: float = 1) -> float:
+        """
+        Toma `amount` tokens, esperando si hace falta
+
+        Returns:
+            Segundos que se esperó
+        """
+        if amount <= 0:
+            return 0.0
+        with self._lock:
+            if not self.rate:
+                return 0.0
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class IOBudget:
+    """Límite de bytes y de operaciones por segundo para las operaciones masivas"""
+
+    def __init__(self, bytes_per_second: float = 0, ops_per_second: float = 0):
+        self._bytes = TokenBucket(bytes_per_second)
+        self._ops = TokenBucket(ops_per_second)
+        self._stats_lock = threading.Lock()
+        self.bytes = 0
+        self.ops = 0
+        self.waited = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._bytes.rate or self._ops.rate)
+
+    def configure(self, bytes_per_second: float = None, ops_per_second: float = None):
+        """Cambia los límites en caliente (None deja el valor actual, 0 quita el límite)"""
+        if bytes_per_second is not None:
+            self._bytes.configure(bytes_per_second)
+        if ops_per_second is not None:
+            self._ops.configure(ops_per_second)
+
+    def acquire_ops(self, count: int = 1):
+        """Espera turno para `count` operaciones de archivo"""
+        waited = self._ops.acquire(count)
+        with self._stats_lock:
+            self.ops += count
+            self.waited += waited
+
+    def acquire_bytes(self, count: int):
+        """Espera turno para transferir `count` bytes"""
+        waited = self._bytes.acquire(count)
+        with self._stats_lock:
+            self.bytes += count
+            self.waited += waited
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                'bytes_per_second': self._bytes.rate,
+                'ops_per_second': self._ops.rate,
+                'bytes': self.bytes,
+                'ops': self.ops,
+                'waited_seconds': self.waited
+            }
@@ -0,0 +1,126 @@
+"""
+Ejecución en segundo plano de los trabajos de organización
+
+Todos los trabajos comparten un ThreadPoolExecutor con un máximo de
+trabajos simultáneos; los demás esperan en cola con estado 'queued'. Cada
+trabajo tiene un evento de cancelación que el organizador revisa entre
+bloques del plan. Al encolar se borran los trabajos terminados más
+antiguos que excedan la retención.
+"""
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, Optional, Tuple
+import os
+from organize_job import OrganizeJob, prune_jobs
+
+logger = logging.getLogger(__name__)
+
+
+class JobRunner:
+    """Cola de trabajos de organización con concurrencia limitada"""
+
+    def __init__(self, organizer, max_concurrent: int = 2, max_finished_jobs: Optional[int] = None):
+        """
+        Args:
+            organizer: FileOrganizer que ejecuta los trabajos
+            max_concurrent: Trabajos que pueden ejecutarse a la vez
+            max_finished_jobs: Trabajos terminados que se conservan en disco (None = todos)
+        """
+        self.organizer = organizer
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_finished_jobs = max_finished_jobs
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix='job')
+        # job_id -> (trabajo, future, evento de cancelación)
+        self._jobs: Dict[str, Tuple[OrganizeJob, Future, threading.Event]] = {}
+        self._lock = threading.Lock()
+        # Trabajos detenidos por shutdown() (no por el usuario): quedan 'interrupted'
+        self._stopped: set = set()
+
+    def submit(self, job: OrganizeJob, workers: Optional[int] = None) -> OrganizeJob:
+        """
+        Encola un trabajo (nuevo o para reanudar)
+
+        Raises:
+            RuntimeError: Si el trabajo ya está en cola o en ejecución
+        """
+        with self._lock:
+            if job.job_id in self._jobs or self.organizer.is_job_active(job.job_id):
+                raise RuntimeError(f"El trabajo {job.job_id} ya está en ejecución")
+            cancel = threading.Event()
+            job.save(status='queued')
+            future = self._executor.submit(self._run, job, workers, cancel)
+            self._jobs[job.job_id] = (job, future, cancel)
+            active = list(self._jobs)
+        if self.max_finished_jobs is not None:
+            deleted = prune_jobs(os.path.dirname(job.job_dir), self.max_finished_jobs, active)
+            if deleted:
+                logger.info(f"Retención de trabajos: {deleted} trabajos terminados borrados")
+        return job
+
+    def _run(self, job: OrganizeJob, workers: Optional[int], cancel: threading.Event):
+        try:
+            if cancel.is_set():
+                if job.job_id not in self._stopped:
+                    job.save(status='cancelled')
+                return
+            self.organizer.run_job(job, workers, cancel)
+            if job.job_id in self._stopped and job.status == 'cancelled':
+                # Detenido por el cierre del servidor, no por el usuario: se reanuda al iniciar
+                job.save(status='interrupted')
+        except Exception as e:
+            logger.error(f"Error ejecutando el trabajo {job.job_id}: {e}")
+        finally:
+            with self._lock:
+                self._jobs.pop(job.job_id, None)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Pide cancelar un trabajo
+
+        Uno en cola se cancela de inmediato; uno en ejecución se detiene al
+        terminar el bloque actual y queda 'cancelled' (se puede reanudar).
+
+        Returns:
+            False si el trabajo no estaba en cola ni en ejecución
+        """
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None:
+                return False
+            job, future, cancel = entry
+            cancel.set()
+            # Todavía en cola: _run ya no llegará a ejecutarse
+            if future.cancel():
+                self._jobs.pop(job_id, None)
+                job.save(status='cancelled')
+        return True
+
+    def is_active(self, job_id: str) -> bool:
+        """Indica si un trabajo está en cola o en ejecución"""
+        with self._lock:
+            return job_id in self._jobs
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = sum(1 for _, future, _ in self._jobs.values() if future.running())
+            return {
+                'max_concurrent': self.max_concurrent,
+                'running': running,
+                'queued': len(self._jobs) - running
+            }
+
+    def shutdown(self, wait: bool = True):
+        """
+        Detiene los trabajos en curso al terminar su bloque y el executor
+
+        Los que estaban en ejecución quedan 'interrupted' y los que estaban en
+        cola siguen 'queued'; ambos se reanudan al iniciar. Un trabajo que el
+        usuario ya había cancelado, o que falla, conserva su estado.
+        """
+        with self._lock:
+            for job_id, (_, _, cancel) in self._jobs.items():
+                if not cancel.is_set():
+                    self._stopped.add(job_id)
+                    cancel.set()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,163 @@
+"""
+Escritor de FileLog en un hilo dedicado con commits agrupados
+"""
+import time
+import queue
+import threading
+import logging
+from typing import Dict, Any, List
+from models import db, FileLog
+
+logger = logging.getLogger(__name__)
+
+# Marca interna de la cola (las de flush son threading.Event propios de cada llamada)
+_STOP = object()
+
+
+class FileLogWriter:
+    """
+    Inserta los registros de FileLog por lotes desde un único hilo
+
+    Los organizadores solo encolan diccionarios; el hilo escritor los inserta
+    con una sola transacción cada batch_size registros o cada flush_interval_ms
+    milisegundos, lo que ocurra primero. El hilo tiene su propio contexto de
+    aplicación, así que no comparte db.session con las peticiones ni con el
+    monitor.
+    """
+
+    def __init__(self, app, batch_size: int = 500, flush_interval_ms: int = 200):
+        """
+        Args:
+            app: Aplicación Flask (para el contexto de la base de datos)
+            batch_size: Registros máximos por transacción
+            flush_interval_ms: Espera máxima antes de escribir un lote incompleto
+        """
+        self.app = app
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self.records_written = 0
+        self.records_failed = 0
+        self.batches = 0
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def queue_depth(self) -> int:
+        """Registros pendientes de escribir"""
+        return self._queue.qsize()
+
+    def start(self):
+        """Inicia el hilo escritor (si no estaba en ejecución)"""
+        with self._lock:
+            if self.is_running:
+                return
+            self._thread = threading.Thread(target=self._run, name='filelog-writer', daemon=True)
+            self._thread.start()
+            logger.info("Escritor de logs iniciado")
+
+    def enqueue(self, record: Dict[str, Any]):
+        """Encola un registro (columnas de FileLog) para escribirlo"""
+        self._queue.put(record)
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Espera a que se escriban todos los registros encolados hasta ahora
+
+        Encola una marca con su propio evento y espera solo a esa marca, así
+        que los registros que se encolen después no alargan la espera.
+
+        Returns:
+            True si los registros se escribieron antes del timeout
+        """
+        if not self.is_running:
+            return self._queue.unfinished_tasks == 0
+        flushed = threading.Event()
+        self._queue.put(flushed)
+        return flushed.wait(timeout)
+
+    def stop(self, timeout: float = 10):
+        """Escribe lo pendiente y detiene el hilo"""
+        with self._lock:
+            thread = self._thread
+            if thread is None or not thread.is_alive():
+                return
+            self._queue.put(_STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(f"El escritor de logs no terminó; quedan {self.queue_depth} registros")
+        else:
+            logger.info("Escritor de logs detenido")
+
+    def _run(self):
+        with self.app.app_context():
+            try:
+                stopping = False
+                while not stopping:
+                    item = self._queue.get()
+                    batch, marker = self._collect(item)
+                    if batch:
+                        self._write(batch)
+                    for _ in range(len(batch) + (marker is not None)):
+                        self._queue.task_done()
+                    stopping = marker is _STOP
+                    if marker is not None and not stopping:
+                        # Todo lo encolado antes de la marca de flush ya está escrito
+                        marker.set()
+            finally:
+                db.session.remove()
+
+    def _collect(self, item):
+        """
+        Junta registros hasta completar el lote, vencer el intervalo o recibir una marca
+
+        Returns:
+            El lote y la marca que lo cerró (_STOP, el evento de un flush o None)
+        """
+        batch: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            if item is _STOP:
+                return batch, item
+            if isinstance(item, threading.Event):
+                return batch, item
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                return batch, None
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return batch, None
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return batch, None
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        """Inserta un lote en una sola transacción"""
+        try:
+            db.session.execute(FileLog.__table__.insert(), batch)
+            db.session.commit()
+            self.records_written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            db.session.rollback()
+            self.records_failed += len(batch)
+            logger.error(f"Error guardando {len(batch)} logs en BD: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtiene la profundidad de la cola y los registros escritos"""
+        return {
+            'running': self.is_running,
+            'queue_depth': self.queue_depth,
+            'records_written': self.records_written,
+            'records_failed': self.records_failed,
+            'batches': self.batches,
+            'batch_size': self.batch_size,
+            'flush_interval_ms': int(self.flush_interval * 1000)
+        }
@@ -63,8 +63,8 @@ class OrganizationRule(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     node_id = db.Column(db.Integer, db.ForeignKey('tree_nodes.id'), nullable=False)
-    rule_type = db.Column(db.String(50), nullable=False)  # extension, keyword, size, date
-    pattern = db.Column(db.String(255), nullable=False)  # ej: ".pdf", "invoice", ">10MB"
+    rule_type = db.Column(db.String(50), nullable=False)  # extension, keyword, glob, regex, size, date, content_type
+    pattern = db.Column(db.String(255), nullable=False)  # ej: ".pdf", "invoice", ">10MB", ">30d"
     priority = db.Column(db.Integer, default=0)  # Mayor prioridad = se evalúa primero
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -93,7 +93,7 @@ class FileLog(db.Model):
     original_path = db.Column(db.String(500), nullable=False)
     destination_path = db.Column(db.String(500), nullable=False)
     rule_id = db.Column(db.Integer, db.ForeignKey('organization_rules.id'), nullable=True)
-    action = db.Column(db.String(50), default='moved')  # moved, copied, deleted
+    action = db.Column(db.String(50), default='moved')  # moved, copied, deleted, duplicate_skipped, duplicate_deleted, duplicate_hardlinked
     status = db.Column(db.String(50), default='success')  # success, failed, pending
     error_message = db.Column(db.Text, nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
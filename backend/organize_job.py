@@ -0,0 +1,479 @@
+"""
+Trabajos de organización reanudables con un diario de movimientos
+
+Cada trabajo vive en su propia carpeta:
+    job.json       estado del trabajo (carpeta, acción, posición, totales)
+    plan.jsonl     plan con los destinos calculados (ver organize_plan)
+    journal.jsonl  diario append-only de movimientos
+    results.jsonl  resultado de cada archivo (para consultarlo por páginas)
+
+El diario registra la intención de cada movimiento antes de hacerlo y su
+finalización después, más un punto de control cada bloque del plan. Si el
+proceso muere, el trabajo se reanuda desde el último punto de control y
+las intenciones sin finalizar se completan o se deshacen según lo que haya
+en disco. La recuperación solo borra archivos temporales propios (la copia
+`.partial` o el enlace de la deduplicación), nunca un destino final que
+pudo escribir otro proceso. El mismo diario permite deshacer el trabajo
+completo, incluidas las deduplicaciones.
+
+Los resultados por archivo se agregan a results.jsonl y cada punto de
+control guarda hasta qué byte son válidos: al reanudar se descarta lo
+escrito después, así que ningún archivo aparece dos veces.
+"""
+import os
+import json
+import uuid
+import shutil
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Any, Iterable, Iterator, Optional
+from file_hasher import file_hasher
+from file_transfer import LINK_SUFFIX, partial_path
+
+logger = logging.getLogger(__name__)
+
+JOB_FILE = 'job.json'
+PLAN_FILE = 'plan.jsonl'
+JOURNAL_FILE = 'journal.jsonl'
+RESULTS_FILE = 'results.jsonl'
+
+# Estados de un trabajo ('queued': esperando un hueco en el JobRunner;
+# 'partially_undone': el deshacer omitió archivos y se puede reintentar)
+JOB_STATUSES = ('created', 'queued', 'running', 'interrupted', 'cancelled', 'completed', 'failed',
+                'undone', 'partially_undone')
+# Trabajos que quedaron a medias y se reanudan al iniciar
+UNFINISHED_STATUSES = ('created', 'queued', 'running', 'interrupted')
+# Trabajos terminados que la retención puede borrar (los cancelados o
+# parcialmente deshechos se conservan porque se pueden retomar)
+FINISHED_STATUSES = ('completed', 'failed', 'undone')
+
+
+class JobCancelled(Exception):
+    """Se pidió cancelar el trabajo en ejecución"""
+
+
+class MoveJournal:
+    """Diario append-only de movimientos (una línea JSON por registro)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def _append(self, record: Dict[str, Any], sync: bool = False):
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line)
+            # Se vacía en cada registro: la intención llega al sistema operativo antes del movimiento
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def intent(self, source: str, destination: str, action: str, temporary: Optional[str] = None):
+        """Registra un movimiento a punto de empezar (con la ruta temporal de la copia, si la hay)"""
+        record = {'t': 'intent', 'src': source, 'dst': destination, 'action': action}
+        if temporary:
+            record['tmp'] = temporary
+        self._append(record)
+
+    def done(self, source: str, destination: str, action: str):
+        """Registra un movimiento terminado, con el tamaño y mtime del destino para deshacerlo con seguridad"""
+        record = {'t': 'done', 'src': source, 'dst': destination, 'action': action}
+        try:
+            st = os.lstat(destination)
+            record['size'] = st.st_size
+            record['mtime_ns'] = st.st_mtime_ns
+        except OSError:
+            pass
+        self._append(record)
+
+    def abort(self, source: str, destination: str):
+        self._append({'t': 'abort', 'src': source, 'dst': destination})
+
+    def undone(self, source: str, destination: str):
+        self._append({'t': 'undone', 'src': source, 'dst': destination})
+
+    def checkpoint(self, position: int, results_offset: int = 0):
+        """Registra cuántas entradas del plan están terminadas y el tamaño válido de los resultados (con fsync)"""
+        self._append({'t': 'checkpoint', 'position': position, 'results': results_offset}, sync=True)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+
+class ResultLog:
+    """Resultados por archivo de un trabajo (una línea JSON por archivo)"""
+
+    def __init__(self, path: str, offset: int = 0):
+        self.path = path
+        self._file = open(path, 'ab')
+        # Descartar los resultados escritos después del último punto de control
+        self._file.truncate(offset)
+        self.offset = offset
+
+    def add(self, result: Dict[str, Any]):
+        line = (json.dumps(result, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        self._file.write(line)
+        self.offset += len(line)
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+def iter_journal(path: str) -> Iterator[Dict[str, Any]]:
+    """Recorre los registros de un diario (ignora una última línea incompleta)"""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Línea cortada por una caída durante la escritura
+                logger.warning(f"Registro incompleto en el diario {path}")
+
+
+class OrganizeJob:
+    """Estado persistente de un trabajo de organización"""
+
+    def __init__(self, job_dir: str):
+        self.job_dir = job_dir
+        self.job_id = os.path.basename(os.path.normpath(job_dir))
+        self.plan_path = os.path.join(job_dir, PLAN_FILE)
+        self.journal_path = os.path.join(job_dir, JOURNAL_FILE)
+        self.results_path = os.path.join(job_dir, RESULTS_FILE)
+        self.meta_path = os.path.join(job_dir, JOB_FILE)
+        with open(self.meta_path, encoding='utf-8') as f:
+            self.meta: Dict[str, Any] = json.load(f)
+
+    @classmethod
+    def create(cls, jobs_dir: str, folder_path: str, recursive: bool = False,
+               action: str = 'move', workers: Optional[int] = None,
+               plan_path: Optional[str] = None) -> 'OrganizeJob':
+        """
+        Crea la carpeta y el estado inicial de un trabajo nuevo
+
+        Con plan_path, el trabajo aplica una copia de ese plan guardado en
+        lugar de previsualizar la carpeta.
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(jobs_dir, job_id)
+        os.makedirs(job_dir)
+        if plan_path:
+            shutil.copyfile(plan_path, os.path.join(job_dir, PLAN_FILE))
+        now = datetime.utcnow().isoformat()
+        meta = {
+            'job_id': job_id,
+            'folder': folder_path,
+            'recursive': recursive,
+            'action': action,
+            'workers': workers,
+            'status': 'created',
+            'position': 0,
+            'files_seen': None,
+            'planned': None,
+            'summary': None,
+            'progress': None,
+            'elapsed_seconds': 0.0,
+            'results_offset': 0,
+            'rules_changed': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now
+        }
+        _write_json(os.path.join(job_dir, JOB_FILE), meta)
+        return cls(job_dir)
+
+    @property
+    def status(self) -> str:
+        return self.meta['status']
+
+    def save(self, **changes):
+        """Actualiza y guarda el estado del trabajo (escritura atómica)"""
+        self.meta.update(changes)
+        self.meta['updated_at'] = datetime.utcnow().isoformat()
+        _write_json(self.meta_path, self.meta)
+
+    def open_journal(self) -> MoveJournal:
+        return MoveJournal(self.journal_path)
+
+    def open_results(self, offset: int) -> ResultLog:
+        return ResultLog(self.results_path, offset)
+
+    def read_results(self, cursor: int = 0, limit: int = 100, status: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Lee una página de los resultados por archivo
+
+        Solo se leen los resultados confirmados en el último punto de control
+        (results_offset), así que las páginas no cambian mientras se leen. El
+        cursor es la posición en bytes del siguiente resultado dentro de
+        results.jsonl: cada página empieza a leer ahí en lugar de recorrer el
+        archivo desde el principio.
+
+        Args:
+            cursor: Valor de next_cursor de la página anterior (0 para la primera)
+            limit: Máximo de resultados a devolver
+            status: 'success' o 'failed' para filtrar (opcional)
+
+        Returns:
+            results, cursor, limit y next_cursor (None si no hay más)
+
+        Raises:
+            ValueError: Si el cursor no es el inicio de un resultado confirmado
+        """
+        committed = self.meta.get('results_offset') or 0
+        if cursor < 0 or (cursor > committed and committed):
+            raise ValueError(f"Cursor fuera de rango: {cursor}")
+        page = []
+        next_cursor = None
+        if cursor < committed and os.path.exists(self.results_path):
+            with open(self.results_path, 'rb') as f:
+                if cursor:
+                    # Un cursor válido siempre queda justo después de un salto de línea
+                    f.seek(cursor - 1)
+                    if f.read(1) != b'\n':
+                        raise ValueError(f"Cursor inválido: {cursor}")
+                position = cursor
+                while position < committed:
+                    line = f.readline()
+                    if not line:
+                        break
+                    result = json.loads(line)
+                    if not status or result['success'] == (status == 'success'):
+                        if len(page) >= limit:
+                            next_cursor = position
+                            break
+                        page.append(result)
+                    position += len(line)
+        return {'results': page, 'cursor': cursor, 'limit': limit, 'next_cursor': next_cursor}
+
+    def recover(self) -> Dict[str, Any]:
+        """
+        Reconcilia el diario con el disco antes de reanudar
+
+        Las intenciones sin 'done' ni 'abort' se completan si el movimiento
+        llegó a hacerse, o se deshacen si quedó a medias (solo se borra la
+        copia temporal).
+
+        Returns:
+            position: entradas del plan terminadas según el último punto de control
+            results_offset: bytes válidos de results.jsonl en ese punto de control
+            completed_sources: orígenes terminados después de ese punto de control (con su registro 'done')
+            rolled_forward / rolled_back: intenciones reconciliadas
+        """
+        position = 0
+        results_offset = 0
+        completed_after_checkpoint: Dict[str, Dict[str, Any]] = {}
+        pending: Dict[tuple, Dict[str, Any]] = {}
+
+        for record in iter_journal(self.journal_path):
+            kind = record.get('t')
+            if kind == 'checkpoint':
+                position = record['position']
+                results_offset = record.get('results', 0)
+                completed_after_checkpoint.clear()
+            elif kind == 'intent':
+                pending[(record['src'], record['dst'])] = record
+            elif kind == 'done':
+                pending.pop((record['src'], record['dst']), None)
+                completed_after_checkpoint[record['src']] = record
+            elif kind == 'abort':
+                pending.pop((record['src'], record['dst']), None)
+
+        rolled_forward = 0
+        rolled_back = 0
+        if pending:
+            journal = self.open_journal()
+            try:
+                for (source, destination), intent in pending.items():
+                    if _finish_interrupted(intent):
+                        journal.done(source, destination, intent['action'])
+                        completed_after_checkpoint[source] = {'src': source, 'dst': destination,
+                                                              'action': intent['action']}
+                        rolled_forward += 1
+                    else:
+                        journal.abort(source, destination)
+                        rolled_back += 1
+            finally:
+                journal.close()
+            logger.info(f"Trabajo {self.job_id}: {rolled_forward} movimientos completados, "
+                        f"{rolled_back} deshechos al reanudar")
+
+        return {
+            'position': position,
+            'results_offset': results_offset,
+            'completed_sources': completed_after_checkpoint,
+            'rolled_forward': rolled_forward,
+            'rolled_back': rolled_back
+        }
+
+    def iter_completed(self) -> Iterator[Dict[str, Any]]:
+        """Movimientos terminados y aún no deshechos, en orden"""
+        undone = {(r['src'], r['dst']) for r in iter_journal(self.journal_path) if r.get('t') == 'undone'}
+        for record in iter_journal(self.journal_path):
+            if record.get('t') == 'done' and (record['src'], record['dst']) not in undone:
+                yield record
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.meta)
+
+    def delete(self):
+        """Borra la carpeta del trabajo (estado, plan, diario y resultados)"""
+        shutil.rmtree(self.job_dir)
+
+
+def _finish_interrupted(intent: Dict[str, Any]) -> bool:
+    """
+    Decide qué pasó con un movimiento interrumpido
+
+    Solo se borran archivos que este proceso creó con certeza: la copia
+    temporal (.partial, creada en modo exclusivo) o el enlace temporal de la
+    deduplicación. Un destino final que no se puede demostrar propio se deja
+    como está y el movimiento se da por no hecho.
+
+    Returns:
+        True si el movimiento quedó (o se dejó) completo, False si no se hizo
+    """
+    source = intent['src']
+    destination = intent['dst']
+    action = intent['action']
+
+    if action == 'duplicate_deleted':
+        return not os.path.lexists(source) and os.path.lexists(destination)
+
+    if action == 'duplicate_hardlinked':
+        link_path = source + LINK_SUFFIX
+        if os.path.lexists(link_path) and _same_file(link_path, destination):
+            os.unlink(link_path)
+        return _same_file(source, destination)
+
+    temporary = intent.get('tmp') or partial_path(destination)
+    if os.path.lexists(temporary):
+        placed = _same_file(temporary, destination)
+        # Copia a medias, o enlace ya colocado al que le faltó borrar el temporal
+        os.unlink(temporary)
+        if not placed:
+            return False
+
+    if not os.path.lexists(destination):
+        # No llegó a colocarse: el origen sigue en su sitio
+        return False
+
+    if not os.path.lexists(source):
+        # El movimiento terminó (el origen solo se borra después de colocar el destino)
+        return True
+
+    # Ambos existen
+    if _same_file(source, destination):
+        # Rename por enlace + borrado interrumpido entre los dos pasos
+        if action == 'move':
+            os.unlink(source)
+        return True
+
+    try:
+        st_source = os.stat(source)
+        st_destination = os.stat(destination)
+        # Una copia nuestra tiene el contenido y el mtime del origen (copystat)
+        ours = (st_source.st_mtime_ns == st_destination.st_mtime_ns and
+                file_hasher.identical(source, destination))
+    except OSError:
+        ours = False
+
+    if not ours:
+        # El destino es de otro: no se toca y el origen queda en su sitio
+        return False
+
+    if action == 'move':
+        # Se copió entre dispositivos pero faltó borrar el origen
+        os.unlink(source)
+    return True
+
+
+def _same_file(path_a: str, path_b: str) -> bool:
+    """Indica si dos rutas son el mismo archivo (sin seguir enlaces simbólicos)"""
+    try:
+        st_a = os.lstat(path_a)
+        st_b = os.lstat(path_b)
+    except OSError:
+        return False
+    return bool(st_a.st_ino) and os.path.samestat(st_a, st_b)
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def list_jobs(jobs_dir: str) -> Iterator[OrganizeJob]:
+    """Recorre los trabajos guardados, del más reciente al más antiguo"""
+    if not os.path.isdir(jobs_dir):
+        return
+    jobs = []
+    for entry in os.scandir(jobs_dir):
+        if entry.is_dir() and os.path.exists(os.path.join(entry.path, JOB_FILE)):
+            try:
+                jobs.append(OrganizeJob(entry.path))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Trabajo ilegible en {entry.path}: {e}")
+    jobs.sort(key=lambda job: job.meta.get('created_at', ''), reverse=True)
+    yield from jobs
+
+
+def load_job(jobs_dir: str, job_id: str) -> Optional[OrganizeJob]:
+    """Carga un trabajo por id (None si no existe o el id no es válido)"""
+    if len(job_id) != 32 or any(c not in '0123456789abcdef' for c in job_id):
+        return None
+    job_dir = os.path.join(jobs_dir, job_id)
+    if not os.path.exists(os.path.join(job_dir, JOB_FILE)):
+        return None
+    return OrganizeJob(job_dir)
+
+
+def find_unfinished_job(jobs_dir: str, folder_path: str) -> Optional[OrganizeJob]:
+    """Busca un trabajo sin terminar sobre la misma carpeta (None si no hay)"""
+    folder = os.path.normcase(os.path.abspath(folder_path))
+    for job in list_jobs(jobs_dir):
+        if job.status in UNFINISHED_STATUSES and \
+                os.path.normcase(os.path.abspath(job.meta.get('folder') or '')) == folder:
+            return job
+    return None
+
+
+def prune_jobs(jobs_dir: str, keep: int, exclude: Iterable[str] = ()) -> int:
+    """
+    Borra los trabajos terminados más antiguos, conservando los `keep` más recientes
+
+    Solo se borran trabajos en FINISHED_STATUSES; los que siguen a medias o
+    los indicados en `exclude` (ids) no se tocan.
+
+    Returns:
+        Cantidad de trabajos borrados
+    """
+    excluded = set(exclude)
+    kept = 0
+    deleted = 0
+    for job in list_jobs(jobs_dir):
+        if job.status not in FINISHED_STATUSES or job.job_id in excluded:
+            continue
+        if kept < keep:
+            kept += 1
+            continue
+        try:
+            job.delete()
+            deleted += 1
+        except OSError as e:
+            logger.warning(f"No se pudo borrar el trabajo {job.job_id}: {e}")
+    return deleted
@@ -0,0 +1,108 @@
+"""
+Planes de organización guardados en disco (previsualizar ahora, aplicar después)
+
+Un plan es un archivo JSON Lines: la primera línea es la cabecera y cada
+línea siguiente es un archivo con su destino, la regla que lo eligió y el
+tamaño y mtime que tenía al previsualizar. Se escribe y se lee en streaming, así que un plan de
+millones de archivos no se carga entero en memoria.
+"""
+import os
+import json
+from datetime import datetime
+from typing import Dict, Any, Iterator, NamedTuple, Optional
+
+PLAN_VERSION = 1
+
+
+class PlanEntry(NamedTuple):
+    """Archivo de un plan y el destino calculado en la previsualización"""
+    source: str
+    destination: str
+    node: str
+    size: int
+    mtime_ns: int
+    # Regla que eligió el destino (ausente en planes guardados antes de registrarla)
+    rule_type: Optional[str] = None
+    rule_pattern: Optional[str] = None
+
+
+class PlanWriter:
+    """Escribe un plan línea a línea"""
+
+    def __init__(self, plan_path: str, folder_path: str, recursive: bool, rules_hash: Optional[str] = None):
+        os.makedirs(os.path.dirname(os.path.abspath(plan_path)), exist_ok=True)
+        # Se escribe en un temporal y se renombra al cerrar: un plan a medias nunca se aplica
+        self.plan_path = plan_path
+        self._tmp_path = f"{plan_path}.tmp"
+        self._file = open(self._tmp_path, 'w', encoding='utf-8')
+        self.entries = 0
+        self._write({
+            'version': PLAN_VERSION,
+            'folder': folder_path,
+            'recursive': recursive,
+            'rules_hash': rules_hash,
+            'created_at': datetime.utcnow().isoformat()
+        })
+
+    def _write(self, data: Dict[str, Any]):
+        self._file.write(json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+        self._file.write('\n')
+
+    def add(self, entry: PlanEntry):
+        self._write(entry._asdict())
+        self.entries += 1
+
+    def close(self):
+        self._file.close()
+        os.replace(self._tmp_path, self.plan_path)
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.unlink(self._tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def read_plan_header(plan_path: str) -> Dict[str, Any]:
+    """
+    Lee la cabecera de un plan
+
+    Raises:
+        ValueError: Si el archivo no es un plan válido
+    """
+    with open(plan_path, encoding='utf-8') as f:
+        return _parse_header(f.readline(), plan_path)
+
+
+def _parse_header(line: str, plan_path: str) -> Dict[str, Any]:
+    try:
+        header = json.loads(line)
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get('version') != PLAN_VERSION:
+        raise ValueError(f"Plan inválido o de otra versión: {plan_path}")
+    return header
+
+
+def iter_plan(plan_path: str) -> Iterator[PlanEntry]:
+    """
+    Recorre las entradas de un plan
+
+    Raises:
+        ValueError: Si el archivo no es un plan válido
+    """
+    with open(plan_path, encoding='utf-8') as f:
+        _parse_header(f.readline(), plan_path)
+        for line in f:
+            if line.strip():
+                yield PlanEntry(**json.loads(line))
@@ -0,0 +1,123 @@
+"""
+Estadísticas del organizador: contadores, errores recientes e histogramas de latencia
+
+Todo es seguro entre hilos y de tamaño fijo: los errores se guardan en un
+buffer circular y las latencias en cubetas, así que la memoria no crece
+con el tiempo de ejecución.
+"""
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+# Fases medidas por archivo, más 'classify_batch': una muestra por bloque de
+# classify_many (no se mezcla con 'classify', que mide archivos sueltos)
+PHASES = ('classify', 'classify_batch', 'mkdir', 'move', 'log')
+
+COUNTERS = ('files_processed', 'files_moved', 'files_failed', 'files_deduplicated', 'files_skipped')
+
+# Límites superiores de las cubetas en microsegundos (potencias de 2, de 1 µs a ~67 s)
+BUCKET_BOUNDS_US = tuple(2 ** i for i in range(27))
+
+
+class LatencyHistogram:
+    """Histograma de latencias con cubetas exponenciales (no es seguro entre hilos por sí solo)"""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_US) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        microseconds = seconds * 1e6
+        # Cubeta: la primera potencia de 2 que es >= a la latencia
+        bucket = int(microseconds).bit_length()
+        self.counts[min(bucket, len(BUCKET_BOUNDS_US))] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Percentil aproximado (límite superior de la cubeta) en microsegundos"""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for bucket, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                if bucket < len(BUCKET_BOUNDS_US):
+                    return float(min(BUCKET_BOUNDS_US[bucket], self.max * 1e6))
+                break
+        return self.max * 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'mean_us': self.total / self.count * 1e6 if self.count else None,
+            'p50_us': self.percentile(0.50),
+            'p90_us': self.percentile(0.90),
+            'p99_us': self.percentile(0.99),
+            'max_us': self.max * 1e6 if self.count else None
+        }
+
+
+class OrganizerStats:
+    """Contadores, últimos errores y latencias por fase de un FileOrganizer"""
+
+    def __init__(self, max_errors: int = 100):
+        self._lock = threading.Lock()
+        self.max_errors = max_errors
+        self._reset()
+
+    def _reset(self):
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.errors = deque(maxlen=self.max_errors)
+        self.errors_total = 0
+        self.latency = {phase: LatencyHistogram() for phase in PHASES}
+
+    def increment(self, key: str, error: Optional[Dict[str, Any]] = None):
+        """Incrementa un contador (y registra el error si se indica)"""
+        with self._lock:
+            self.counters[key] += 1
+            if error is not None:
+                self.errors.append(error)
+                self.errors_total += 1
+
+    def add_error(self, error: Dict[str, Any]):
+        """Registra un error que no corresponde a un archivo (carpeta, plan...)"""
+        with self._lock:
+            self.errors.append(error)
+            self.errors_total += 1
+
+    def observe(self, phase: str, seconds: float):
+        """Registra la duración de una fase"""
+        with self._lock:
+            self.latency[phase].observe(seconds)
+
+    @contextmanager
+    def timer(self, phase: str):
+        """Mide la duración del bloque y la registra en la fase indicada"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copia consistente de todas las estadísticas"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['errors'] = list(self.errors)
+            stats['errors_total'] = self.errors_total
+            stats['latency'] = {phase: histogram.to_dict() for phase, histogram in self.latency.items()}
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._reset()
@@ -0,0 +1,633 @@
+"""
+Índice compilado de reglas para clasificar archivos rápidamente
+"""
+import os
+import re
+import fnmatch
+import time
+import operator
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Dict, Tuple, Any, Hashable, Callable, Union
+from content_sniffer import content_sniffer, normalize_content_type, content_type_matches
+
+logger = logging.getLogger(__name__)
+
+# Un candidato es ((prioridad, -orden), nodo). El orden es la posición de la
+# regla en el recorrido del árbol, así que comparar las claves reproduce la
+# semántica original: gana la mayor prioridad y, ante empate, la primera regla.
+Candidate = Tuple[Tuple[int, int], Any]
+
+
+def normalize_extension(extension: str) -> str:
+    """Normaliza una extensión: minúsculas, sin espacios y con punto inicial"""
+    normalized = extension.lower().strip()
+    if normalized and not normalized.startswith('.'):
+        normalized = '.' + normalized
+    return normalized
+
+
+# Reglas que necesitan el archivo en disco (stat y, para content_type, sus primeros bytes)
+STAT_RULE_TYPES = ('size', 'date', 'content_type')
+
+_OPERATORS = {
+    '>=': operator.ge,
+    '<=': operator.le,
+    '>': operator.gt,
+    '<': operator.lt,
+    '=': operator.eq
+}
+_COMPARISON_RE = re.compile(r'^\s*(>=|<=|>|<|=)\s*(.+?)\s*$')
+_SIZE_RE = re.compile(r'^(\d+(?:\.\d+)?)\s*([kmgt]?b)?$', re.IGNORECASE)
+_SIZE_UNITS = {'b': 1, 'kb': 1024, 'mb': 1024 ** 2, 'gb': 1024 ** 3, 'tb': 1024 ** 4}
+_AGE_RE = re.compile(r'^(\d+)\s*([hdw])$', re.IGNORECASE)
+_AGE_UNITS = {'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+# Lo que se acepta como stat de un archivo: el resultado de os.stat o un DirEntry
+StatSource = Union[os.stat_result, os.DirEntry]
+
+
+class FileProbe:
+    """
+    Información de un archivo en disco para las reglas de tamaño, fecha y contenido
+
+    El tipo de contenido se detecta la primera vez que una regla lo pide.
+    """
+
+    __slots__ = ('path', 'stat', 'now', '_content_type')
+
+    _UNKNOWN = object()
+
+    def __init__(self, path: Optional[str], stat: os.stat_result, now: float):
+        self.path = path
+        self.stat = stat
+        self.now = now
+        self._content_type = self._UNKNOWN
+
+    def content_type(self) -> Optional[str]:
+        """Tipo de contenido del archivo (leído como mucho una vez)"""
+        if self._content_type is self._UNKNOWN:
+            self._content_type = content_sniffer.detect(self.path, self.stat) if self.path else None
+        return self._content_type
+
+
+def _split_comparison(pattern: str) -> Tuple[Callable[[Any, Any], bool], str]:
+    """Separa el operador de comparación del valor de un patrón"""
+    match = _COMPARISON_RE.match(pattern)
+    if not match:
+        raise ValueError(f"Patrón sin operador de comparación (>, >=, <, <=, =): {pattern!r}")
+    return _OPERATORS[match.group(1)], match.group(2)
+
+
+def parse_size_pattern(pattern: str) -> Callable[[FileProbe], bool]:
+    """
+    Compila un patrón de tamaño, por ejemplo ">10MB" o "<=500 KB"
+
+    Returns:
+        Función (FileProbe) -> bool
+
+    Raises:
+        ValueError: Si el patrón no es válido
+    """
+    compare, value = _split_comparison(pattern)
+    match = _SIZE_RE.match(value)
+    if not match:
+        raise ValueError(f"Tamaño inválido: {value!r}")
+    threshold = float(match.group(1)) * _SIZE_UNITS[(match.group(2) or 'b').lower()]
+    return lambda probe: compare(probe.stat.st_size, threshold)
+
+
+def parse_date_pattern(pattern: str) -> Callable[[FileProbe], bool]:
+    """
+    Compila un patrón de fecha de modificación
+
+    Acepta una antigüedad (">30d": modificado hace más de 30 días; unidades
+    h, d y w) o una fecha absoluta (">2024-01-01": modificado después del
+    1 de enero de 2024).
+
+    Returns:
+        Función (FileProbe) -> bool
+
+    Raises:
+        ValueError: Si el patrón no es válido
+    """
+    compare, value = _split_comparison(pattern)
+    match = _AGE_RE.match(value)
+    if match:
+        max_age = int(match.group(1)) * _AGE_UNITS[match.group(2).lower()]
+        return lambda probe: compare(probe.now - probe.stat.st_mtime, max_age)
+    try:
+        timestamp = datetime.strptime(value, '%Y-%m-%d').timestamp()
+    except ValueError:
+        raise ValueError(f"Fecha inválida (usa 30d, 12h, 2w o AAAA-MM-DD): {value!r}")
+    return lambda probe: compare(probe.stat.st_mtime, timestamp)
+
+
+def parse_content_type_pattern(pattern: str) -> Callable[[FileProbe], bool]:
+    """
+    Compila un patrón de tipo de contenido, por ejemplo "pdf" o "application/pdf"
+
+    Returns:
+        Función (FileProbe) -> bool
+
+    Raises:
+        ValueError: Si el tipo no es conocido
+    """
+    expected = normalize_content_type(pattern)
+    return lambda probe: content_type_matches(probe.content_type(), expected)
+
+
+_STAT_RULE_PARSERS = {
+    'size': parse_size_pattern,
+    'date': parse_date_pattern,
+    'content_type': parse_content_type_pattern
+}
+
+# Reglas de nombre basadas en expresiones regulares
+PATTERN_RULE_TYPES = ('glob', 'regex')
+
+_GLOBAL_FLAGS_RE = re.compile(r'^\(\?([aiLmsux]+)\)')
+# Referencias por número o nombre: dependen de la numeración de grupos del patrón
+_BACKREFERENCE_RE = re.compile(r'\\[1-9]|\(\?P=')
+
+
+def compile_name_pattern(rule_type: str, pattern: str) -> str:
+    """
+    Convierte un patrón glob o regex en una expresión anclada al inicio del nombre
+
+    Los glob no distinguen mayúsculas y deben coincidir con el nombre completo;
+    las regex se evalúan como re.match (desde el inicio del nombre).
+
+    Raises:
+        ValueError: Si la expresión regular no es válida
+    """
+    if rule_type == 'glob':
+        return '(?i:' + fnmatch.translate(pattern) + ')'
+
+    # Las banderas globales solo se permiten al inicio; se convierten en locales
+    flags = _GLOBAL_FLAGS_RE.match(pattern)
+    if flags:
+        pattern = f'(?{flags.group(1)}:{pattern[flags.end():]})'
+    try:
+        re.compile(pattern)
+    except re.error as e:
+        raise ValueError(f"Expresión regular inválida: {e}")
+    return pattern
+
+
+def validate_rule_pattern(rule_type: str, pattern: str):
+    """
+    Verifica que un patrón sea válido para su tipo de regla
+
+    Raises:
+        ValueError: Si el patrón no es válido
+    """
+    parser = _STAT_RULE_PARSERS.get(rule_type)
+    if parser:
+        parser(pattern)
+    elif rule_type in PATTERN_RULE_TYPES:
+        compile_name_pattern(rule_type, pattern)
+
+
+def _read_stat(file_path: Optional[str], file_stat: Optional[StatSource]) -> Optional[os.stat_result]:
+    """Obtiene el stat de un archivo, reutilizando el de un DirEntry si se tiene"""
+    try:
+        if file_stat is not None:
+            if isinstance(file_stat, os.DirEntry):
+                return file_stat.stat()
+            return file_stat
+        if file_path:
+            return os.stat(file_path)
+    except OSError:
+        pass
+    return None
+
+
+def _best(a: Optional[Candidate], b: Optional[Candidate]) -> Optional[Candidate]:
+    """Devuelve el mejor de dos candidatos"""
+    if a is None:
+        return b
+    if b is None or a[0] > b[0]:
+        return a
+    return b
+
+
+class KeywordMatcher:
+    """
+    Autómata Aho-Corasick para reglas de palabra clave
+
+    Encuentra en una sola pasada sobre el nombre del archivo la palabra clave
+    coincidente con mejor candidato, sin recorrer las reglas una por una.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Optional[Candidate]] = [None]
+        self.best: Optional[Candidate] = None
+
+    def add(self, keyword: str, candidate: Candidate):
+        """Agrega una palabra clave (ya en minúsculas) con su candidato"""
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+            state = next_state
+        self._output[state] = _best(self._output[state], candidate)
+        self.best = _best(self.best, candidate)
+
+    def build(self):
+        """Calcula los enlaces de fallo; debe llamarse tras agregar las palabras"""
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                # Cada estado guarda el mejor candidato de toda su cadena de fallo
+                self._output[child] = _best(self._output[child], self._output[self._fail[child]])
+
+    def search(self, text: str) -> Optional[Candidate]:
+        """Devuelve el mejor candidato entre las palabras clave contenidas en text"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        best = output[0]
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state] is not None:
+                best = _best(best, output[state])
+        return best
+
+
+class PatternMatcher:
+    """
+    Reglas glob y regex compiladas en expresiones combinadas
+
+    Las reglas se combinan en alternancias de grupos con nombre, ordenadas de
+    mejor a peor candidato. Como todas están ancladas al inicio del nombre, la
+    primera alternativa que coincide es la de mayor prioridad y basta un
+    re.match por expresión. Para no probar miles de alternativas por archivo,
+    las reglas se reparten según su prefijo literal (hasta PREFIX_LENGTH
+    caracteres): cada nombre solo se compara con las expresiones de sus
+    propios prefijos y con la de las reglas sin prefijo. Las regex con
+    referencias a grupos no pueden combinarse y se evalúan aparte.
+    """
+
+    PREFIX_LENGTH = 3
+
+    def __init__(self):
+        # (expresión, candidato, prefijo, sin distinguir mayúsculas)
+        self._pending: List[Tuple[str, Candidate, str, bool]] = []
+        self._groups: Dict[str, Candidate] = {}
+        # Expresiones combinadas por prefijo: en minúsculas y exactas
+        self._folded: Dict[str, Any] = {}
+        self._exact: Dict[str, Any] = {}
+        self._prefix_lengths: List[int] = []
+        self._any = None
+        self._standalone: List[Tuple[Any, Candidate]] = []
+        self.best: Optional[Candidate] = None
+
+    def add(self, rule_type: str, pattern: str, candidate: Candidate):
+        """
+        Agrega una regla glob o regex
+
+        Raises:
+            ValueError: Si la expresión regular no es válida
+        """
+        expression = compile_name_pattern(rule_type, pattern)
+        if _BACKREFERENCE_RE.search(expression):
+            self._standalone.append((re.compile(expression), candidate))
+        else:
+            prefix, ignore_case = self._literal_prefix(rule_type, pattern)
+            self._pending.append((expression, candidate, prefix[:self.PREFIX_LENGTH], ignore_case))
+        self.best = _best(self.best, candidate)
+
+    @staticmethod
+    def _literal_prefix(rule_type: str, pattern: str) -> Tuple[str, bool]:
+        """
+        Obtiene el prefijo literal con el que debe empezar todo nombre que coincida
+
+        Es conservador: ante cualquier construcción dudosa devuelve un prefijo vacío.
+        """
+        if rule_type == 'glob':
+            prefix = []
+            for char in pattern:
+                if char in '*?[':
+                    break
+                prefix.append(char)
+            return ''.join(prefix).lower(), True
+
+        flags = _GLOBAL_FLAGS_RE.match(pattern)
+        flag_letters = flags.group(1) if flags else ''
+        body = pattern[flags.end():] if flags else pattern
+        if 'x' in flag_letters or '|' in body:
+            return '', False
+
+        length = 0
+        while length < len(body) and (body[length].isalnum() or body[length] in '_-'):
+            length += 1
+        # Un cuantificador vuelve opcional al último carácter
+        if length < len(body) and body[length] in '*?{':
+            length -= 1
+        prefix = body[:max(length, 0)]
+        if 'i' in flag_letters:
+            return prefix.lower(), True
+        return prefix, False
+
+    def _combine(self, entries: List[Tuple[str, Candidate]]) -> Any:
+        """Compila una alternancia ordenada; None si no puede combinarse"""
+        alternatives = []
+        for expression, candidate in entries:
+            group = f'_rule{len(self._groups)}'
+            self._groups[group] = candidate
+            alternatives.append(f'(?P<{group}>{expression})')
+        try:
+            return re.compile('|'.join(alternatives))
+        except re.error:
+            # p. ej. dos regex con el mismo nombre de grupo: evaluarlas por separado
+            self._standalone.extend((re.compile(e), c) for e, c in entries)
+            return None
+
+    def build(self):
+        """Compila las expresiones combinadas; debe llamarse tras agregar las reglas"""
+        self._pending.sort(key=lambda x: x[1][0], reverse=True)
+
+        folded: Dict[str, List[Tuple[str, Candidate]]] = {}
+        exact: Dict[str, List[Tuple[str, Candidate]]] = {}
+        anywhere: List[Tuple[str, Candidate]] = []
+        for expression, candidate, prefix, ignore_case in self._pending:
+            if not prefix:
+                anywhere.append((expression, candidate))
+            elif ignore_case:
+                folded.setdefault(prefix, []).append((expression, candidate))
+            else:
+                exact.setdefault(prefix, []).append((expression, candidate))
+
+        self._folded = {prefix: self._combine(entries) for prefix, entries in folded.items()}
+        self._exact = {prefix: self._combine(entries) for prefix, entries in exact.items()}
+        self._folded = {k: v for k, v in self._folded.items() if v is not None}
+        self._exact = {k: v for k, v in self._exact.items() if v is not None}
+        self._prefix_lengths = sorted({len(prefix) for prefix in list(self._folded) + list(self._exact)})
+        self._any = self._combine(anywhere) if anywhere else None
+        self._standalone.sort(key=lambda x: x[1][0], reverse=True)
+        self._pending = []
+
+    def match(self, filename: str) -> Optional[Candidate]:
+        """Devuelve el mejor candidato entre las reglas que coinciden con el nombre"""
+        best = None
+        groups = self._groups
+
+        expressions = [self._any] if self._any is not None else []
+        if self._prefix_lengths:
+            lower_name = filename[:self.PREFIX_LENGTH].lower()
+            for length in self._prefix_lengths:
+                expression = self._folded.get(lower_name[:length])
+                if expression is not None:
+                    expressions.append(expression)
+                expression = self._exact.get(filename[:length])
+                if expression is not None:
+                    expressions.append(expression)
+
+        for expression in expressions:
+            found = expression.match(filename)
+            if found:
+                best = _best(best, groups[found.lastgroup])
+
+        for expression, candidate in self._standalone:
+            if _best(best, candidate) is best:
+                break
+            if expression.match(filename):
+                best = candidate
+                break
+        return best
+
+
+class RuleIndex:
+    """
+    Índice de reglas compilado a partir de los nodos del árbol
+
+    Las reglas de extensión se guardan en un diccionario extensión -> mejor
+    candidato, las de palabra clave en un autómata Aho-Corasick, las glob y
+    regex en una sola expresión combinada y las de tamaño, fecha y contenido en
+    una lista ordenada por prioridad con sus umbrales ya compilados.
+    """
+
+    def __init__(self, nodes: List[Any]):
+        """
+        Compila las reglas activas de los nodos
+
+        Args:
+            nodes: Nodos del árbol en orden de recorrido (preorden)
+        """
+        self.extensions: Dict[str, Candidate] = {}
+        self.keywords = KeywordMatcher()
+        self.patterns = PatternMatcher()
+        self.stat_rules: List[Tuple[Callable[[FileProbe], bool], Candidate]] = []
+        # Reglas en el orden del recorrido: la posición de cada una va en la clave de su candidato
+        self._rules: List[Any] = []
+
+        order = 0
+        for node in nodes:
+            for rule in node.rules:
+                order += 1
+                self._rules.append(rule)
+                # Una prioridad negativa nunca superaba el umbral inicial (-1)
+                if not rule.is_active or rule.priority < 0:
+                    continue
+
+                candidate = ((rule.priority, -order), node)
+
+                if rule.rule_type == 'extension':
+                    pattern = normalize_extension(rule.pattern)
+                    self.extensions[pattern] = _best(self.extensions.get(pattern), candidate)
+
+                elif rule.rule_type == 'keyword':
+                    self.keywords.add(rule.pattern.lower(), candidate)
+
+                elif rule.rule_type in PATTERN_RULE_TYPES:
+                    try:
+                        self.patterns.add(rule.rule_type, rule.pattern, candidate)
+                    except ValueError as e:
+                        logger.warning(f"Regla {rule.rule_type} ignorada: {e}")
+
+                elif rule.rule_type in _STAT_RULE_PARSERS:
+                    try:
+                        test = _STAT_RULE_PARSERS[rule.rule_type](rule.pattern)
+                    except ValueError as e:
+                        logger.warning(f"Regla {rule.rule_type} ignorada: {e}")
+                        continue
+                    self.stat_rules.append((test, candidate))
+
+        self.keywords.build()
+        self.patterns.build()
+        # Mejor candidato primero
+        self.stat_rules.sort(key=lambda x: x[1][0], reverse=True)
+
+    def match(self, filename: str, normalized_extension: str, file_path: Optional[str] = None,
+              file_stat: Optional[StatSource] = None) -> Optional[Any]:
+        """
+        Busca el nodo destino para un archivo
+
+        Args:
+            filename: Nombre del archivo
+            normalized_extension: Extensión ya normalizada (ver normalize_extension)
+            file_path: Ruta del archivo, para las reglas de tamaño, fecha y contenido
+            file_stat: stat ya conocido del archivo (os.stat_result o DirEntry)
+
+        Returns:
+            El nodo con la regla de mayor prioridad que coincida, o None
+        """
+        candidate = self.name_candidate(filename, normalized_extension)
+        if self.stat_can_improve(candidate):
+            candidate = self.apply_stat_rules(candidate, file_path, file_stat)
+        return candidate[1] if candidate is not None else None
+
+    def rule_for(self, candidate: Optional[Candidate]) -> Optional[Any]:
+        """Obtiene la regla que produjo un candidato (o None)"""
+        return self._rules[-candidate[0][1] - 1] if candidate is not None else None
+
+    def name_rules_can_improve(self, candidate: Optional[Candidate]) -> bool:
+        """Indica si alguna regla basada en el nombre podría superar al candidato dado"""
+        for best in (self.keywords.best, self.patterns.best):
+            if best is not None and _best(candidate, best) is not candidate:
+                return True
+        return False
+
+    def stat_can_improve(self, candidate: Optional[Candidate]) -> bool:
+        """Indica si alguna regla de tamaño, fecha o contenido podría superar al candidato dado"""
+        return bool(self.stat_rules) and _best(candidate, self.stat_rules[0][1]) is not candidate
+
+    def name_candidate(self, filename: str, normalized_extension: str) -> Optional[Candidate]:
+        """Mejor candidato usando solo el nombre (extensión y palabras clave)"""
+        return self.resolve_name(filename, self.extensions.get(normalized_extension))
+
+    def resolve_name(self, filename: str, extension_candidate: Optional[Candidate]) -> Optional[Candidate]:
+        """
+        Combina el candidato por extensión con las reglas de palabra clave,
+        glob y regex que dependen del nombre completo
+
+        Args:
+            filename: Nombre del archivo
+            extension_candidate: Resultado de buscar la extensión en self.extensions
+
+        Returns:
+            El candidato ganador, o None
+        """
+        best = extension_candidate
+
+        # Solo se recorre el nombre si alguna regla puede mejorar el resultado
+        keywords_best = self.keywords.best
+        if keywords_best is not None and _best(best, keywords_best) is not best:
+            best = _best(best, self.keywords.search(filename.lower()))
+
+        patterns_best = self.patterns.best
+        if patterns_best is not None and _best(best, patterns_best) is not best:
+            best = _best(best, self.patterns.match(filename))
+
+        return best
+
+    def apply_stat_rules(self, candidate: Optional[Candidate], file_path: Optional[str],
+                         file_stat: Optional[StatSource]) -> Optional[Candidate]:
+        """
+        Evalúa las reglas de tamaño, fecha y contenido que puedan superar al candidato
+
+        El stat se obtiene como mucho una vez, y solo si hace falta; el
+        contenido solo se lee si se llega a una regla content_type, es decir,
+        si ninguna regla más barata de mayor prioridad coincidió antes.
+        """
+        st = _read_stat(file_path, file_stat)
+        if st is None:
+            return candidate
+
+        if file_path is None and isinstance(file_stat, os.DirEntry):
+            file_path = file_stat.path
+        probe = FileProbe(file_path, st, time.time())
+
+        for test, stat_candidate in self.stat_rules:
+            if _best(candidate, stat_candidate) is candidate:
+                break
+            if test(probe):
+                return stat_candidate
+        return candidate
+
+
+class ClassificationCache:
+    """
+    Caché LRU acotada de resultados de clasificación
+
+    Cada caché lleva la versión del conjunto de reglas con la que se llenó; si
+    la versión cambia, se vacía antes de la siguiente consulta.
+    """
+
+    MISSING = object()
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: int) -> Any:
+        """Devuelve el valor guardado o ClassificationCache.MISSING"""
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+            value = self._entries.get(key, self.MISSING)
+            if value is self.MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any, version: int):
+        """Guarda un valor calculado con la versión de reglas indicada"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Vacía la caché y reinicia los contadores"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtiene aciertos, fallos y ocupación de la caché"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'version': self.version
+            }
@@ -2,24 +2,67 @@
 Implementación de estructura de árbol para organización de archivos
 """
 import os
-from typing import List, Optional, Dict, Any
+import sys
+import hashlib
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Sequence, NamedTuple, Tuple, Callable
+from rule_index import RuleIndex, ClassificationCache, StatSource
+from file_transfer import known_directories
+
+
+class RuleRecord(NamedTuple):
+    """Regla de organización inmutable de un nodo"""
+    rule_type: str
+    pattern: str
+    priority: int
+    is_active: bool
 
 
 class TreeNode:
     """Nodo del árbol de organización"""
     
+    __slots__ = ('tree', '_name', '_path', 'parent', '_depth', 'children', 'node_type', 'rules')
+    
     def __init__(self, name: str, path: str, parent=None, node_type: str = 'folder'):
-        self.name = name
-        self.path = path
+        self.tree: Optional['FileOrganizationTree'] = None
+        self._name = name
+        self._path = path
         self.parent = parent
+        # Profundidad guardada; se actualiza al agregar o quitar el nodo
+        self._depth = parent._depth + 1 if parent is not None else 0
         self.children: List['TreeNode'] = []
         self.node_type = node_type
-        self.rules: List[Dict[str, Any]] = []
+        # Tupla ordenada por prioridad; los nodos sin reglas comparten la tupla vacía
+        self.rules: Tuple[RuleRecord, ...] = ()
+    
+    @property
+    def name(self) -> str:
+        return self._name
+    
+    @name.setter
+    def name(self, value: str):
+        old_name = self._name
+        self._name = value
+        if self.tree is not None:
+            self.tree._on_node_renamed(self, old_name)
+    
+    @property
+    def path(self) -> str:
+        return self._path
+    
+    @path.setter
+    def path(self, value: str):
+        old_path = self._path
+        self._path = value
+        if self.tree is not None:
+            self.tree._on_node_path_changed(self, old_path)
     
     def add_child(self, child: 'TreeNode') -> 'TreeNode':
         """Agrega un hijo al nodo actual"""
         child.parent = self
         self.children.append(child)
+        child._attach(self.tree, self._depth + 1)
+        if self.tree is not None:
+            self.tree.invalidate_rules()
         return child
     
     def remove_child(self, child: 'TreeNode') -> bool:
@@ -27,9 +70,34 @@ class TreeNode:
         if child in self.children:
             self.children.remove(child)
             child.parent = None
+            if self.tree is not None:
+                self.tree.invalidate_rules()
+            child._attach(None, 0)
             return True
         return False
     
+    def _attach(self, tree: Optional['FileOrganizationTree'], depth: int):
+        """Asocia este nodo y sus descendientes a un árbol y recalcula su profundidad"""
+        stack = [(self, depth)]
+        while stack:
+            node, node_depth = stack.pop()
+            if node.tree is not None:
+                node.tree._unregister_node(node)
+            node.tree = tree
+            node._depth = node_depth
+            if tree is not None:
+                tree._register_node(node)
+            for child in reversed(node.children):
+                stack.append((child, node_depth + 1))
+    
+    def iter_subtree(self) -> Iterator['TreeNode']:
+        """Recorre este nodo y sus descendientes en preorden, sin recursión"""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+    
     def find_child(self, name: str) -> Optional['TreeNode']:
         """Busca un hijo por nombre"""
         for child in self.children:
@@ -39,12 +107,7 @@ class TreeNode:
     
     def get_depth(self) -> int:
         """Obtiene la profundidad del nodo en el árbol"""
-        depth = 0
-        current = self.parent
-        while current is not None:
-            depth += 1
-            current = current.parent
-        return depth
+        return self._depth
     
     def get_path_list(self) -> List[str]:
         """Obtiene la lista de nombres desde la raíz hasta este nodo"""
@@ -55,28 +118,50 @@ class TreeNode:
             current = current.parent
         return path_list
     
-    def add_rule(self, rule_type: str, pattern: str, priority: int = 0) -> Dict[str, Any]:
+    def add_rule(self, rule_type: str, pattern: str, priority: int = 0, is_active: bool = True) -> RuleRecord:
         """Agrega una regla de organización al nodo"""
-        rule = {
-            'rule_type': rule_type,
-            'pattern': pattern,
-            'priority': priority,
-            'is_active': True
-        }
-        self.rules.append(rule)
-        self.rules.sort(key=lambda x: x['priority'], reverse=True)
+        rule = RuleRecord(sys.intern(rule_type), pattern, priority, bool(is_active))
+        self.rules = tuple(sorted(self.rules + (rule,), key=lambda x: x.priority, reverse=True))
+        if self.tree is not None:
+            if rule.is_active:
+                self.tree._active_rule_count += 1
+            self.tree.invalidate_rules()
         return rule
     
+    def clear_rules(self):
+        """Elimina todas las reglas del nodo"""
+        if self.tree is not None:
+            self.tree._active_rule_count -= self.count_active_rules()
+        self.rules = ()
+        if self.tree is not None:
+            self.tree.invalidate_rules()
+    
+    def count_active_rules(self) -> int:
+        """Cuenta las reglas activas del nodo"""
+        return sum(1 for rule in self.rules if rule.is_active)
+    
     def to_dict(self) -> Dict[str, Any]:
-        """Convierte el nodo a diccionario"""
-        return {
-            'name': self.name,
-            'path': self.path,
-            'node_type': self.node_type,
-            'depth': self.get_depth(),
-            'children': [child.to_dict() for child in self.children],
-            'rules': self.rules
-        }
+        """Convierte el nodo (y sus descendientes) a diccionario"""
+        result = None
+        # Cada entrada lleva la lista 'children' del padre donde debe agregarse
+        stack = [(self, None)]
+        while stack:
+            node, siblings = stack.pop()
+            node_dict = {
+                'name': node.name,
+                'path': node.path,
+                'node_type': node.node_type,
+                'depth': node._depth,
+                'children': [],
+                'rules': [rule._asdict() for rule in node.rules]
+            }
+            if siblings is None:
+                result = node_dict
+            else:
+                siblings.append(node_dict)
+            for child in reversed(node.children):
+                stack.append((child, node_dict['children']))
+        return result
     
     def __repr__(self):
         return f'<TreeNode {self.name} ({len(self.children)} children)>'
@@ -85,8 +170,123 @@ class TreeNode:
 class FileOrganizationTree:
     """Árbol de organización de archivos"""
     
-    def __init__(self, root_path: str):
+    def __init__(self, root_path: str, cache_size: int = 10000):
+        # Índices ruta -> nodos y nombre -> nodos, mantenidos por TreeNode
+        self._nodes_by_path: Dict[str, List[TreeNode]] = {}
+        self._nodes_by_name: Dict[str, List[TreeNode]] = {}
+        # Agregados mantenidos al agregar o quitar nodos y reglas
+        self._node_count = 0
+        self._active_rule_count = 0
         self.root = TreeNode(name='Root', path=root_path, node_type='root')
+        self.root._attach(self, 0)
+        # Versión del conjunto de reglas; el índice se recompila al cambiar
+        self._rules_version = 0
+        self._rule_index: Optional[RuleIndex] = None
+        self._rule_index_version = -1
+        # Resultados recientes por (extensión normalizada, nombre)
+        self.classification_cache = ClassificationCache(cache_size)
+    
+    def invalidate_rules(self):
+        """Marca el índice de reglas (y la caché de clasificación) como desactualizados"""
+        self._rules_version += 1
+    
+    @property
+    def rules_version(self) -> int:
+        """Generación actual del conjunto de reglas (solo válida dentro del proceso)"""
+        return self._rules_version
+    
+    def rules_hash(self) -> str:
+        """
+        Huella del contenido de las reglas activas y de las rutas de sus nodos
+        
+        A diferencia de rules_version, no depende del proceso: un plan guardado
+        antes de reiniciar se puede comparar con las reglas actuales.
+        """
+        rules = sorted(
+            (node.path, rule.rule_type, rule.pattern, rule.priority)
+            for node in self.iter_nodes()
+            for rule in node.rules
+            if rule.is_active
+        )
+        digest = hashlib.blake2b(digest_size=16)
+        for rule in rules:
+            digest.update(repr(rule).encode('utf-8'))
+            digest.update(b'\n')
+        return digest.hexdigest()
+    
+    def get_rule_index(self) -> RuleIndex:
+        """
+        Obtiene el índice de reglas, recompilándolo si hubo cambios
+
+        Cualquier cambio de reglas o nodos recompila el índice entero en la
+        primera clasificación posterior, no solo la parte afectada. Es
+        intencionado: las reglas cambian desde la interfaz, muy de vez en
+        cuando, y recompilar todo mantiene el índice simple y siempre
+        coherente. El coste crece con el número de reglas (del orden de 0,5 a
+        1,5 s con unas 15.000, sobre todo por las expresiones regulares), y
+        lo paga la primera clasificación después de cada cambio. Si hubiera
+        que editar reglas en lote, conviene hacer todos los cambios antes de
+        volver a clasificar.
+        """
+        if self._rule_index is None or self._rule_index_version != self._rules_version:
+            self._rule_index = RuleIndex(self.get_all_nodes())
+            self._rule_index_version = self._rules_version
+        return self._rule_index
+    
+    def _register_node(self, node: TreeNode):
+        """Agrega un nodo a los índices de ruta y nombre y a los agregados"""
+        self._nodes_by_path.setdefault(node.path, []).append(node)
+        self._nodes_by_name.setdefault(node.name, []).append(node)
+        self._node_count += 1
+        self._active_rule_count += node.count_active_rules()
+    
+    def _unregister_node(self, node: TreeNode):
+        """Quita un nodo de los índices de ruta y nombre y de los agregados"""
+        self._unindex(self._nodes_by_path, node, node.path)
+        self._unindex(self._nodes_by_name, node, node.name)
+        self._node_count -= 1
+        self._active_rule_count -= node.count_active_rules()
+    
+    @staticmethod
+    def _unindex(index: Dict[str, List[TreeNode]], node: TreeNode, key: str):
+        """Quita un nodo de la lista de su clave (ruta o nombre)"""
+        nodes = index.get(key)
+        if nodes:
+            for i, indexed in enumerate(nodes):
+                if indexed is node:
+                    del nodes[i]
+                    break
+            if not nodes:
+                del index[key]
+    
+    def _first_in_preorder(self, nodes: List[TreeNode]) -> TreeNode:
+        """El primero de varios nodos con la misma clave, en el orden del recorrido del árbol"""
+        if len(nodes) == 1:
+            return nodes[0]
+        return self._in_preorder(nodes)[0]
+    
+    def _in_preorder(self, nodes: List[TreeNode]) -> List[TreeNode]:
+        """Ordena nodos según el recorrido en preorden (solo hace falta con claves repetidas)"""
+        if len(nodes) <= 1:
+            return list(nodes)
+        wanted = {id(node) for node in nodes}
+        ordered = []
+        for node in self.iter_nodes():
+            if id(node) in wanted:
+                ordered.append(node)
+                if len(ordered) == len(wanted):
+                    break
+        return ordered
+    
+    def _on_node_renamed(self, node: TreeNode, old_name: str):
+        """Actualiza el índice de nombres tras renombrar un nodo"""
+        self._unindex(self._nodes_by_name, node, old_name)
+        self._nodes_by_name.setdefault(node.name, []).append(node)
+    
+    def _on_node_path_changed(self, node: TreeNode, old_path: str):
+        """Actualiza el índice de rutas tras cambiar la ruta de un nodo"""
+        self._unindex(self._nodes_by_path, node, old_path)
+        self._nodes_by_path.setdefault(node.path, []).append(node)
     
     def add_node(self, parent_path: str, name: str, path: str, node_type: str = 'folder') -> Optional[TreeNode]:
         """Agrega un nodo al árbol"""
@@ -98,117 +298,162 @@ class FileOrganizationTree:
         return None
     
     def find_node_by_path(self, path: str) -> Optional[TreeNode]:
-        """Busca un nodo por su ruta"""
-        return self._find_node_recursive(self.root, path)
-    
-    def _find_node_recursive(self, node: TreeNode, path: str) -> Optional[TreeNode]:
-        """Búsqueda recursiva de nodo por ruta"""
-        if node.path == path:
-            return node
-        
-        for child in node.children:
-            result = self._find_node_recursive(child, path)
-            if result:
-                return result
-        
-        return None
+        """Busca un nodo por su ruta (el primero en preorden si hay varios)"""
+        nodes = self._nodes_by_path.get(path)
+        return self._first_in_preorder(nodes) if nodes else None
     
     def find_node_by_name(self, name: str) -> Optional[TreeNode]:
-        """Busca un nodo por su nombre"""
-        return self._find_node_by_name_recursive(self.root, name)
+        """Busca un nodo por su nombre (el primero en preorden si hay varios)"""
+        nodes = self._nodes_by_name.get(name)
+        return self._first_in_preorder(nodes) if nodes else None
     
-    def _find_node_by_name_recursive(self, node: TreeNode, name: str) -> Optional[TreeNode]:
-        """Búsqueda recursiva de nodo por nombre"""
-        if node.name == name:
-            return node
-        
-        for child in node.children:
-            result = self._find_node_by_name_recursive(child, name)
-            if result:
-                return result
-        
+    def find_nodes_by_name(self, name: str) -> List[TreeNode]:
+        """Busca todos los nodos con un nombre, en preorden"""
+        return self._in_preorder(self._nodes_by_name.get(name, []))
+    
+    def iter_nodes(self) -> Iterator[TreeNode]:
+        """Recorre todos los nodos del árbol en preorden, de forma perezosa"""
+        return self.root.iter_subtree()
+    
+    def find_node(self, predicate: Callable[[TreeNode], bool]) -> Optional[TreeNode]:
+        """Busca el primer nodo (en preorden) que cumpla la condición, deteniéndose al encontrarlo"""
+        for node in self.iter_nodes():
+            if predicate(node):
+                return node
         return None
     
     def get_all_nodes(self) -> List[TreeNode]:
         """Obtiene todos los nodos del árbol"""
-        nodes = []
-        self._collect_nodes_recursive(self.root, nodes)
-        return nodes
-    
-    def _collect_nodes_recursive(self, node: TreeNode, nodes: List[TreeNode]):
-        """Recolecta todos los nodos recursivamente"""
-        nodes.append(node)
-        for child in node.children:
-            self._collect_nodes_recursive(child, nodes)
+        return list(self.iter_nodes())
     
-    def find_destination_for_file(self, filename: str, file_extension: str) -> Optional[TreeNode]:
+    def find_destination_for_file(self, filename: str, file_extension: str, file_path: Optional[str] = None,
+                                  file_stat: Optional[StatSource] = None) -> Optional[TreeNode]:
         """
         Encuentra el nodo de destino para un archivo basado en las reglas
         Retorna el nodo con la regla de mayor prioridad que coincida
-        """
-        best_match = None
-        best_priority = -1
-        
-        all_nodes = self.get_all_nodes()
         
+        Las reglas de tamaño, fecha y contenido solo se evalúan si se indica
+        file_path o file_stat (os.stat_result o DirEntry), y el stat se lee como
+        mucho una vez.
+        """
         # Normalizar la extensión del archivo (asegurar que tenga el punto)
         normalized_file_ext = file_extension.lower()
         if normalized_file_ext and not normalized_file_ext.startswith('.'):
             normalized_file_ext = '.' + normalized_file_ext
         
-        for node in all_nodes:
-            for rule in node.rules:
-                if not rule['is_active']:
-                    continue
-                
-                match = False
-                
-                if rule['rule_type'] == 'extension':
-                    # Normalizar el patrón de la regla (asegurar que tenga el punto)
-                    normalized_pattern = rule['pattern'].lower().strip()
-                    if normalized_pattern and not normalized_pattern.startswith('.'):
-                        normalized_pattern = '.' + normalized_pattern
-                    
-                    # Comparar extensiones normalizadas
-                    if normalized_file_ext == normalized_pattern:
-                        match = True
-                
-                elif rule['rule_type'] == 'keyword':
-                    if rule['pattern'].lower() in filename.lower():
-                        match = True
+        version = self._rules_version
+        index = self.get_rule_index()
+        
+        # La caché guarda el resultado por nombre; las reglas de stat van aparte
+        key = (normalized_file_ext, filename)
+        candidate = self.classification_cache.get(key, version)
+        if candidate is ClassificationCache.MISSING:
+            candidate = index.name_candidate(filename, normalized_file_ext)
+            self.classification_cache.put(key, candidate, version)
+        
+        if index.stat_can_improve(candidate):
+            candidate = index.apply_stat_rules(candidate, file_path, file_stat)
+        
+        return candidate[1] if candidate is not None else None
+    
+    def classify_many(self, filenames: Iterable[str], file_paths: Optional[Sequence[str]] = None,
+                      file_stats: Optional[Sequence[Optional[StatSource]]] = None) -> List[Optional[TreeNode]]:
+        """
+        Clasifica un lote de archivos en una sola llamada
+        
+        Cada extensión distinta se normaliza y se busca una sola vez; si ninguna
+        otra regla puede superar a la regla de esa extensión, el resultado se
+        reutiliza sin mirar el nombre ni hacer stat.
+        
+        Args:
+            filenames: Nombres de archivo (sin directorio)
+            file_paths: Rutas de los archivos, alineadas con filenames (para reglas de tamaño, fecha y contenido)
+            file_stats: stat ya conocido de cada archivo (os.stat_result, DirEntry o None)
+        
+        Returns:
+            Lista con el nodo destino de cada archivo (o None), en el mismo orden
+        """
+        _, candidates = self._classify_candidates(filenames, file_paths, file_stats)
+        return [candidate[1] if candidate is not None else None for candidate in candidates]
+    
+    def classify_many_with_rules(self, filenames: Iterable[str], file_paths: Optional[Sequence[str]] = None,
+                                 file_stats: Optional[Sequence[Optional[StatSource]]] = None
+                                 ) -> List[Tuple[Optional[TreeNode], Optional[RuleRecord]]]:
+        """Como classify_many, pero devuelve también la regla que eligió cada destino"""
+        index, candidates = self._classify_candidates(filenames, file_paths, file_stats)
+        return [(candidate[1], index.rule_for(candidate)) if candidate is not None else (None, None)
+                for candidate in candidates]
+    
+    def _classify_candidates(self, filenames: Iterable[str], file_paths: Optional[Sequence[str]],
+                             file_stats: Optional[Sequence[Optional[StatSource]]]) -> Tuple[RuleIndex, list]:
+        """Obtiene el índice usado y el mejor candidato de cada archivo (ver classify_many)"""
+        version = self._rules_version
+        index = self.get_rule_index()
+        cache = self.classification_cache
+        # extensión -> (normalizada, candidato por extensión, si el resultado solo depende de la extensión)
+        by_extension = {}
+        results = []
+        
+        for position, filename in enumerate(filenames):
+            file_extension = os.path.splitext(filename)[1]
+            entry = by_extension.get(file_extension)
+            
+            if entry is None:
+                normalized_file_ext = file_extension.lower()
+                if normalized_file_ext and not normalized_file_ext.startswith('.'):
+                    normalized_file_ext = '.' + normalized_file_ext
+                candidate = index.extensions.get(normalized_file_ext)
+                fixed = not index.name_rules_can_improve(candidate) and not index.stat_can_improve(candidate)
+                entry = (normalized_file_ext, candidate, fixed)
+                by_extension[file_extension] = entry
+            
+            normalized_file_ext, candidate, fixed = entry
+            
+            if not fixed:
+                # El resultado depende del nombre: consultar la caché
+                key = (normalized_file_ext, filename)
+                cached = cache.get(key, version)
+                if cached is ClassificationCache.MISSING:
+                    cached = index.resolve_name(filename, candidate)
+                    cache.put(key, cached, version)
+                candidate = cached
                 
-                if match and rule['priority'] > best_priority:
-                    best_match = node
-                    best_priority = rule['priority']
+                if index.stat_can_improve(candidate):
+                    candidate = index.apply_stat_rules(
+                        candidate,
+                        file_paths[position] if file_paths is not None else None,
+                        file_stats[position] if file_stats is not None else None
+                    )
+            
+            results.append(candidate)
         
-        return best_match
+        return index, results
     
     def create_folder_structure(self, base_path: str):
         """Crea la estructura de carpetas física en el sistema"""
-        self._create_folders_recursive(self.root, base_path)
-    
-    def _create_folders_recursive(self, node: TreeNode, base_path: str):
-        """Crea carpetas recursivamente"""
-        if node.node_type != 'root':
-            folder_path = os.path.join(base_path, node.path)
-            os.makedirs(folder_path, exist_ok=True)
-        
-        for child in node.children:
-            self._create_folders_recursive(child, base_path)
+        for node in self.iter_nodes():
+            if node.node_type != 'root':
+                folder_path = os.path.join(base_path, node.path)
+                os.makedirs(folder_path, exist_ok=True)
+                known_directories.remember(folder_path)
     
     def has_rules(self) -> bool:
         """Verifica si el árbol tiene alguna regla definida"""
-        all_nodes = self.get_all_nodes()
-        for node in all_nodes:
-            if node.rules:
-                return True
-        return False
+        return self._active_rule_count > 0
+    
+    def count_nodes(self) -> int:
+        """Cantidad de nodos del árbol (incluida la raíz)"""
+        return self._node_count
+    
+    def count_active_rules(self) -> int:
+        """Cantidad de reglas activas en todo el árbol"""
+        return self._active_rule_count
 
     def to_dict(self) -> Dict[str, Any]:
         """Convierte el árbol completo a diccionario"""
         return {
             'root': self.root.to_dict(),
-            'total_nodes': len(self.get_all_nodes()),
+            'total_nodes': self._node_count,
             'has_rules': self.has_rules()
         }
     
@@ -217,13 +462,16 @@ class FileOrganizationTree:
         if node is None:
             node = self.root
         
-        connector = '└── ' if is_last else '├── '
-        print(prefix + connector + node.name)
-        
-        children = node.children
-        for i, child in enumerate(children):
+        stack = [(node, prefix, is_last)]
+        while stack:
+            node, prefix, is_last = stack.pop()
+            connector = '└── ' if is_last else '├── '
+            print(prefix + connector + node.name)
+            
+            children = node.children
             extension = '    ' if is_last else '│   '
-            self.print_tree(child, prefix + extension, i == len(children) - 1)
+            for i in range(len(children) - 1, -1, -1):
+                stack.append((children[i], prefix + extension, i == len(children) - 1))
     
     def __repr__(self):
-        return f'<FileOrganizationTree with {len(self.get_all_nodes())} nodes>'
+        return f'<FileOrganizationTree with {self._node_count} nodes>'
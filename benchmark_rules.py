@@ -0,0 +1,234 @@
+"""
+Benchmark del motor de reglas con árboles sintéticos
+
+Construye un FileOrganizationTree con la cantidad de nodos, reglas y tipos
+de regla indicados, clasifica un corpus de nombres generado y reporta en JSON
+el rendimiento, los percentiles de latencia por llamada y la memoria máxima.
+
+Ejemplo:
+    python benchmark_rules.py --nodes 2000 --rules 15000 --files 50000 \
+        --mix extension=50,keyword=40,glob=5,regex=5 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+from datetime import datetime
+
+# Agregar el directorio backend al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from tree_structure import FileOrganizationTree, TreeNode
+
+EXTENSIONS = ['pdf', 'docx', 'xlsx', 'pptx', 'txt', 'csv', 'png', 'jpg', 'gif', 'mp4',
+              'mov', 'mp3', 'wav', 'zip', 'rar', '7z', 'iso', 'exe', 'py', 'js']
+WORDS = ['factura', 'reporte', 'contrato', 'cliente', 'invoice', 'scan', 'foto', 'backup',
+         'nomina', 'presupuesto', 'acta', 'recibo', 'pedido', 'informe', 'borrador', 'final']
+DEFAULT_MIX = 'extension=50,keyword=40,glob=5,regex=5'
+
+
+def parse_mix(mix: str) -> dict:
+    """Convierte 'extension=50,keyword=40' en un diccionario de pesos"""
+    weights = {}
+    for item in mix.split(','):
+        rule_type, _, weight = item.partition('=')
+        weights[rule_type.strip()] = float(weight or 1)
+    return weights
+
+
+def random_keyword(rng: random.Random, vocabulary: int) -> str:
+    """Palabra clave sintética, p. ej. 'cliente0421'"""
+    return f"{rng.choice(WORDS)}{rng.randrange(vocabulary):04d}"
+
+
+def random_pattern(rule_type: str, rng: random.Random, vocabulary: int) -> str:
+    """Genera un patrón aleatorio para un tipo de regla"""
+    if rule_type == 'extension':
+        return '.' + rng.choice(EXTENSIONS)
+    if rule_type == 'keyword':
+        return random_keyword(rng, vocabulary)
+    if rule_type == 'glob':
+        return f"{random_keyword(rng, vocabulary)}_*.{rng.choice(EXTENSIONS)}"
+    if rule_type == 'regex':
+        return rf"(?i){random_keyword(rng, vocabulary)}_\d+"
+    if rule_type == 'size':
+        return f">{rng.randint(1, 500)}MB"
+    if rule_type == 'date':
+        return f">{rng.randint(1, 365)}d"
+    raise ValueError(f"Tipo de regla desconocido: {rule_type}")
+
+
+def build_tree(nodes: int, rules: int, mix: dict, seed: int, vocabulary: int) -> FileOrganizationTree:
+    """Construye un árbol sintético con nodos anidados y reglas aleatorias"""
+    rng = random.Random(seed)
+    tree = FileOrganizationTree('/bench')
+    all_nodes = [tree.root]
+
+    for i in range(nodes):
+        parent = rng.choice(all_nodes)
+        child = TreeNode(f'nodo{i}', f'{parent.path}/nodo{i}')
+        parent.add_child(child)
+        all_nodes.append(child)
+
+    rule_types = list(mix)
+    weights = [mix[rule_type] for rule_type in rule_types]
+    for _ in range(rules):
+        rule_type = rng.choices(rule_types, weights)[0]
+        node = all_nodes[rng.randint(1, len(all_nodes) - 1)] if len(all_nodes) > 1 else all_nodes[0]
+        node.add_rule(rule_type, random_pattern(rule_type, rng, vocabulary), priority=rng.randint(0, 10))
+
+    return tree
+
+
+def build_corpus(files: int, seed: int, vocabulary: int, hit_ratio: float) -> list:
+    """Genera nombres de archivo; hit_ratio es la fracción que contiene una palabra clave"""
+    rng = random.Random(seed + 1)
+    corpus = []
+    for i in range(files):
+        stem = random_keyword(rng, vocabulary) if rng.random() < hit_ratio else f"archivo{rng.randrange(10 ** 6)}"
+        corpus.append(f"{stem}_{i}.{rng.choice(EXTENSIONS + ['dat', 'bin'])}")
+    return corpus
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    if not sorted_values:
+        return 0.0
+    position = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[position]
+
+
+def bench_single(tree: FileOrganizationTree, corpus: list) -> dict:
+    """Mide find_destination_for_file llamada por llamada"""
+    latencies = []
+    matched = 0
+    clock = time.perf_counter
+    start = clock()
+    for filename in corpus:
+        extension = os.path.splitext(filename)[1]
+        t0 = clock()
+        node = tree.find_destination_for_file(filename, extension)
+        latencies.append(clock() - t0)
+        if node is not None:
+            matched += 1
+    elapsed = clock() - start
+    latencies.sort()
+    return {
+        'calls': len(corpus),
+        'matched': matched,
+        'seconds': elapsed,
+        'files_per_second': len(corpus) / elapsed if elapsed else None,
+        'latency_us': {
+            'p50': percentile(latencies, 0.50) * 1e6,
+            'p90': percentile(latencies, 0.90) * 1e6,
+            'p99': percentile(latencies, 0.99) * 1e6,
+            'max': latencies[-1] * 1e6 if latencies else 0.0
+        }
+    }
+
+
+def bench_batch(tree: FileOrganizationTree, corpus: list) -> dict:
+    """Mide classify_many sobre el corpus completo"""
+    start = time.perf_counter()
+    results = tree.classify_many(corpus)
+    elapsed = time.perf_counter() - start
+    return {
+        'calls': len(corpus),
+        'matched': sum(1 for node in results if node is not None),
+        'seconds': elapsed,
+        'files_per_second': len(corpus) / elapsed if elapsed else None
+    }
+
+
+def run(args) -> dict:
+    """Ejecuta el benchmark y devuelve los resultados"""
+    mix = parse_mix(args.mix)
+
+    # Memoria: construcción del árbol y compilación del índice
+    tracemalloc.start()
+    start = time.perf_counter()
+    tree = build_tree(args.nodes, args.rules, mix, args.seed, args.vocabulary)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    tree.get_rule_index()
+    index_seconds = time.perf_counter() - start
+    _, peak_build = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tree.classification_cache.max_size = args.cache_size
+    corpus = build_corpus(args.files, args.seed, args.vocabulary, args.hit_ratio)
+
+    results = {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'nodes': args.nodes,
+            'rules': args.rules,
+            'files': args.files,
+            'mix': mix,
+            'seed': args.seed,
+            'vocabulary': args.vocabulary,
+            'hit_ratio': args.hit_ratio,
+            'cache_size': args.cache_size,
+            'repeat': args.repeat
+        },
+        'build': {
+            'tree_seconds': build_seconds,
+            'index_seconds': index_seconds,
+            'total_nodes': tree.count_nodes(),
+            'active_rules': tree.count_active_rules(),
+            'peak_memory_bytes': peak_build
+        },
+        'single': [],
+        'batch': []
+    }
+
+    for _ in range(args.repeat):
+        tree.classification_cache.clear()
+        results['single'].append(bench_single(tree, corpus))
+        tree.classification_cache.clear()
+        results['batch'].append(bench_batch(tree, corpus))
+
+    # Memoria máxima durante una clasificación por lotes
+    tree.classification_cache.clear()
+    tracemalloc.start()
+    tree.classify_many(corpus)
+    _, peak_classify = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results['batch_peak_memory_bytes'] = peak_classify
+    results['classification_cache'] = tree.classification_cache.get_stats()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del motor de reglas de QuickSort')
+    parser.add_argument('--nodes', type=int, default=2000, help='Cantidad de nodos (sin contar la raíz)')
+    parser.add_argument('--rules', type=int, default=15000, help='Cantidad de reglas')
+    parser.add_argument('--files', type=int, default=20000, help='Cantidad de nombres a clasificar')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Pesos por tipo de regla (por defecto: {DEFAULT_MIX})')
+    parser.add_argument('--vocabulary', type=int, default=2000, help='Palabras clave distintas por palabra base')
+    parser.add_argument('--hit-ratio', type=float, default=0.5, help='Fracción de nombres que contienen una palabra clave')
+    parser.add_argument('--cache-size', type=int, default=0, help='Tamaño de la caché de clasificación (0 = desactivada)')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeticiones de cada medición')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Archivo donde guardar el JSON (por defecto: salida estándar)')
+    args = parser.parse_args()
+
+    results = run(args)
+    output = json.dumps(results, indent=2)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -105,7 +105,7 @@ function App() {
           const result = await organizeAllFiles();
 
           if (result.success) {
-            alert(`Archivos organizados: ${result.result.stats.files_moved} movidos, ${result.result.stats.files_failed} fallidos`);
+            alert(`Archivos organizados: ${result.job.summary.files_organized} movidos, ${result.job.summary.files_failed} fallidos`);
           } else {
             alert('Error organizando archivos: ' + result.message);
           }
@@ -142,7 +142,7 @@ const FileMonitor = () => {
       const response = await organizeAllFiles();
       
       if (response.success) {
-        setSuccess(`Archivos organizados: ${response.result.stats.files_moved} movidos, ${response.result.stats.files_failed} fallidos`);
+        setSuccess(`Archivos organizados: ${response.job.summary.files_organized} movidos, ${response.job.summary.files_failed} fallidos`);
         loadFiles(); // Recargar lista de archivos
       } else {
         setError(response.message || 'Error organizando archivos');
@@ -187,7 +187,7 @@ const FileMonitor = () => {
       const response = await organizeAllFiles();
 
       if (response.success) {
-        setSuccess(`Archivos organizados: ${response.result.stats.files_moved} movidos, ${response.result.stats.files_failed} fallidos`);
+        setSuccess(`Archivos organizados: ${response.job.summary.files_organized} movidos, ${response.job.summary.files_failed} fallidos`);
         loadFiles();
       } else {
         setError(response.message || 'Error organizando archivos');
@@ -158,6 +158,9 @@ const RuleManager = () => {
       keyword: 'Palabra clave',
       size: 'Tamaño',
       date: 'Fecha',
+      glob: 'Comodín (glob)',
+      regex: 'Expresión regular',
+      content_type: 'Tipo de contenido',
     };
     return labels[type] || type;
   };
@@ -297,6 +300,9 @@ const RuleManager = () => {
               <MenuItem value="keyword">Palabra clave</MenuItem>
               <MenuItem value="size">Tamaño</MenuItem>
               <MenuItem value="date">Fecha</MenuItem>
+              <MenuItem value="glob">Comodín (glob)</MenuItem>
+              <MenuItem value="regex">Expresión regular</MenuItem>
+              <MenuItem value="content_type">Tipo de contenido</MenuItem>
             </Select>
           </FormControl>
 
@@ -311,6 +317,16 @@ const RuleManager = () => {
                 ? 'Ingresa la extensión del archivo (con o sin punto). Ejemplos: .pdf, jpg, .docx, png'
                 : ruleData.rule_type === 'keyword'
                 ? 'Ingresa una palabra clave que debe aparecer en el nombre del archivo. Ejemplo: factura, reporte, contrato'
+                : ruleData.rule_type === 'size'
+                ? 'Ingresa un operador y un tamaño. Ejemplos: >10MB, <=500KB, >1GB'
+                : ruleData.rule_type === 'date'
+                ? 'Ingresa un operador y una antigüedad (h, d, w) o fecha. Ejemplos: >30d, <12h, >2024-01-01'
+                : ruleData.rule_type === 'glob'
+                ? 'Ingresa un patrón para el nombre completo (sin distinguir mayúsculas). Ejemplos: IMG_*.jpg, scan_??.pdf'
+                : ruleData.rule_type === 'regex'
+                ? 'Ingresa una expresión regular que se evalúa desde el inicio del nombre. Ejemplo: (?i)factura_\\d+'
+                : ruleData.rule_type === 'content_type'
+                ? 'Ingresa el tipo real del archivo según su contenido. Ejemplos: pdf, png, jpeg, zip, office, mp4'
                 : 'Ingresa el patrón para esta regla'
             }
           />
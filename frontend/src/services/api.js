@@ -90,9 +90,13 @@ export const getMonitorFiles = async () => {
   return response.data;
 };
 
+// Inicia la organización como trabajo en segundo plano y espera a que termine
 export const organizeAllFiles = async () => {
   const response = await api.post('/monitor/organize-all');
-  return response.data;
+  if (!response.data.success) {
+    return response.data;
+  }
+  return waitForOrganizeJob(response.data.job.job_id);
 };
 
 // ==================== ORGANIZACIÓN ====================
@@ -107,6 +111,59 @@ export const organizeFolder = async (folderPath, recursive = false) => {
     folder_path: folderPath,
     recursive: recursive,
   });
+  if (!response.data.success) {
+    return response.data;
+  }
+  return waitForOrganizeJob(response.data.job.job_id);
+};
+
+// ==================== TRABAJOS ====================
+
+export const getOrganizeJob = async (jobId) => {
+  const response = await api.get(`/organize/jobs/${jobId}`);
+  return response.data;
+};
+
+export const deleteOrganizeJob = async (jobId) => {
+  const response = await api.delete(`/organize/jobs/${jobId}`);
+  return response.data;
+};
+
+export const cancelOrganizeJob = async (jobId) => {
+  const response = await api.post(`/organize/jobs/${jobId}/cancel`);
+  return response.data;
+};
+
+export const getOrganizeJobResults = async (jobId, cursor = 0, limit = 100, status = null) => {
+  const params = { cursor, limit };
+  if (status) {
+    params.status = status;
+  }
+  const response = await api.get(`/organize/jobs/${jobId}/results`, { params });
+  return response.data;
+};
+
+export const waitForOrganizeJob = async (jobId, intervalMs = 1000) => {
+  for (;;) {
+    const data = await getOrganizeJob(jobId);
+    if (!data.active) {
+      return {
+        success: data.job.status === 'completed',
+        message: data.job.error || `Trabajo ${data.job.status}`,
+        job: data.job,
+      };
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+};
+
+export const getOrganizeStats = async () => {
+  const response = await api.get('/organize/stats');
+  return response.data;
+};
+
+export const resetOrganizeStats = async () => {
+  const response = await api.post('/organize/stats/reset');
   return response.data;
 };
 
@@ -3,11 +3,29 @@ Script de prueba para verificar que las reglas funcionan correctamente
 """
 import os
 import sys
+import errno
+import shutil
+import time
+import tempfile
+import threading
+from types import SimpleNamespace
 
 # Agregar el directorio backend al path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
 
 from tree_structure import FileOrganizationTree, TreeNode
+from file_organizer import FileOrganizer, OrganizeSummary
+from io_budget import IOBudget, TokenBucket
+from content_sniffer import ContentSniffer
+from file_scanner import scan_files
+from organize_job import OrganizeJob, load_job, list_jobs, find_unfinished_job
+from organize_plan import read_plan_header, iter_plan
+from flask import Flask
+from models import db, FileLog
+from log_writer import FileLogWriter
+from job_runner import JobRunner
+import file_organizer
+import file_transfer
 
 def test_extension_normalization():
     """Prueba la normalización de extensiones"""
@@ -191,6 +209,1457 @@ def test_priority_rules():
     return failed == 0
 
 
+def test_rule_index_updates():
+    """Prueba que el índice de reglas se actualiza al cambiar las reglas"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Actualización del Índice de Reglas")
+    print("=" * 60)
+    
+    tree = FileOrganizationTree('/test/path')
+    images_node = TreeNode('Imágenes', '/test/path/images')
+    tree.root.add_child(images_node)
+    
+    passed = 0
+    failed = 0
+    
+    checks = []
+    
+    print("\n1. Modificando reglas después de compilar el índice:")
+    
+    # Sin reglas no hay destino (esto compila el índice)
+    checks.append(('sin reglas', tree.find_destination_for_file('foto.png', '.png'), None))
+    
+    # Una regla agregada después de compilar debe verse en la siguiente búsqueda
+    images_node.add_rule('extension', 'png', priority=1)
+    checks.append(('regla agregada', tree.find_destination_for_file('foto.png', '.png'), 'Imágenes'))
+    
+    # Un nodo agregado con reglas propias también
+    backup_node = TreeNode('Respaldo', '/test/path/backup')
+    backup_node.add_rule('keyword', 'backup', priority=5)
+    tree.root.add_child(backup_node)
+    checks.append(('nodo agregado', tree.find_destination_for_file('backup.png', '.png'), 'Respaldo'))
+    
+    # Limpiar reglas elimina las coincidencias
+    backup_node.clear_rules()
+    checks.append(('reglas limpiadas', tree.find_destination_for_file('backup.png', '.png'), 'Imágenes'))
+    
+    print("\n2. Verificando coincidencias:")
+    
+    for description, result, expected_node in checks:
+        result_name = result.name if result else None
+        if result_name == expected_node:
+            print(f"   ✓ {description} -> {result_name or 'Sin regla'}")
+            passed += 1
+        else:
+            print(f"   ✗ {description} -> Esperado: {expected_node}, Obtenido: {result_name}")
+            failed += 1
+    
+    print("\n3. Resultados:")
+    print(f"   Pruebas pasadas: {passed}/{len(checks)}")
+    print(f"   Pruebas fallidas: {failed}/{len(checks)}")
+    
+    return failed == 0
+
+
+def test_classification_cache():
+    """Prueba que la caché de clasificación no devuelve destinos de reglas anteriores"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Caché de Clasificación")
+    print("=" * 60)
+    
+    tree = FileOrganizationTree('/test/path')
+    invoices_node = TreeNode('Facturas', '/test/path/invoices')
+    archive_node = TreeNode('Archivo', '/test/path/archive')
+    tree.root.add_child(invoices_node)
+    tree.root.add_child(archive_node)
+    invoices_node.add_rule('keyword', 'factura', priority=1)
+    
+    def classify():
+        result = tree.find_destination_for_file('factura_2024.pdf', '.pdf')
+        stats = tree.classification_cache.get_stats()
+        return (result.name if result else None, stats['hits'], stats['misses'])
+    
+    steps = [('primera consulta (fallo)', classify(), ('Facturas', 0, 1)),
+             ('misma consulta (acierto)', classify(), ('Facturas', 1, 1))]
+    
+    # Mover la regla a otro nodo: la caché no puede devolver el destino anterior
+    invoices_node.clear_rules()
+    archive_node.add_rule('keyword', 'factura', priority=1)
+    steps.append(('regla cambiada (fallo)', classify(), ('Archivo', 1, 2)))
+    steps.append(('tras el cambio (acierto)', classify(), ('Archivo', 2, 2)))
+    
+    # Una regla nueva con más prioridad también invalida
+    invoices_node.add_rule('extension', '.pdf', priority=10)
+    steps.append(('regla prioritaria agregada', classify(), ('Facturas', 2, 3)))
+    
+    # Sin reglas que coincidan, tampoco queda el destino guardado
+    invoices_node.clear_rules()
+    archive_node.clear_rules()
+    steps.append(('reglas eliminadas', classify(), (None, 2, 4)))
+    
+    failed = 0
+    for description, result, expected in steps:
+        ok = result == expected
+        print(f"   {'✓' if ok else '✗'} {description} -> {result[0] or 'Sin regla'} "
+              f"(aciertos {result[1]}, fallos {result[2]})" + ('' if ok else f" Esperado: {expected}"))
+        failed += 0 if ok else 1
+    
+    version = tree.classification_cache.get_stats()['version']
+    ok = version == tree.rules_version
+    print(f"   {'✓' if ok else '✗'} versión de la caché = versión de las reglas ({version})")
+    failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+def test_node_index_duplicates():
+    """Prueba el índice de nodos con rutas y nombres repetidos"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Índice de Nodos con Claves Repetidas")
+    print("=" * 60)
+    
+    tree = FileOrganizationTree('/test/organized')
+    first = TreeNode('Docs', '/test/organized/docs')
+    second = TreeNode('Docs', '/test/organized/docs')
+    # Se registra antes el segundo, pero en preorden va primero el primero
+    tree.root.add_child(TreeNode('A', '/test/organized/a'))
+    tree.root.children[0].add_child(second)
+    tree.root.add_child(first)
+    
+    failed = 0
+    checks = [
+        (tree.find_node_by_name('Docs') is second and tree.find_node_by_path('/test/organized/docs') is second,
+         "el primero en preorden gana"),
+    ]
+    tree.root.children[0].remove_child(second)
+    checks.append((tree.find_node_by_path('/test/organized/docs') is first and
+                   tree.find_node_by_name('Docs') is first, "al quitar un nodo, el otro con la misma ruta sigue indexado"))
+    for ok, message in checks:
+        print(f"   {'✓' if ok else '✗'} {message}")
+        failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+def test_deep_tree():
+    """Prueba los recorridos sin recursión en una cadena más profunda que el límite de recursión"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Árbol Profundo")
+    print("=" * 60)
+    
+    failed = 0
+    checks = []
+    
+    # Forma del diccionario: la misma que daba la versión recursiva
+    tree = FileOrganizationTree('/test/path')
+    documents_node = tree.root.add_child(TreeNode('Documentos', '/test/path/docs'))
+    documents_node.add_rule('extension', '.pdf', priority=2)
+    documents_node.add_rule('keyword', 'factura', priority=5)
+    documents_node.add_child(TreeNode('Facturas', '/test/path/docs/invoices'))
+    tree.root.add_child(TreeNode('Imágenes', '/test/path/images', node_type='folder'))
+    
+    def reference(node, depth=0):
+        return {
+            'name': node.name,
+            'path': node.path,
+            'node_type': node.node_type,
+            'depth': depth,
+            'children': [reference(child, depth + 1) for child in node.children],
+            'rules': [{'rule_type': rule.rule_type, 'pattern': rule.pattern,
+                       'priority': rule.priority, 'is_active': rule.is_active} for rule in node.rules]
+        }
+    
+    small = tree.to_dict()
+    checks.append((small['root'] == reference(tree.root) and list(small['root']) ==
+                   ['name', 'path', 'node_type', 'depth', 'children', 'rules'],
+                   "to_dict conserva la forma (claves, orden de hijos y reglas)"))
+    checks.append(((small['total_nodes'], small['has_rules']) == (4, True),
+                   f"to_dict del árbol: {small['total_nodes']} nodos, con reglas"))
+    
+    # Cadena de un solo hijo por nivel, más profunda que el límite de recursión
+    depth = max(5000, sys.getrecursionlimit() + 1000)
+    tree = FileOrganizationTree('/test/path')
+    node = tree.root
+    for level in range(depth):
+        node = node.add_child(TreeNode(f'n{level}', f'/test/path/n{level}'))
+    node.add_rule('extension', '.txt')
+    
+    visited = sum(1 for _ in tree.root.iter_subtree())
+    checks.append((visited == depth + 1 and tree.get_all_nodes()[-1] is node,
+                   f"iter_subtree recorre {visited} nodos"))
+    
+    data = tree.root.to_dict()
+    level = 0
+    while data['children']:
+        data = data['children'][0]
+        level += 1
+    checks.append((level == depth and data['depth'] == depth and data['name'] == node.name
+                   and data['rules'][0]['pattern'] == '.txt',
+                   f"to_dict llega a la profundidad {level}"))
+    
+    class LineCounter:
+        lines = 0
+        last = ''
+        
+        def write(self, text):
+            if text.strip():
+                self.lines += 1
+                self.last = text
+        
+        def flush(self):
+            pass
+    
+    counter = LineCounter()
+    stdout = sys.stdout
+    sys.stdout = counter
+    try:
+        tree.print_tree()
+    finally:
+        sys.stdout = stdout
+    checks.append((counter.lines == depth + 1 and counter.last == ' ' * 4 * depth + '└── ' + node.name,
+                   f"print_tree imprime {counter.lines} líneas"))
+    
+    for ok, message in checks:
+        print(f"   {'✓' if ok else '✗'} {message}")
+        failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+def test_classify_many():
+    """Prueba la clasificación por lotes"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Clasificación por Lotes")
+    print("=" * 60)
+    
+    tree = FileOrganizationTree('/test/path')
+    images_node = TreeNode('Imágenes', '/test/path/images')
+    invoices_node = TreeNode('Facturas', '/test/path/facturas')
+    tree.root.add_child(images_node)
+    tree.root.add_child(invoices_node)
+    
+    images_node.add_rule('extension', 'png', priority=1)
+    invoices_node.add_rule('keyword', 'factura', priority=5)
+    
+    filenames = ['foto.png', 'factura.png', 'notas.txt', 'FOTO.PNG', 'factura_enero.pdf']
+    
+    print("\n1. Comparando classify_many con find_destination_for_file:")
+    
+    results = tree.classify_many(filenames)
+    
+    passed = 0
+    failed = 0
+    
+    for filename, result in zip(filenames, results):
+        expected = tree.find_destination_for_file(filename, os.path.splitext(filename)[1])
+        if result is expected:
+            print(f"   ✓ {filename} -> {result.name if result else 'Sin regla'}")
+            passed += 1
+        else:
+            print(f"   ✗ {filename} -> Esperado: {expected}, Obtenido: {result}")
+            failed += 1
+    
+    print("\n2. Resultados:")
+    print(f"   Pruebas pasadas: {passed}/{len(filenames)}")
+    print(f"   Pruebas fallidas: {failed}/{len(filenames)}")
+    
+    return failed == 0
+
+
+def test_size_and_date_rules():
+    """Prueba las reglas por tamaño y fecha"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Reglas por Tamaño y Fecha")
+    print("=" * 60)
+    
+    tree = FileOrganizationTree('/test/path')
+    large_node = TreeNode('Grandes', '/test/path/grandes')
+    old_node = TreeNode('Antiguos', '/test/path/antiguos')
+    images_node = TreeNode('Imágenes', '/test/path/images')
+    tree.root.add_child(large_node)
+    tree.root.add_child(old_node)
+    tree.root.add_child(images_node)
+    
+    print("\n1. Agregando reglas de tamaño y fecha:")
+    large_node.add_rule('size', '>1KB', priority=5)
+    print("   ✓ Regla agregada: '>1KB' (prioridad 5)")
+    old_node.add_rule('date', '>30d', priority=3)
+    print("   ✓ Regla agregada: '>30d' (prioridad 3)")
+    images_node.add_rule('extension', 'png', priority=1)
+    print("   ✓ Regla agregada: 'png' (prioridad 1)")
+    
+    print("\n2. Probando coincidencias de archivos:")
+    
+    passed = 0
+    failed = 0
+    
+    with tempfile.TemporaryDirectory() as folder:
+        files = {
+            'grande.png': (2048, time.time()),
+            'viejo.png': (10, time.time() - 60 * 86400),
+            'nuevo.png': (10, time.time()),
+        }
+        for filename, (size, mtime) in files.items():
+            file_path = os.path.join(folder, filename)
+            with open(file_path, 'wb') as f:
+                f.write(b'0' * size)
+            os.utime(file_path, (mtime, mtime))
+        
+        test_cases = [
+            ('grande.png', 'Grandes'),
+            ('viejo.png', 'Antiguos'),
+            ('nuevo.png', 'Imágenes'),
+        ]
+        
+        for filename, expected_node in test_cases:
+            file_path = os.path.join(folder, filename)
+            result = tree.find_destination_for_file(filename, '.png', file_path)
+            batch_result = tree.classify_many([filename], [file_path])[0]
+            result_name = result.name if result else None
+            
+            if result_name == expected_node and batch_result is result:
+                print(f"   ✓ {filename} -> {result_name}")
+                passed += 1
+            else:
+                print(f"   ✗ {filename} -> Esperado: {expected_node}, Obtenido: {result_name}")
+                failed += 1
+    
+    print("\n3. Resultados:")
+    print(f"   Pruebas pasadas: {passed}/{len(test_cases)}")
+    print(f"   Pruebas fallidas: {failed}/{len(test_cases)}")
+    
+    return failed == 0
+
+
+def test_glob_and_regex_rules():
+    """Prueba las reglas glob y regex"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Reglas Glob y Regex")
+    print("=" * 60)
+    
+    tree = FileOrganizationTree('/test/path')
+    camera_node = TreeNode('Cámara', '/test/path/camara')
+    scans_node = TreeNode('Escaneos', '/test/path/escaneos')
+    images_node = TreeNode('Imágenes', '/test/path/images')
+    tree.root.add_child(camera_node)
+    tree.root.add_child(scans_node)
+    tree.root.add_child(images_node)
+    
+    print("\n1. Agregando reglas glob y regex:")
+    camera_node.add_rule('glob', 'IMG_*.jpg', priority=2)
+    print("   ✓ Regla agregada: glob 'IMG_*.jpg' (prioridad 2)")
+    scans_node.add_rule('regex', r'(?i)scan_\d+', priority=5)
+    print("   ✓ Regla agregada: regex '(?i)scan_\\d+' (prioridad 5)")
+    images_node.add_rule('extension', 'jpg', priority=1)
+    print("   ✓ Regla agregada: 'jpg' (prioridad 1)")
+    
+    print("\n2. Probando coincidencias de archivos:")
+    
+    test_cases = [
+        ('IMG_0001.jpg', '.jpg', 'Cámara'),
+        ('img_0002.JPG', '.JPG', 'Cámara'),
+        ('SCAN_12_IMG_1.jpg', '.jpg', 'Escaneos'),
+        ('foto_IMG_1.jpg', '.jpg', 'Imágenes'),
+        ('scan.pdf', '.pdf', None),
+    ]
+    
+    passed = 0
+    failed = 0
+    
+    for filename, extension, expected_node in test_cases:
+        result = tree.find_destination_for_file(filename, extension)
+        result_name = result.name if result else None
+        
+        if result_name == expected_node:
+            print(f"   ✓ {filename} -> {result_name or 'Sin regla'}")
+            passed += 1
+        else:
+            print(f"   ✗ {filename} -> Esperado: {expected_node}, Obtenido: {result_name}")
+            failed += 1
+    
+    print("\n3. Resultados:")
+    print(f"   Pruebas pasadas: {passed}/{len(test_cases)}")
+    print(f"   Pruebas fallidas: {failed}/{len(test_cases)}")
+    
+    return failed == 0
+
+
+def test_content_type_rules():
+    """Prueba las reglas por tipo de contenido"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Reglas por Tipo de Contenido")
+    print("=" * 60)
+    
+    tree = FileOrganizationTree('/test/path')
+    pdf_node = TreeNode('PDFs', '/test/path/pdfs')
+    images_node = TreeNode('Imágenes', '/test/path/images')
+    tree.root.add_child(pdf_node)
+    tree.root.add_child(images_node)
+    
+    print("\n1. Agregando reglas por tipo de contenido:")
+    pdf_node.add_rule('content_type', 'application/pdf', priority=1)
+    print("   ✓ Regla agregada: 'application/pdf' (prioridad 1)")
+    images_node.add_rule('content_type', 'png', priority=1)
+    print("   ✓ Regla agregada: 'png' (prioridad 1)")
+    
+    print("\n2. Probando archivos con extensión incorrecta o sin extensión:")
+    
+    passed = 0
+    failed = 0
+    
+    with tempfile.TemporaryDirectory() as folder:
+        files = {
+            'escaneo': (b'%PDF-1.7\n', 'PDFs'),
+            'captura.dat': (b'\x89PNG\r\n\x1a\n0000', 'Imágenes'),
+            'notas.pdf': (b'texto plano', None),
+        }
+        test_cases = []
+        for filename, (content, expected_node) in files.items():
+            file_path = os.path.join(folder, filename)
+            with open(file_path, 'wb') as f:
+                f.write(content)
+            test_cases.append((filename, file_path, expected_node))
+        
+        for filename, file_path, expected_node in test_cases:
+            extension = os.path.splitext(filename)[1]
+            result = tree.find_destination_for_file(filename, extension, file_path)
+            result_name = result.name if result else None
+            
+            if result_name == expected_node:
+                print(f"   ✓ {filename} -> {result_name or 'Sin regla'}")
+                passed += 1
+            else:
+                print(f"   ✗ {filename} -> Esperado: {expected_node}, Obtenido: {result_name}")
+                failed += 1
+        
+        # En Windows el stat de os.scandir trae st_ino y st_dev en 0
+        sniffer = ContentSniffer()
+        windows_stat = SimpleNamespace(st_dev=0, st_ino=0, st_mtime_ns=1, st_size=12)
+        pdf_path = os.path.join(folder, 'a.bin')
+        png_path = os.path.join(folder, 'b.bin')
+        with open(pdf_path, 'wb') as f:
+            f.write(b'%PDF-1.7\n000')
+        with open(png_path, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n0000')
+        detected = (sniffer.detect(pdf_path, windows_stat), sniffer.detect(png_path, windows_stat))
+        if detected == ('pdf', 'png'):
+            print("   ✓ stat sin inodo: cada archivo conserva su tipo")
+            passed += 1
+        else:
+            print(f"   ✗ stat sin inodo: {detected}")
+            failed += 1
+        test_cases.append(('stat sin inodo', None, None))
+    
+    print("\n3. Resultados:")
+    print(f"   Pruebas pasadas: {passed}/{len(test_cases)}")
+    print(f"   Pruebas fallidas: {failed}/{len(test_cases)}")
+    
+    return failed == 0
+
+
+def test_plan_rules_hash():
+    """Prueba que un plan guardado detecta reglas cambiadas aunque el proceso se reinicie"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Huella de Reglas en los Planes")
+    print("=" * 60)
+    
+    def build_tree(folder):
+        tree = FileOrganizationTree(os.path.join(folder, 'destino'))
+        docs_node = TreeNode('Documentos', os.path.join(folder, 'destino', 'docs'))
+        tree.root.add_child(docs_node)
+        docs_node.add_rule('extension', '.txt', priority=1)
+        docs_node.add_rule('keyword', 'factura', priority=2)
+        return tree
+    
+    with tempfile.TemporaryDirectory() as folder:
+        inbox = os.path.join(folder, 'entrada')
+        os.makedirs(inbox)
+        with open(os.path.join(inbox, 'nota.txt'), 'w') as f:
+            f.write('nota')
+        plan_path = os.path.join(folder, 'plan.jsonl')
+        FileOrganizer(build_tree(folder)).save_plan(inbox, plan_path)
+        header = read_plan_header(plan_path)
+        entry = next(iter_plan(plan_path))
+        
+        # Un árbol nuevo con las mismas reglas equivale a reiniciar el servidor
+        restarted = build_tree(folder)
+        same = header.get('rules_hash') == restarted.rules_hash()
+        restarted.find_node_by_name('Documentos').add_rule('extension', '.md', priority=1)
+        changed = header.get('rules_hash') != restarted.rules_hash()
+        applied = FileOrganizer(restarted).apply_plan(plan_path, action='copy')
+    
+    failed = 0
+    for ok, message in [(same, "mismas reglas tras reiniciar -> misma huella"),
+                        (changed, "regla nueva -> huella distinta"),
+                        ((entry.rule_type, entry.rule_pattern) == ('extension', '.txt'),
+                         f"la entrada guarda la regla ({entry.rule_type} {entry.rule_pattern})"),
+                        (applied['rules_changed'] is True and applied['summary']['files_organized'] == 1,
+                         "apply_plan avisa de las reglas cambiadas")]:
+        print(f"   {'✓' if ok else '✗'} {message}")
+        failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+def test_scan_files():
+    """Prueba el escaneo con os.scandir: datos del stat y enlaces a carpetas"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Escaneo de Archivos")
+    print("=" * 60)
+    
+    failed = 0
+    checks = []
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, 'origen')
+        outside = os.path.join(folder, 'fuera')
+        os.makedirs(os.path.join(source, 'sub'))
+        os.makedirs(outside)
+        for path, content in ((os.path.join(source, 'Informe.PDF'), 'x' * 1234),
+                              (os.path.join(source, 'sub', 'nota.txt'), 'nota'),
+                              (os.path.join(outside, 'ajeno.txt'), 'ajeno')):
+            with open(path, 'w') as f:
+                f.write(content)
+        os.utime(os.path.join(source, 'Informe.PDF'), (1_600_000_000, 1_600_000_000))
+        
+        try:
+            # Enlaces a una carpeta externa, a la propia carpeta (ciclo) y a un archivo
+            os.symlink(outside, os.path.join(source, 'enlace_carpeta'), target_is_directory=True)
+            os.symlink(source, os.path.join(source, 'sub', 'ciclo'), target_is_directory=True)
+            os.symlink(os.path.join(outside, 'ajeno.txt'), os.path.join(source, 'enlace.txt'))
+            symlinks = True
+        except (OSError, NotImplementedError):
+            symlinks = False
+        
+        flat = {record.name: record for record in scan_files(source)}
+        deep = sorted(os.path.relpath(record.path, source) for record in scan_files(source, recursive=True))
+        
+        record = flat['Informe.PDF']
+        st = os.stat(record.path)
+        checks.append(((record.path, record.extension, record.size, record.mtime) ==
+                       (os.path.join(source, 'Informe.PDF'), '.PDF', 1234, 1_600_000_000.0)
+                       and isinstance(record.stat, os.stat_result) and record.stat.st_size == st.st_size
+                       and record.stat.st_mtime_ns == st.st_mtime_ns,
+                       f"FileRecord con tamaño y mtime del stat reutilizado ({record.size} bytes)"))
+        
+        expected_flat = ['Informe.PDF', 'enlace.txt'] if symlinks else ['Informe.PDF']
+        expected_deep = ['Informe.PDF', 'enlace.txt', os.path.join('sub', 'nota.txt')] if symlinks else \
+            ['Informe.PDF', os.path.join('sub', 'nota.txt')]
+        checks.append((sorted(flat) == expected_flat, f"sin recursión: {sorted(flat)}"))
+        checks.append((deep == expected_deep, f"con recursión no se entra en enlaces a carpetas: {deep}"))
+        if symlinks:
+            checks.append((flat['enlace.txt'].size == len('ajeno'), "un enlace a archivo informa el tamaño del destino"))
+        else:
+            print("   - enlaces simbólicos no disponibles, se omiten sus casos")
+    
+    for ok, message in checks:
+        print(f"   {'✓' if ok else '✗'} {message}")
+        failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+def test_parallel_organize():
+    """Prueba la organización en paralelo con nombres duplicados"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Organización en Paralelo")
+    print("=" * 60)
+    
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, 'origen')
+        tree = FileOrganizationTree(os.path.join(folder, 'destino'))
+        docs_node = TreeNode('Documentos', os.path.join(folder, 'destino', 'docs'))
+        tree.root.add_child(docs_node)
+        docs_node.add_rule('extension', '.txt', priority=1)
+        
+        print("\n1. Creando 200 archivos 'informe.txt' en carpetas distintas:")
+        for i in range(200):
+            subfolder = os.path.join(source, f'sub{i}')
+            os.makedirs(subfolder)
+            with open(os.path.join(subfolder, 'informe.txt'), 'w') as f:
+                f.write(str(i))
+        print("   ✓ Archivos creados")
+        
+        print("\n2. Organizando con 8 hilos:")
+        organizer = FileOrganizer(tree, workers=8)
+        result = organizer.organize_folder(source, recursive=True)
+        
+        destinations = [r['destination_path'] for r in result['results']]
+        contents = set()
+        for filename in os.listdir(docs_node.path):
+            with open(os.path.join(docs_node.path, filename)) as f:
+                contents.add(f.read())
+        checks = [
+            ('todos los archivos movidos', result['stats']['files_moved'] == 200),
+            ('destinos únicos', len(set(destinations)) == 200 and None not in destinations),
+            ('ningún archivo sobrescrito', len(contents) == 200),
+        ]
+    
+    failed = 0
+    for description, ok in checks:
+        print(f"   {'✓' if ok else '✗'} {description}")
+        failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+def test_iter_matches_lists():
+    """Prueba que los generadores iter_* dan lo mismo que las funciones que devuelven listas"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Generadores frente a Listas")
+    print("=" * 60)
+    
+    def build(base):
+        source = os.path.join(base, 'origen')
+        os.makedirs(os.path.join(source, 'sub'))
+        for i in range(30):
+            name = ['informe{}.txt', 'foto{}.png', 'nota{}.zzz'][i % 3].format(i)
+            with open(os.path.join(source, 'sub' if i % 2 else '', name), 'w') as f:
+                f.write(name)
+        tree = FileOrganizationTree(os.path.join(base, 'destino'))
+        docs_node = tree.root.add_child(TreeNode('Documentos', os.path.join(base, 'destino', 'docs')))
+        docs_node.add_rule('extension', '.txt', priority=1)
+        images_node = tree.root.add_child(TreeNode('Imágenes', os.path.join(base, 'destino', 'img')))
+        images_node.add_rule('extension', '.png', priority=1)
+        # Un nombre ya ocupado en el destino
+        os.makedirs(docs_node.path)
+        with open(os.path.join(docs_node.path, 'informe0.txt'), 'w') as f:
+            f.write('otro')
+        return source, FileOrganizer(tree, workers=1)
+    
+    def normalized(items, base, keys):
+        return sorted(tuple(item[key].replace(base, '') if isinstance(item[key], str) else item[key]
+                            for key in keys) for item in items)
+    
+    result_keys = ('original_path', 'destination_path', 'success', 'action', 'error')
+    preview_keys = ('current_path', 'destination', 'destination_name', 'rule_type', 'rule_pattern', 'has_rule')
+    failed = 0
+    checks = []
+    with tempfile.TemporaryDirectory() as list_base, tempfile.TemporaryDirectory() as iter_base:
+        list_source, list_organizer = build(list_base)
+        iter_source, iter_organizer = build(iter_base)
+        
+        # Previsualización
+        preview = list_organizer.preview_organization(list_source, recursive=True)
+        preview_summary = OrganizeSummary()
+        previewed = list(iter_organizer.iter_preview(iter_source, True, preview_summary))
+        checks.append((normalized(preview['files'], list_base, preview_keys) ==
+                       normalized(previewed, iter_base, preview_keys),
+                       f"iter_preview entrega las mismas {len(previewed)} entradas que preview_organization"))
+        checks.append(((preview_summary.total_files, preview_summary.files_with_rules,
+                        preview_summary.files_without_rules) ==
+                       (preview['total_files'], preview['files_with_rules'], preview['files_without_rules']) == (30, 20, 10)
+                       and sum(preview_summary.by_destination.values()) == preview_summary.files_with_rules,
+                       f"resumen de la previsualización: {preview_summary.files_with_rules} con regla, "
+                       f"{preview_summary.files_without_rules} sin regla"))
+        
+        # Organización
+        organized = list_organizer.organize_folder(list_source, recursive=True)
+        summary = OrganizeSummary()
+        results = list(iter_organizer.iter_organize_folder(iter_source, True, summary=summary))
+        checks.append((normalized(organized['results'], list_base, result_keys) ==
+                       normalized(results, iter_base, result_keys),
+                       f"iter_organize_folder entrega los mismos {len(results)} resultados que organize_folder"))
+        
+        stats = organized['stats']
+        counts = (summary.total_files, summary.files_organized, summary.files_failed,
+                  summary.files_deduplicated, summary.files_skipped)
+        checks.append((counts == (stats['files_processed'], stats['files_moved'], stats['files_failed'],
+                                  stats['files_deduplicated'], stats['files_skipped']) == (30, 20, 10, 0, 0),
+                       f"resumen igual a las estadísticas: {counts}"))
+        checks.append((summary.total_files == sum(counts[1:])
+                       and sum(summary.by_destination.values()) == summary.files_organized + summary.files_deduplicated
+                       and summary.by_destination == {os.path.join(iter_base, 'destino', 'docs'): 10,
+                                                      os.path.join(iter_base, 'destino', 'img'): 10},
+                       f"los contadores suman el total y por destino {sorted(summary.by_destination.values())}"))
+        renamed = [os.path.basename(r['destination_path']) for r in organized['results'] + results
+                   if r['filename'] == 'informe0.txt']
+        checks.append((renamed == ['informe0_1.txt'] * 2, "el nombre ocupado se renombra igual en ambos"))
+    
+    for ok, message in checks:
+        print(f"   {'✓' if ok else '✗'} {message}")
+        failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+def test_organizer_stats():
+    """Prueba que las latencias por archivo y por bloque van a histogramas distintos"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Estadísticas del Organizador")
+    print("=" * 60)
+    
+    with tempfile.TemporaryDirectory() as folder:
+        tree = FileOrganizationTree(os.path.join(folder, 'destino'))
+        docs_node = TreeNode('Documentos', os.path.join(folder, 'destino', 'docs'))
+        tree.root.add_child(docs_node)
+        docs_node.add_rule('extension', '.txt', priority=1)
+        organizer = FileOrganizer(tree)
+        paths = []
+        for i in range(5):
+            path = os.path.join(folder, f'nota_{i}.txt')
+            with open(path, 'w') as f:
+                f.write(str(i))
+            paths.append(path)
+        
+        organizer.organize_files(paths[:4])
+        organizer.organize_file(paths[4])
+        latency = organizer.get_stats()['latency']
+        organizer.reset_stats()
+        after_reset = organizer.get_stats()
+    
+    failed = 0
+    checks = [
+        (latency['classify_batch']['count'] == 1, f"un bloque -> {latency['classify_batch']['count']} muestra"),
+        (latency['classify']['count'] == 1, f"un archivo suelto -> {latency['classify']['count']} muestra"),
+        (latency['move']['count'] == 5, f"movimientos medidos: {latency['move']['count']}"),
+        (after_reset['files_processed'] == 0 and after_reset['latency']['move']['count'] == 0,
+         "reset_stats vacía contadores y latencias"),
+    ]
+    for ok, message in checks:
+        print(f"   {'✓' if ok else '✗'} {message}")
+        failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+def test_duplicate_names():
+    """Prueba la resolución de nombres duplicados con cambios hechos por fuera"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Nombres Duplicados con Cambios Externos")
+    print("=" * 60)
+    
+    with tempfile.TemporaryDirectory() as folder:
+        tree = FileOrganizationTree(os.path.join(folder, 'destino'))
+        docs_node = TreeNode('PDFs', os.path.join(folder, 'destino', 'pdfs'))
+        tree.root.add_child(docs_node)
+        docs_node.add_rule('extension', '.pdf', priority=1)
+        organizer = FileOrganizer(tree)
+        
+        def organize(content):
+            source = os.path.join(folder, 'scan.pdf')
+            with open(source, 'w') as f:
+                f.write(content)
+            return os.path.basename(organizer.organize_file(source)['destination_path'] or '')
+        
+        first = organize('1')
+        # Se borra por fuera: el nombre vuelve a quedar libre
+        os.unlink(os.path.join(docs_node.path, 'scan.pdf'))
+        reused = organize('2')
+        # Se crea scan_1.pdf por fuera después de leer el directorio: no se sobrescribe
+        with open(os.path.join(docs_node.path, 'scan_1.pdf'), 'w') as f:
+            f.write('externo')
+        skipped = organize('3')
+        with open(os.path.join(docs_node.path, 'scan_1.pdf')) as f:
+            external_kept = f.read() == 'externo'
+    
+    failed = 0
+    checks = [
+        (first == 'scan.pdf' and reused == 'scan.pdf', f"nombre borrado reutilizado ({first}, {reused})"),
+        (skipped == 'scan_2.pdf' and external_kept, f"archivo externo respetado ({skipped})"),
+    ]
+    for ok, message in checks:
+        print(f"   {'✓' if ok else '✗'} {message}")
+        failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+def test_known_directories():
+    """Prueba que la caché de directorios creados se recupera si el destino se borra por fuera"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Caché de Directorios Destino")
+    print("=" * 60)
+    
+    makedirs = os.makedirs
+    created = []
+    
+    def counting_makedirs(name, *args, **kwargs):
+        created.append(os.path.normpath(name))
+        return makedirs(name, *args, **kwargs)
+    
+    with tempfile.TemporaryDirectory() as folder:
+        tree = FileOrganizationTree(os.path.join(folder, 'destino'))
+        docs_node = TreeNode('Documentos', os.path.join(folder, 'destino', 'docs'))
+        tree.root.add_child(docs_node)
+        docs_node.add_rule('extension', '.txt', priority=1)
+        organizer = FileOrganizer(tree)
+        destination_dir = os.path.normpath(docs_node.path)
+        
+        def organize(name, content):
+            source = os.path.join(folder, name)
+            with open(source, 'w') as f:
+                f.write(content)
+            result = organizer.organize_file(source)
+            return result['success'], os.path.basename(result['destination_path'] or '')
+        
+        os.makedirs = counting_makedirs
+        try:
+            first = organize('informe.txt', '1')
+            first_calls = created.count(destination_dir)
+            second = organize('otro.txt', '2')
+            memo_calls = created.count(destination_dir) - first_calls
+            
+            # Se borra la carpeta destino por fuera: el memo dice que existe
+            shutil.rmtree(docs_node.path)
+            remembered = destination_dir in file_transfer.known_directories._known
+            retried = organize('informe.txt', '3')
+            retry_calls = created.count(destination_dir) - first_calls
+        finally:
+            os.makedirs = makedirs
+        
+        with open(os.path.join(docs_node.path, 'informe.txt')) as f:
+            retried_content = f.read()
+        still_known = destination_dir in file_transfer.known_directories._known
+    
+    failed = 0
+    checks = [
+        (first == (True, 'informe.txt') and first_calls == 1, f"primer archivo crea el directorio ({first_calls} makedirs)"),
+        (second == (True, 'otro.txt') and memo_calls == 0, f"el segundo no vuelve a llamar a makedirs ({memo_calls})"),
+        (remembered, "tras borrar la carpeta el memo aún la recuerda"),
+        (retried == (True, 'informe.txt') and retried_content == '3' and retry_calls == 1,
+         f"el reintento la recrea y reutiliza el nombre ({retried[1]})"),
+        (still_known, "la carpeta recreada vuelve al memo"),
+    ]
+    for ok, message in checks:
+        print(f"   {'✓' if ok else '✗'} {message}")
+        failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+def test_dedupe_policies():
+    """Prueba la deduplicación por contenido en el destino"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Deduplicación por Contenido")
+    print("=" * 60)
+    
+    failed = 0
+    for policy, expected_action, source_kept in [('skip', 'duplicate_skipped', True),
+                                                 ('delete', 'duplicate_deleted', False)]:
+        with tempfile.TemporaryDirectory() as folder:
+            tree = FileOrganizationTree(os.path.join(folder, 'destino'))
+            docs_node = TreeNode('PDFs', os.path.join(folder, 'destino', 'pdfs'))
+            tree.root.add_child(docs_node)
+            docs_node.add_rule('extension', '.pdf', priority=1)
+            os.makedirs(docs_node.path)
+            with open(os.path.join(docs_node.path, 'scan.pdf'), 'wb') as f:
+                f.write(b'%PDF-1.7 igual')
+            
+            organizer = FileOrganizer(tree, dedupe=policy)
+            source = os.path.join(folder, 'scan.pdf')
+            with open(source, 'wb') as f:
+                f.write(b'%PDF-1.7 igual')
+            identical = organizer.organize_file(source)
+            kept = os.path.exists(source)
+            
+            with open(source, 'wb') as f:
+                f.write(b'%PDF-1.7 distinto')
+            different = organizer.organize_file(source)
+            
+            ok = (identical['action'] == expected_action and
+                  kept == source_kept and
+                  os.path.basename(different['destination_path']) == 'scan_1.pdf')
+            print(f"   {'✓' if ok else '✗'} {policy}: idéntico -> {identical['action']}, "
+                  f"distinto -> {os.path.basename(different['destination_path'] or '')}")
+            failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+
+def test_job_recovery_and_undo():
+    """Prueba que la recuperación y el deshacer de un trabajo no borran archivos ajenos"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Recuperación y Deshacer de Trabajos")
+    print("=" * 60)
+    
+    def write(path, content):
+        with open(path, 'wb') as f:
+            f.write(content)
+    
+    def read(path):
+        with open(path, 'rb') as f:
+            return f.read()
+    
+    with tempfile.TemporaryDirectory() as folder:
+        tree = FileOrganizationTree(os.path.join(folder, 'destino'))
+        docs_node = TreeNode('Documentos', os.path.join(folder, 'destino', 'docs'))
+        tree.root.add_child(docs_node)
+        docs_node.add_rule('extension', '.txt', priority=1)
+        os.makedirs(docs_node.path)
+        inbox = os.path.join(folder, 'entrada')
+        os.makedirs(inbox)
+        jobs_dir = os.path.join(folder, 'jobs')
+        organizer = FileOrganizer(tree, dedupe='delete')
+        
+        # Copia interrumpida: el destino lo ocupó otro proceso y quedó el .partial propio
+        job = OrganizeJob.create(jobs_dir, inbox, action='copy')
+        source = os.path.join(inbox, 'informe.txt')
+        destination = os.path.join(docs_node.path, 'informe.txt')
+        write(source, b'nuestro')
+        write(destination, b'ajeno')
+        write(destination + '.partial', b'nues')
+        journal = job.open_journal()
+        journal.intent(source, destination, 'copy', destination + '.partial')
+        journal.close()
+        recovered = job.recover()
+        foreign_kept = (read(destination) == b'ajeno' and not os.path.exists(destination + '.partial') and
+                        recovered['rolled_back'] == 1)
+        os.unlink(destination)
+        os.unlink(source)
+        
+        # Un movimiento normal y un duplicado borrado se deshacen los dos
+        write(os.path.join(docs_node.path, 'igual.txt'), b'mismo contenido')
+        write(os.path.join(inbox, 'igual.txt'), b'mismo contenido')
+        write(os.path.join(inbox, 'nota.txt'), b'nota')
+        job = OrganizeJob.create(jobs_dir, inbox)
+        organizer.run_job(job)
+        deduplicated = not os.path.exists(os.path.join(inbox, 'igual.txt'))
+        undo = organizer.undo_job(job)
+        restored = (undo['undone'] == 2 and job.status == 'undone' and
+                    read(os.path.join(inbox, 'igual.txt')) == b'mismo contenido' and
+                    read(os.path.join(inbox, 'nota.txt')) == b'nota')
+        
+        # Una copia modificada después del trabajo no se borra al deshacer
+        job = OrganizeJob.create(jobs_dir, inbox, action='copy')
+        organizer.run_job(job)
+        copied = os.path.join(docs_node.path, 'nota.txt')
+        write(copied, b'nota editada')
+        undo = organizer.undo_job(job)
+        partial = (job.status == 'partially_undone' and undo['skipped'] == 1 and
+                   read(copied) == b'nota editada')
+    
+    failed = 0
+    checks = [
+        (foreign_kept, "la recuperación solo borra el .partial propio"),
+        (deduplicated and restored, "deshacer restaura movimientos y duplicados borrados"),
+        (partial, "una copia modificada se conserva y el trabajo queda partially_undone"),
+    ]
+    for ok, message in checks:
+        print(f"   {'✓' if ok else '✗'} {message}")
+        failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+def wait_until(condition, timeout=5.0):
+    """Espera hasta que se cumpla la condición (False si vence el plazo)"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class GatedOrganizer:
+    """Organizador de prueba cuyos trabajos siguen en ejecución hasta que se cancelan"""
+    
+    def __init__(self):
+        self.running = 0
+        self._lock = threading.Lock()
+    
+    def is_job_active(self, job_id):
+        return False
+    
+    def run_job(self, job, workers=None, cancel=None):
+        job.save(status='running')
+        with self._lock:
+            self.running += 1
+        cancel.wait()
+        with self._lock:
+            self.running -= 1
+        job.save(status='cancelled')
+
+
+def test_job_runner():
+    """Prueba el límite de trabajos simultáneos, la cola y el cierre del JobRunner"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Cola de Trabajos")
+    print("=" * 60)
+    
+    with tempfile.TemporaryDirectory() as folder:
+        organizer = GatedOrganizer()
+        runner = JobRunner(organizer, max_concurrent=2)
+        jobs = [runner.submit(OrganizeJob.create(folder, folder)) for _ in range(3)]
+        started = wait_until(lambda: organizer.running == 2)
+        third_queued = load_job(folder, jobs[2].job_id).status == 'queued'
+        stats = runner.get_stats()
+        
+        # El usuario cancela uno en ejecución: queda 'cancelled' y entra el de la cola
+        runner.cancel(jobs[0].job_id)
+        promoted = wait_until(lambda: not runner.is_active(jobs[0].job_id) and organizer.running == 2)
+        
+        # El cierre deja 'interrupted' solo los que detuvo él
+        runner.shutdown(wait=True)
+        statuses = [load_job(folder, job.job_id).status for job in jobs]
+    
+    failed = 0
+    checks = [
+        (started and third_queued and stats['running'] == 2 and stats['queued'] == 1,
+         f"2 en ejecución y 1 en cola ({stats})"),
+        (promoted, "al cancelar uno en ejecución arranca el de la cola"),
+        (statuses == ['cancelled', 'interrupted', 'interrupted'], f"estados tras el cierre: {statuses}"),
+    ]
+    for ok, message in checks:
+        print(f"   {'✓' if ok else '✗'} {message}")
+        failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+def test_job_retention():
+    """Prueba la retención de trabajos terminados y la detección de trabajos a medias"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Retención de Trabajos")
+    print("=" * 60)
+    
+    with tempfile.TemporaryDirectory() as folder:
+        inbox = os.path.join(folder, 'entrada')
+        finished = []
+        for i in range(4):
+            job = OrganizeJob.create(folder, inbox)
+            job.save(status='completed', created_at=f'2024-01-0{i + 1}T00:00:00')
+            finished.append(job.job_id)
+        interrupted = OrganizeJob.create(folder, inbox)
+        interrupted.save(status='interrupted', created_at='2023-01-01T00:00:00')
+        pending = find_unfinished_job(folder, inbox + os.sep)
+        
+        # Al encolar uno nuevo se conservan los 2 terminados más recientes y el interrumpido
+        runner = JobRunner(GatedOrganizer(), max_concurrent=1, max_finished_jobs=2)
+        new_job = runner.submit(OrganizeJob.create(folder, os.path.join(folder, 'otra')))
+        remaining = {job.job_id for job in list_jobs(folder)}
+        runner.cancel(new_job.job_id)
+        runner.shutdown(wait=True)
+    
+    failed = 0
+    checks = [
+        (pending is not None and pending.job_id == interrupted.job_id, "trabajo a medias encontrado por carpeta"),
+        (remaining == {finished[2], finished[3], interrupted.job_id, new_job.job_id},
+         f"retención: {len(remaining)} trabajos conservados"),
+    ]
+    for ok, message in checks:
+        print(f"   {'✓' if ok else '✗'} {message}")
+        failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+def test_job_cancel_and_resume():
+    """Prueba cancelar un trabajo en ejecución, reanudarlo y paginar sus resultados"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Cancelar y Reanudar Trabajos")
+    print("=" * 60)
+    
+    batch_size = file_organizer.CLASSIFY_BATCH_SIZE
+    file_organizer.CLASSIFY_BATCH_SIZE = 20
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            tree = FileOrganizationTree(os.path.join(folder, 'destino'))
+            docs_node = TreeNode('Documentos', os.path.join(folder, 'destino', 'docs'))
+            tree.root.add_child(docs_node)
+            docs_node.add_rule('extension', '.txt', priority=1)
+            inbox = os.path.join(folder, 'entrada')
+            os.makedirs(inbox)
+            for i in range(100):
+                with open(os.path.join(inbox, f'nota_{i}.txt'), 'w') as f:
+                    f.write(str(i))
+            jobs_dir = os.path.join(folder, 'jobs')
+            
+            # 20 operaciones por segundo: el trabajo dura lo suficiente para cancelarlo a medias
+            organizer = FileOrganizer(tree, workers=2, io_budget=IOBudget(ops_per_second=20))
+            runner = JobRunner(organizer, max_concurrent=1)
+            job = runner.submit(OrganizeJob.create(jobs_dir, inbox))
+            wait_until(lambda: (load_job(jobs_dir, job.job_id).meta.get('position') or 0) >= 20)
+            runner.cancel(job.job_id)
+            wait_until(lambda: not runner.is_active(job.job_id))
+            cancelled = load_job(jobs_dir, job.job_id)
+            cancelled_at = cancelled.meta['position']
+            stopped_midway = cancelled.status == 'cancelled' and 0 < cancelled_at < 100
+            
+            # Cinco archivos pendientes desaparecen antes de reanudar: fallan
+            missing = sorted(os.listdir(inbox))[:5]
+            for name in missing:
+                os.unlink(os.path.join(inbox, name))
+            organizer.io_budget.configure(ops_per_second=0)
+            
+            # Resultados escritos después del punto de control por un proceso que murió
+            with open(cancelled.results_path, 'ab') as f:
+                f.write(b'{"success":true,"original_path":"huerfano"}\n{"succ')
+            
+            runner.submit(cancelled)
+            wait_until(lambda: not runner.is_active(job.job_id), timeout=10)
+            runner.shutdown()
+            finished = load_job(jobs_dir, job.job_id)
+            
+            # Recorrer todas las páginas con el cursor
+            results = []
+            cursor = 0
+            pages = 0
+            while cursor is not None:
+                page = finished.read_results(cursor, 30)
+                results.extend(page['results'])
+                cursor = page['next_cursor']
+                pages += 1
+            failed_page = finished.read_results(0, 30, 'failed')
+            sources = [result['original_path'] for result in results]
+    finally:
+        file_organizer.CLASSIFY_BATCH_SIZE = batch_size
+    
+    failed = 0
+    checks = [
+        (stopped_midway, f"cancelado a medias en la posición {cancelled_at}"),
+        (finished.status == 'completed', f"reanudado hasta el final ({finished.status})"),
+        (len(results) == 100 and len(set(sources)) == 100 and 'huerfano' not in sources,
+         f"{len(results)} resultados sin duplicados ni restos del punto de control"),
+        (pages == 4, f"{pages} páginas de 30"),
+        (len(failed_page['results']) == 5 and failed_page['next_cursor'] is None and
+         not any(result['success'] for result in failed_page['results']),
+         f"filtro 'failed': {len(failed_page['results'])} resultados"),
+    ]
+    for ok, message in checks:
+        print(f"   {'✓' if ok else '✗'} {message}")
+        failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+def test_log_writer():
+    """Prueba el escritor de logs por lotes: lotes, flush propio, timeout y parada"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Escritor de Logs por Lotes")
+    print("=" * 60)
+    
+    def record(i):
+        return {'filename': f'f{i}.txt', 'original_path': f'/origen/f{i}.txt', 'destination_path': '/destino',
+                'action': 'move', 'status': 'success', 'error_message': None}
+    
+    with tempfile.TemporaryDirectory() as folder:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(folder, 'logs.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+        
+        def stored():
+            with app.app_context():
+                count = FileLog.query.count()
+                db.session.remove()
+                return count
+        
+        # Intervalo largo: solo el tamaño del lote o una marca cierran un lote
+        writer = FileLogWriter(app, batch_size=10, flush_interval_ms=10000)
+        writer.start()
+        for i in range(25):
+            writer.enqueue(record(i))
+        flushed = writer.flush(5)
+        batches = (flushed, writer.batches, writer.records_written, stored())
+        
+        # Registros encolados después del flush no alargan la espera
+        for i in range(5):
+            writer.enqueue(record(i))
+        more = threading.Thread(target=lambda: [writer.enqueue(record(i)) for i in range(2000)])
+        more.start()
+        start = time.perf_counter()
+        own_flushed = writer.flush(5)
+        own_elapsed = time.perf_counter() - start
+        own_stored = stored()
+        more.join()
+        
+        # Base de datos bloqueada: flush vence el plazo y devuelve False
+        release = threading.Event()
+        original_write = writer._write
+        
+        def stalled_write(batch):
+            release.wait(5)
+            original_write(batch)
+        
+        writer._write = stalled_write
+        writer.enqueue(record(0))
+        start = time.perf_counter()
+        stalled = writer.flush(0.2)
+        stalled_elapsed = time.perf_counter() - start
+        release.set()
+        writer._write = original_write
+        
+        # stop escribe todo lo pendiente antes de terminar
+        for i in range(37):
+            writer.enqueue(record(i))
+        writer.stop()
+        total = 25 + 5 + 2000 + 1 + 37
+        drained = (writer.is_running, writer.queue_depth, writer.records_written, stored())
+    
+    failed = 0
+    checks = [
+        (batches == (True, 3, 25, 25), f"25 registros en lotes de 10 -> {batches[1]} lotes, {batches[3]} guardados"),
+        (own_flushed and own_stored >= 30 and own_elapsed < 2, f"flush espera solo lo propio ({own_elapsed:.3f} s)"),
+        (not stalled and 0.15 <= stalled_elapsed < 1, f"flush con la BD bloqueada vence ({stalled_elapsed:.2f} s)"),
+        (drained == (False, 0, total, total), f"stop vacía la cola ({drained[3]}/{total} guardados)"),
+    ]
+    for ok, message in checks:
+        print(f"   {'✓' if ok else '✗'} {message}")
+        failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+def test_file_transfer():
+    """Prueba mover y copiar sin reemplazar destinos, con las vías de copia de respaldo"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Transferencia de Archivos")
+    print("=" * 60)
+    
+    content = os.urandom(3 * file_transfer.FALLBACK_BUFFER_SIZE + 123)
+    saved = {name: getattr(os, name, None) for name in ('copy_file_range', 'sendfile', 'link')}
+    saved_same_device = file_transfer.same_device
+    calls = []
+    
+    def unsupported(name):
+        def fail(*args):
+            calls.append(name)
+            raise OSError(errno.ENOSYS, os.strerror(errno.ENOSYS))
+        return fail
+    
+    def counted(name):
+        def call(*args, **kwargs):
+            calls.append(name)
+            return saved[name](*args, **kwargs)
+        return call
+    
+    def read(path):
+        with open(path, 'rb') as f:
+            return f.read()
+    
+    def write(path, data):
+        with open(path, 'wb') as f:
+            f.write(data)
+    
+    failed = 0
+    checks = []
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, 'origen.bin')
+        write(source, content)
+        os.utime(source, ns=(1_000_000_000_000_000_000, 1_000_000_000_000_000_000))
+        
+        def leftovers():
+            return sorted(name for name in os.listdir(folder) if name.endswith(file_transfer.PARTIAL_SUFFIX))
+        
+        try:
+            # Vías de copia: copy_file_range -> sendfile -> bloques
+            paths = []
+            for label, patches in (('copy_file_range', {}),
+                                   ('sendfile', {'copy_file_range': unsupported('copy_file_range')}),
+                                   ('bloques', {'copy_file_range': unsupported('copy_file_range'),
+                                                'sendfile': unsupported('sendfile')})):
+                del calls[:]
+                for name in ('copy_file_range', 'sendfile'):
+                    if saved[name]:
+                        setattr(os, name, patches.get(name, counted(name)))
+                destination = os.path.join(folder, f'copia_{label}.bin')
+                file_transfer.copy_file(source, destination)
+                for name in ('copy_file_range', 'sendfile'):
+                    if saved[name]:
+                        setattr(os, name, saved[name])
+                used = list(dict.fromkeys(calls))
+                paths.append((label, read(destination) == content, used,
+                              os.stat(destination).st_mtime_ns == os.stat(source).st_mtime_ns))
+            checks.append((paths[0][1] and paths[0][2][:1] == ['copy_file_range'] and paths[0][3],
+                           f"copia con copy_file_range y metadatos conservados ({paths[0][2]})"))
+            checks.append((paths[1][1] and paths[1][2] == ['copy_file_range', 'sendfile'],
+                           f"sin copy_file_range se usa sendfile ({paths[1][2]})"))
+            checks.append((paths[2][1] and paths[2][2] == ['copy_file_range', 'sendfile'],
+                           f"sin ninguna se copia por bloques ({paths[2][2]})"))
+            
+            # Error real a mitad de copia: no queda el .partial
+            def broken(*args):
+                raise OSError(errno.EIO, os.strerror(errno.EIO))
+            
+            os.copy_file_range = broken
+            broken_destination = os.path.join(folder, 'rota.bin')
+            raised = []
+            try:
+                file_transfer.copy_file(source, broken_destination)
+            except OSError as e:
+                raised.append(e.errno)
+            os.copy_file_range = saved['copy_file_range']
+            
+            def abort(count):
+                raise RuntimeError('cancelado')
+            
+            try:
+                file_transfer.copy_file(source, broken_destination, throttle=abort)
+            except RuntimeError:
+                raised.append('cancelado')
+            checks.append((raised == [errno.EIO, 'cancelado'] and not os.path.exists(broken_destination) and not leftovers(),
+                           "un fallo a mitad de copia borra el .partial"))
+            
+            # Un .partial ajeno no se sobrescribe ni se borra
+            foreign = os.path.join(folder, 'ajena.bin')
+            write(file_transfer.partial_path(foreign), b'ajeno')
+            try:
+                file_transfer.copy_file(source, foreign)
+                kept = False
+            except FileExistsError:
+                kept = read(file_transfer.partial_path(foreign)) == b'ajeno'
+            os.unlink(file_transfer.partial_path(foreign))
+            checks.append((kept, "un .partial que no es propio se respeta"))
+            
+            # place_file nunca reemplaza: con enlaces duros y sin ellos
+            occupied = os.path.join(folder, 'ocupado.bin')
+            write(occupied, b'otro')
+            moved = os.path.join(folder, 'mover.bin')
+            write(moved, b'nuevo')
+            
+            def no_hardlinks(*args, **kwargs):
+                raise OSError(errno.EPERM, os.strerror(errno.EPERM))
+            
+            results = []
+            for link in (saved['link'], no_hardlinks):
+                os.link = link
+                try:
+                    file_transfer.place_file(moved, occupied)
+                    results.append(False)
+                except FileExistsError:
+                    results.append(read(occupied) == b'otro' and read(moved) == b'nuevo')
+                os.link = saved['link']
+            file_transfer.place_file(moved, os.path.join(folder, 'movido.bin'))
+            placed = not os.path.exists(moved) and read(os.path.join(folder, 'movido.bin')) == b'nuevo'
+            checks.append((results == [True, True] and placed,
+                           "place_file no reemplaza un destino existente (enlace + borrado y sin enlaces)"))
+            
+            # Entre dispositivos (EXDEV): copia y borrado del origen
+            cross_source = os.path.join(folder, 'cruzado.bin')
+            write(cross_source, content)
+            
+            def exdev_link(src, dst, **kwargs):
+                if src == cross_source:
+                    raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+                return saved['link'](src, dst, **kwargs)
+            
+            os.link = exdev_link
+            cross_destination = os.path.join(folder, 'cruzado_destino.bin')
+            file_transfer.move_file(cross_source, cross_destination)
+            os.link = saved['link']
+            file_transfer.same_device = lambda *args: False
+            write(cross_source, content)
+            other_destination = os.path.join(folder, 'cruzado_otro.bin')
+            file_transfer.move_file(cross_source, other_destination)
+            file_transfer.same_device = saved_same_device
+            checks.append((not os.path.exists(cross_source) and read(cross_destination) == content
+                           and read(other_destination) == content and not leftovers(),
+                           "mover con EXDEV copia y borra el origen"))
+            
+            # Un destino que aparece a mitad de la transferencia no se pisa ni se borra
+            late = os.path.join(folder, 'tardio.bin')
+            
+            def appear(count):
+                if not os.path.exists(late):
+                    write(late, b'llego antes')
+            
+            outcomes = []
+            for transfer in (file_transfer.copy_file, file_transfer.move_file):
+                file_transfer.same_device = lambda *args: False
+                try:
+                    transfer(source, late, throttle=appear)
+                    outcomes.append(False)
+                except FileExistsError:
+                    outcomes.append(read(late) == b'llego antes' and read(source) == content)
+                file_transfer.same_device = saved_same_device
+                os.unlink(late)
+            checks.append((outcomes == [True, True] and not leftovers(),
+                           "un destino que aparece durante la copia se conserva (y el origen también)"))
+        finally:
+            for name, value in saved.items():
+                if value:
+                    setattr(os, name, value)
+            file_transfer.same_device = saved_same_device
+    
+    for ok, message in checks:
+        print(f"   {'✓' if ok else '✗'} {message}")
+        failed += 0 if ok else 1
+    
+    return failed == 0
+
+
+def test_io_budget():
+    """Prueba el presupuesto de E/S de las operaciones masivas"""
+    print("\n" + "=" * 60)
+    print("PRUEBA: Presupuesto de E/S")
+    print("=" * 60)
+    
+    with tempfile.TemporaryDirectory() as folder:
+        tree = FileOrganizationTree(os.path.join(folder, 'destino'))
+        docs_node = TreeNode('Documentos', os.path.join(folder, 'destino', 'docs'))
+        tree.root.add_child(docs_node)
+        docs_node.add_rule('extension', '.txt', priority=1)
+        
+        # 20 operaciones por segundo con ráfaga de 20: 30 archivos tardan al menos 0.5 s
+        organizer = FileOrganizer(tree, workers=4, io_budget=IOBudget(ops_per_second=20))
+        paths = []
+        for i in range(30):
+            path = os.path.join(folder, f'nota_{i}.txt')
+            with open(path, 'w') as f:
+                f.write(str(i))
+            paths.append(path)
+        
+        start = time.perf_counter()
+        results = organizer.organize_files(paths)
+        bulk_elapsed = time.perf_counter() - start
+        
+        # Un archivo suelto (monitor) no espera al presupuesto ya agotado
+        single_path = os.path.join(folder, 'suelto.txt')
+        with open(single_path, 'w') as f:
+            f.write('suelto')
+        start = time.perf_counter()
+        single = organizer.organize_file(single_path)
+        single_elapsed = time.perf_counter() - start
+        
+        # 1 MiB por segundo: copiar 1.5 MiB tarda al menos 0.5 s
+        organizer.io_budget.configure(bytes_per_second=1024 * 1024, ops_per_second=0)
+        big_path = os.path.join(folder, 'grande.txt')
+        with open(big_path, 'wb') as f:
+            f.write(b'x' * (1536 * 1024))
+        
+        # Mientras la copia espera al presupuesto, un archivo suelto al mismo directorio no queda bloqueado
+        copy_results = []
+        start = time.perf_counter()
+        copier = threading.Thread(target=lambda: copy_results.extend(organizer.organize_files([big_path],
+                                                                                               action='copy')))
+        copier.start()
+        time.sleep(0.1)
+        monitor_path = os.path.join(folder, 'monitor.txt')
+        with open(monitor_path, 'w') as f:
+            f.write('monitor')
+        monitor_start = time.perf_counter()
+        monitored = organizer.organize_file(monitor_path)
+        monitor_elapsed = time.perf_counter() - monitor_start
+        copier.join()
+        copy_elapsed = time.perf_counter() - start
+        copied = copy_results[0]
+    
+    # Reconfigurar no rellena la cubeta: tras gastar la ráfaga, 5 tokens a 10/s esperan ~0.5 s
+    bucket = TokenBucket(10)
+    bucket.acquire(10)
+    bucket.configure(10)
+    refill_wait = bucket.acquire(5)
+    
+    failed = 0
+    checks = [
+        (all(r['success'] for r in results) and bulk_elapsed >= 0.45,
+         f"lote limitado por operaciones ({bulk_elapsed:.2f} s)"),
+        (single['success'] and single_elapsed < 0.2, f"archivo suelto sin esperar ({single_elapsed:.3f} s)"),
+        (copied['success'] and copy_elapsed >= 0.45, f"copia limitada por bytes ({copy_elapsed:.2f} s)"),
+        (monitored['success'] and monitor_elapsed < 0.2,
+         f"archivo suelto no espera a la copia limitada ({monitor_elapsed:.3f} s)"),
+        (refill_wait >= 0.4, f"reconfigurar conserva el nivel de la cubeta ({refill_wait:.2f} s)"),
+    ]
+    for ok, message in checks:
+        print(f"   {'✓' if ok else '✗'} {message}")
+        failed += 0 if ok else 1
+    
+    return failed == 0
+
+
 if __name__ == '__main__':
     print("\n" + "=" * 60)
     print("INICIANDO PRUEBAS DE REGLAS DE ORGANIZACIÓN")
@@ -202,6 +1671,29 @@ if __name__ == '__main__':
     all_passed &= test_extension_normalization()
     all_passed &= test_keyword_rules()
     all_passed &= test_priority_rules()
+    all_passed &= test_rule_index_updates()
+    all_passed &= test_classification_cache()
+    all_passed &= test_node_index_duplicates()
+    all_passed &= test_deep_tree()
+    all_passed &= test_classify_many()
+    all_passed &= test_size_and_date_rules()
+    all_passed &= test_glob_and_regex_rules()
+    all_passed &= test_content_type_rules()
+    all_passed &= test_plan_rules_hash()
+    all_passed &= test_scan_files()
+    all_passed &= test_parallel_organize()
+    all_passed &= test_iter_matches_lists()
+    all_passed &= test_organizer_stats()
+    all_passed &= test_duplicate_names()
+    all_passed &= test_known_directories()
+    all_passed &= test_dedupe_policies()
+    all_passed &= test_job_recovery_and_undo()
+    all_passed &= test_log_writer()
+    all_passed &= test_file_transfer()
+    all_passed &= test_io_budget()
+    all_passed &= test_job_runner()
+    all_passed &= test_job_retention()
+    all_passed &= test_job_cancel_and_resume()
     
     # Resumen final
     print("\n" + "=" * 60)